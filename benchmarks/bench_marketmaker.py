@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import typing
+from datetime import datetime
+
+from crypto_futures_py import AbstractExchangeHandler
+from benchmarks.harness import benchmark
+from sourse import grid
+from sourse.marketmaker import MarketMaker
+
+LARGE_GRID = MarketMaker.Settings(
+    orders_pairs=1000,
+    orders_start_size=25,
+    order_step_size=50,
+    interval=0.5,
+    min_spread=2.5,
+    stop_loss_fund=0.01,
+    rebuild_after_change=0.01,
+    adjust_grid_by_position=False,
+    min_position=-100000,
+    max_position=100000,
+)
+
+FILLS = 10000
+STORM_ORDERS = 5000
+
+
+def _market_maker(settings: MarketMaker.Settings = LARGE_GRID) -> MarketMaker:
+    market_maker = MarketMaker(
+        "XBTUSD", typing.cast(AbstractExchangeHandler, None), settings
+    )
+    market_maker.balance = 1
+    market_maker._current_price = 10000
+    return market_maker
+
+
+def _order_update(
+    client_orderID: str, status: str, side: int, price: float, volume: float
+) -> AbstractExchangeHandler.OrderUpdate:
+    return AbstractExchangeHandler.OrderUpdate(
+        orderID=client_orderID.lower(),
+        client_orderID=client_orderID,
+        status=status,
+        symbol="XBTUSD",
+        price=price,
+        average_price=price,
+        fee=volume / price * -0.00025 if status == "FILLED" else 0,
+        fee_asset="XBT",
+        volume=side * volume,
+        volume_realized=side * volume if status == "FILLED" else 0,
+        time=datetime.now(),
+        message={},
+    )
+
+
+@benchmark(operations=200)
+def generate_orders_new_price():
+    market_maker = _market_maker()
+    grid._grid_levels.cache_clear()
+
+    def workload():
+        for i in range(200):
+            market_maker._current_price = 10000 + i * 0.5
+            market_maker._generate_orders()
+
+    return workload
+
+
+@benchmark(operations=1000)
+def generate_orders_same_price():
+    market_maker = _market_maker()
+    market_maker._generate_orders()
+
+    def workload():
+        for _ in range(1000):
+            market_maker._generate_orders()
+
+    return workload
+
+
+@benchmark(operations=FILLS)
+def on_order_filled():
+    market_maker = _market_maker()
+    generator = random.Random(0)
+    fills = [
+        _order_update(
+            f"ORDER{i}",
+            "FILLED",
+            generator.choice([-1, 1]),
+            10000 + generator.randint(-200, 200) * 0.5,
+            generator.choice([25, 75, 125]),
+        )
+        for i in range(FILLS)
+    ]
+
+    def workload():
+        for fill in fills:
+            market_maker._on_order_filled(fill)
+
+    return workload
+
+
+@benchmark(operations=3 * STORM_ORDERS)
+def on_user_update_storm():
+    """PENDING, NEW and FILLED updates of each order, through the event queue."""
+
+    market_maker = _market_maker()
+    generator = random.Random(0)
+    updates = []
+    for i in range(STORM_ORDERS):
+        side = generator.choice([-1, 1])
+        price = 10000 - side * generator.randint(1, 200) * 0.5
+        for status in ("PENDING", "NEW", "FILLED"):
+            updates.append(_order_update(f"ORDER{i}", status, side, price, 25))
+
+    processed = []
+    market_maker.order_updated.connect(processed.append)
+
+    loop = asyncio.new_event_loop()
+
+    async def storm():
+        market_maker._working = True
+        market_maker._loop = asyncio.get_event_loop()
+        market_maker._events = asyncio.Queue()
+        task = asyncio.ensure_future(market_maker._process_events())
+
+        for update in updates:
+            market_maker._on_user_update(update)
+
+        while len(processed) < len(updates):
+            await asyncio.sleep(0)
+
+        market_maker._working = False
+        task.cancel()
+
+    def workload():
+        loop.run_until_complete(storm())
+        loop.close()
+
+    return workload
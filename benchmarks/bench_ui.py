@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import random
+import typing
+from datetime import datetime, timedelta
+
+import pandas as pd
+from PyQt5 import QtCore, QtWidgets
+
+from crypto_futures_py import AbstractExchangeHandler
+from benchmarks.harness import benchmark
+from sourse.ui.modules import Chart, CurrentOrdersModule
+
+ORDERS = 500
+HISTORY = 10000
+CANDLES = 500
+PANS = 20
+# A month of 1m candles
+MONTH = 30 * 24 * 60
+
+
+_application: typing.Optional[QtWidgets.QApplication] = None
+
+
+def _create_application() -> None:
+    global _application
+
+    if _application is None:
+        _application = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def _orders_module() -> CurrentOrdersModule:
+    _create_application()
+    dock = QtWidgets.QDockWidget()
+    dock.setWidget(QtWidgets.QWidget())
+    module = CurrentOrdersModule(dock)
+    module.order_update_timer.stop()
+    # Keep the dock alive as long as the module
+    module._benchmark_dock = dock
+    return module
+
+
+def _order(i: int, status: str) -> AbstractExchangeHandler.OrderUpdate:
+    side = 1 if i % 2 == 0 else -1
+    return AbstractExchangeHandler.OrderUpdate(
+        orderID=f"order-{i}",
+        client_orderID=f"CLIENT{i}",
+        status=status,
+        symbol="XBTUSD",
+        price=10000 - side * (i // 2 + 1) * 0.5,
+        average_price=float("nan"),
+        fee=0,
+        fee_asset="XBT",
+        volume=side * 25,
+        volume_realized=side * 5 if status == "PARTIALLY_FILLED" else 0,
+        time=datetime.now(),
+        message={},
+    )
+
+
+def _history(amount: int) -> pd.DataFrame:
+    generator = random.Random(0)
+    start = datetime(2020, 1, 1)
+    rows = []
+    price = 10000.0
+
+    for i in range(amount):
+        close = price + generator.randint(-20, 20) * 0.5
+        rows.append(
+            {
+                "Date": (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M"),
+                "Open": price,
+                "High": max(price, close) + generator.randint(0, 10) * 0.5,
+                "Low": min(price, close) - generator.randint(0, 10) * 0.5,
+                "Close": close,
+                "Volume": generator.randint(0, 10**6),
+            }
+        )
+        price = close
+
+    return pd.DataFrame(rows)
+
+
+def _chart(history: int = HISTORY) -> Chart:
+    _create_application()
+    window = QtWidgets.QMainWindow()
+    chart = Chart(window)
+    chart.draw_historical_data(_history(history))
+    chart._benchmark_window = window
+    return chart
+
+
+@benchmark(operations=ORDERS)
+def orders_add_order():
+    module = _orders_module()
+    orders = [_order(i, "NEW") for i in range(ORDERS)]
+
+    def workload():
+        for order in orders:
+            module.add_order(order)
+
+    return workload
+
+
+@benchmark(operations=ORDERS)
+def orders_add_orders():
+    module = _orders_module()
+    orders = [_order(i, "NEW") for i in range(ORDERS)]
+
+    def workload():
+        # A frame of the UpdateThrottler, the batch is sorted once
+        for i in range(0, ORDERS, 50):
+            module.add_orders(orders[i : i + 50])
+
+    return workload
+
+
+@benchmark(operations=ORDERS)
+def orders_edit_order():
+    module = _orders_module()
+    for i in range(ORDERS):
+        module.add_order(_order(i, "NEW"))
+    edits = [_order(i, "PARTIALLY_FILLED") for i in range(ORDERS)]
+
+    def workload():
+        for order in edits:
+            module._edit_order(order)
+
+    return workload
+
+
+@benchmark(operations=CANDLES)
+def chart_add_candle():
+    chart = _chart()
+    candles = _history(CANDLES).to_dict("records")
+
+    def workload():
+        for candle in candles:
+            chart.add_candle(candle)
+
+    return workload
+
+
+@benchmark(operations=CANDLES)
+def chart_update_candle():
+    chart = _chart()
+    candles = _history(CANDLES).to_dict("records")
+    for candle in candles:
+        candle.update(time=candles[0]["Date"], final=False)
+
+    def workload():
+        # Updates of the forming candle, each one redraws its chunk
+        for candle in candles:
+            chart.add_candle(candle)
+            item = chart._candles_items[chart._level]
+            item._chunk_picture(chart._candles.last_id // item.CHUNK)
+
+    return workload
+
+
+@benchmark(operations=PANS, repeat=3)
+def chart_pan():
+    chart = _chart()
+    chart.graphWidget.resize(1200, 600)
+    low, high = chart._candles.price_range(-HISTORY, 0)
+
+    def workload():
+        # Pan the widest allowed view over the history, painting each step
+        for i in range(PANS):
+            left = -HISTORY + 1 + i * (HISTORY - 1400) // PANS
+            chart.graphWidget.setRange(
+                QtCore.QRectF(left, low, 1400, high - low), padding=0
+            )
+            chart.graphWidget.grab()
+
+    return workload
+
+
+@benchmark(operations=PANS, repeat=3)
+def chart_zoom_out():
+    chart = _chart(MONTH)
+    chart.graphWidget.resize(1200, 600)
+    low, high = chart._candles.price_range(-MONTH, 0)
+
+    def workload():
+        # Zoom out from a day to the whole month, painting each step
+        for i in range(1, PANS + 1):
+            width = 1440 + (MONTH - 1440) * i // PANS
+            chart.graphWidget.setRange(
+                QtCore.QRectF(-width, low, width, high - low), padding=0
+            )
+            chart.graphWidget.grab()
+
+    return workload
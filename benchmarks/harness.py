@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import sys
+import time
+import traceback
+import typing
+from datetime import datetime
+
+# A benchmark prepares its state and returns the workload, which is timed
+Benchmark = typing.Callable[[], typing.Callable[[], None]]
+
+BENCHMARKS: typing.Dict[str, typing.Tuple[Benchmark, int, int]] = {}
+
+
+def benchmark(
+    operations: int = 1, repeat: int = 5
+) -> typing.Callable[[Benchmark], Benchmark]:
+    """benchmark Register a benchmark.
+
+    The decorated function is called before each repeat to prepare a fresh state,
+    and only the workload it returns is timed.
+
+    Args:
+        operations (int, optional): Amount of operations the workload makes,
+            to report the time per operation. Defaults to 1.
+        repeat (int, optional): Amount of timed runs. Defaults to 5.
+    """
+
+    def decorator(function: Benchmark) -> Benchmark:
+        name = f"{function.__module__.split('.')[-1]}.{function.__name__}"
+        BENCHMARKS[name] = (function, operations, repeat)
+        return function
+
+    return decorator
+
+
+def run(
+    names: typing.Optional[typing.Iterable[str]] = None,
+) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    """run Run the registered benchmarks (or the ones, which names contain any of names)."""
+
+    results: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+    filters = list(names) if names is not None else []
+
+    for name, (function, operations, repeat) in BENCHMARKS.items():
+        if len(filters) > 0 and not any(part in name for part in filters):
+            continue
+
+        try:
+            timings = []
+            for _ in range(repeat):
+                workload = function()
+                started = time.perf_counter()
+                workload()
+                timings.append(time.perf_counter() - started)
+        except Exception as e:
+            traceback.print_exc()
+            results[name] = {"error": f"{e.__class__.__name__}: {e}"}
+            print(f"{name:<40} failed: {results[name]['error']}")
+            continue
+
+        results[name] = {
+            "operations": operations,
+            "repeat": repeat,
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "per_op_us": min(timings) / operations * 10**6,
+        }
+        print(
+            f"{name:<40} {results[name]['per_op_us']:>12.2f} us/op "
+            f"(min {results[name]['min']:.4f}s, median {results[name]['median']:.4f}s)"
+        )
+
+    return results
+
+
+def save(results: typing.Dict[str, typing.Dict[str, typing.Any]], file: str) -> None:
+    with open(file, "w") as f:
+        json.dump(
+            {
+                "meta": {
+                    "time": datetime.now().isoformat(),
+                    "python": sys.version,
+                    "platform": platform.platform(),
+                },
+                "results": results,
+            },
+            f,
+            indent=4,
+        )
+
+
+def compare(
+    results: typing.Dict[str, typing.Dict[str, typing.Any]],
+    file: str,
+    tolerance: float,
+) -> typing.List[str]:
+    """compare Compare the results with a saved baseline.
+
+    Returns:
+        typing.List[str]: Names of the benchmarks, that became slower than the baseline
+            by more than tolerance (0.2 is 20%), or started to fail
+    """
+
+    with open(file, "r") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+
+    for name, result in results.items():
+        if name not in baseline or "error" in baseline[name]:
+            continue
+
+        if "error" in result:
+            regressions.append(name)
+            print(f"{name:<40} {'':>12} {'failed':>12}")
+            continue
+
+        before, after = baseline[name]["per_op_us"], result["per_op_us"]
+        change = after / before - 1
+        if change > tolerance:
+            regressions.append(name)
+
+        print(
+            f"{name:<40} {before:>12.2f} {after:>12.2f} {change:>+8.1%}"
+            + (" REGRESSION" if change > tolerance else "")
+        )
+
+    return regressions
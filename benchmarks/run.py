@@ -0,0 +1,54 @@
+"""Benchmarks of the bot's hot paths.
+
+Usage:
+    python -m benchmarks.run [names...] [--output results.json]
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 0.2]
+
+The widgets are created on the offscreen Qt platform, so no display is needed.
+Exits with code 1, if any benchmark became slower than the baseline by more than the tolerance.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from benchmarks import bench_marketmaker, bench_ui
+from benchmarks.harness import compare, run, save
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmarks")
+    parser.add_argument("names", nargs="*", help="Run only the matching benchmarks")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Measure the code, not the terminal: only warnings and errors are logged
+    logging.disable(logging.INFO)
+
+    results = run(args.names or None)
+    save(results, args.output)
+
+    if args.save_baseline:
+        save(results, args.baseline)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        regressions = compare(results, args.baseline, args.tolerance)
+        if len(regressions) > 0:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
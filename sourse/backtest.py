@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import sys
+import typing
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+
+from crypto_futures_py import AbstractExchangeHandler
+from sourse.grid import GridParameters, grid_parameters
+from sourse.marketmaker import MarketMaker
+from sourse.store import get_store
+
+
+@dataclass
+class Klines:
+    """Historical candles as arrays of the same length."""
+
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    @staticmethod
+    def from_csv(path: str) -> Klines:
+        """from_csv Load candles from a csv file with Open, High, Low and Close columns.
+
+        The file could be made with load_historical_data(...).to_csv(path).
+        """
+        with open(path, "r") as file:
+            header = file.readline().strip().split(",")
+
+        columns = [header.index(name) for name in ("Open", "High", "Low", "Close")]
+        data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=columns, ndmin=2)
+        return Klines(*(np.ascontiguousarray(data[:, i]) for i in range(4)))
+
+
+@dataclass
+class _RestingGrid:
+    """Grid levels of each side, sorted from the nearest to the price outwards."""
+
+    sell_prices: np.ndarray
+    sell_volumes: np.ndarray
+    # Negated, so both sides are sorted ascending for np.searchsorted
+    negative_buy_prices: np.ndarray
+    buy_volumes: np.ndarray
+
+    @staticmethod
+    def empty() -> _RestingGrid:
+        return _RestingGrid(*(np.empty(0) for _ in range(4)))
+
+    def best_bid(self, index: int) -> float:
+        if index < len(self.negative_buy_prices):
+            return -float(self.negative_buy_prices[index])
+        return float("-inf")
+
+    def best_ask(self, index: int) -> float:
+        if index < len(self.sell_prices):
+            return float(self.sell_prices[index])
+        return float("inf")
+
+
+class Backtester:
+    """This class replays historical candles through the MarketMaker grid logic.
+
+    The grid is built with MarketMaker._generate_orders() and rebuilt by the same deviation
+    rule, that triggers the live rebuilds. Fills go through MarketMaker._on_order_filled(),
+    so the position and the balance are calculated exactly as in the live bot.
+    A virtual clock (one step per candle) is used instead of the wall clock.
+
+    The resting grid is kept in arrays, and a candle is only searched for fills
+    when its high or low reaches the nearest resting level.
+    """
+
+    FILL_MODELS = ("touch", "trade_through")
+
+    @dataclass
+    class Result:
+        pnl: float
+        balance: float
+        position: MarketMaker.Position
+        max_drawdown: float
+        fills: int
+        volume: float
+        fees: float
+        rebuilds: int
+        equity: np.ndarray
+
+    def __init__(
+        self,
+        settings: MarketMaker.Settings,
+        fill_model: str = "touch",
+        fee: float = -0.00025,
+        candle_seconds: float = 60,
+        pair_name: str = "XBTUSD",
+        grid_cache_size: int = 1024,
+    ):
+        """__init__ Create a new backtester.
+
+        Args:
+            settings (MarketMaker.Settings): Settings to test
+            fill_model (str, optional): "touch" fills an order when the price reaches it,
+                "trade_through" only when the price goes beyond it. Defaults to "touch".
+            fee (float, optional): Fee rate of a filled limit order, negative for a rebate.
+                Defaults to -0.00025 (BitMEX maker rebate).
+            candle_seconds (float, optional): Duration of one candle for the virtual clock.
+                Defaults to 60.
+            pair_name (str, optional): Defaults to "XBTUSD".
+            grid_cache_size (int, optional): Maximal amount of prepared grids, kept to reuse
+                the grids, built from the same price and position. Defaults to 1024.
+        """
+        if fill_model not in self.FILL_MODELS:
+            raise ValueError(f"Unknown fill model {fill_model}")
+
+        self.settings = settings
+        self.fill_model = fill_model
+        self.fee = fee
+        self.candle_seconds = candle_seconds
+        self.pair_name = pair_name
+        self.grid_cache_size = grid_cache_size
+
+        self._grids: typing.Dict[GridParameters, _RestingGrid] = {}
+
+    def _fill(
+        self,
+        market_maker: MarketMaker,
+        side: int,
+        prices: typing.List[float],
+        volumes: typing.List[int],
+        time: datetime,
+    ) -> float:
+        """_fill Fill the orders of one side, that were reached during one candle.
+
+        Consecutive fills, that all open (or all reduce) the position, are merged into one
+        update with the harmonic average price, which gives the same position and balance
+        as filling them one by one. An order, that flips the position, is filled on its own.
+
+        Returns:
+            float: Fee paid for the fills
+        """
+
+        position = market_maker.position.volume
+        # [kind, volume, volume / price], kind is 0 to open, 1 to reduce, 2 to flip
+        groups: typing.List[typing.List[typing.Any]] = []
+
+        for price, volume in zip(prices, volumes):
+            if position == 0 or (position > 0) == (side > 0):
+                kind = 0
+            elif abs(position) >= volume:
+                kind = 1
+            else:
+                kind = 2
+
+            if len(groups) > 0 and groups[-1][0] == kind and kind != 2:
+                groups[-1][1] += volume
+                groups[-1][2] += volume / price
+            else:
+                groups.append([kind, volume, volume / price])
+
+            position += side * volume
+
+        fee = 0.0
+        for _, volume, cost in groups:
+            fee += cost * self.fee
+            market_maker._on_order_filled(
+                AbstractExchangeHandler.OrderUpdate(
+                    orderID="",
+                    client_orderID="",
+                    status="FILLED",
+                    symbol=self.pair_name,
+                    price=volume / cost,
+                    average_price=volume / cost,
+                    fee=cost * self.fee,
+                    fee_asset="XBT",
+                    volume=side * volume,
+                    volume_realized=side * volume,
+                    time=time,
+                    message={},
+                )
+            )
+
+        return fee
+
+    def _build_grid(self, market_maker: MarketMaker) -> _RestingGrid:
+        levels = market_maker._generate_orders()
+
+        key = grid_parameters(
+            typing.cast(float, market_maker._grid_price),
+            market_maker.position,
+            market_maker.settings,
+        )
+        cached = self._grids.get(key)
+        if cached is not None:
+            return cached
+
+        # Short levels go first, each side from the nearest to the price outwards
+        split = int(np.count_nonzero(levels["side"] < 0))
+        grid = _RestingGrid(
+            sell_prices=levels["price"][:split],
+            sell_volumes=levels["volume"][:split],
+            negative_buy_prices=-levels["price"][split:],
+            buy_volumes=levels["volume"][split:],
+        )
+
+        if len(self._grids) >= self.grid_cache_size:
+            self._grids.clear()
+        self._grids[key] = grid
+        return grid
+
+    def run(self, klines: Klines) -> Backtester.Result:
+        """run Replay the candles and return the result of the strategy."""
+
+        market_maker = MarketMaker(
+            self.pair_name, typing.cast(AbstractExchangeHandler, None), self.settings
+        )
+        market_maker.balance = 0
+        self._grids.clear()
+
+        # Searching for the first level, that is not reached by the candle
+        search_side = "right" if self.fill_model == "touch" else "left"
+        min_interval = self.settings.rebuild_min_interval
+
+        grid = _RestingGrid.empty()
+        # Levels before these indexes are already filled
+        bid = ask = 0
+        best_bid = float("-inf")
+        best_ask = float("inf")
+
+        equity = np.empty(len(klines))
+        last_rebuild = float("-inf")
+        rebuilds = fills = 0
+        traded_volume = fees = 0.0
+
+        highs = klines.high.tolist()
+        lows = klines.low.tolist()
+        closes = klines.close.tolist()
+
+        for i in range(len(closes)):
+            high, low, close = highs[i], lows[i], closes[i]
+
+            if low <= best_bid:
+                filled = int(
+                    np.searchsorted(grid.negative_buy_prices, -low, search_side)
+                )
+                if filled > bid:
+                    volumes = grid.buy_volumes[bid:filled].tolist()
+                    fees += self._fill(
+                        market_maker,
+                        1,
+                        (-grid.negative_buy_prices[bid:filled]).tolist(),
+                        volumes,
+                        datetime.fromtimestamp(i * self.candle_seconds, timezone.utc),
+                    )
+                    traded_volume += sum(volumes)
+                    fills += filled - bid
+                    bid = filled
+                    best_bid = grid.best_bid(bid)
+
+            if high >= best_ask:
+                filled = int(np.searchsorted(grid.sell_prices, high, search_side))
+                if filled > ask:
+                    volumes = grid.sell_volumes[ask:filled].tolist()
+                    fees += self._fill(
+                        market_maker,
+                        -1,
+                        grid.sell_prices[ask:filled].tolist(),
+                        volumes,
+                        datetime.fromtimestamp(i * self.candle_seconds, timezone.utc),
+                    )
+                    traded_volume += sum(volumes)
+                    fills += filled - ask
+                    ask = filled
+                    best_ask = grid.best_ask(ask)
+
+            market_maker._current_price = close
+            now = i * self.candle_seconds
+
+            if now - last_rebuild >= min_interval and market_maker._rebuild_needed():
+                grid = self._build_grid(market_maker)
+                bid = ask = 0
+                best_bid = grid.best_bid(bid)
+                best_ask = grid.best_ask(ask)
+
+                last_rebuild = now
+                rebuilds += 1
+
+            position = market_maker.position
+            equity[i] = market_maker.balance + (
+                position.volume * (1 / position.price - 1 / close)
+                if position.volume != 0
+                else 0
+            )
+
+        drawdown = (
+            float(np.max(np.maximum.accumulate(equity) - equity)) if len(equity) else 0
+        )
+
+        return Backtester.Result(
+            pnl=float(equity[-1]) if len(equity) else 0,
+            balance=market_maker.balance,
+            position=market_maker.position,
+            max_drawdown=drawdown,
+            fills=fills,
+            volume=traded_volume,
+            fees=fees,
+            rebuilds=rebuilds,
+            equity=equity,
+        )
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m sourse.backtest <klines.csv> [template name]")
+        return
+
+    store = get_store()
+    templates = {template.name: template for template in store.templates()}
+    names = sys.argv[2:] if len(sys.argv) > 2 else list(templates.keys())
+    klines = Klines.from_csv(sys.argv[1])
+
+    for name in names:
+        result = Backtester(templates[name].settings).run(klines)
+        store.record_run(name, None, result.pnl, "backtest")
+        print(
+            f"{name}: pnl {result.pnl:.8f} XBT, max drawdown {result.max_drawdown:.8f} XBT, "
+            f"{result.fills} fills, {result.rebuilds} rebuilds"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import threading
+import typing
+from dataclasses import dataclass
+from datetime import datetime
+
+from crypto_futures_py import AbstractExchangeHandler, BitmexExchangeHandler
+from sourse.latency import LatencyTracker
+from sourse.logger import init_logger
+
+
+class StateSource:
+    """Pulls the account state of a symbol (open orders, position, margin and the last price)
+    from the exchange in concurrent bulk requests, so a bot can start or resync
+    in one round-trip.
+
+    The loaded orders are registered in the handler's order table, the same way
+    its socket registers them, so the handler can cancel orders, left by a previous run.
+
+    The base class uses the handler's own methods (plain or coroutines) get_open_orders(symbol),
+    get_position(symbol), get_balance() and get_price(symbol). Parts, the handler does not provide,
+    are left empty and come with the socket updates instead.
+    """
+
+    @dataclass
+    class Snapshot:
+        # A part is None, if it could not be loaded
+        orders: typing.Optional[typing.List[AbstractExchangeHandler.OrderUpdate]] = None
+        position: typing.Optional[AbstractExchangeHandler.PositionUpdate] = None
+        balance: typing.Optional[AbstractExchangeHandler.BalanceUpdate] = None
+        price: typing.Optional[float] = None
+        # LatencyTracker.now() stamps of the request and the last response
+        requested: int = 0
+        received: int = 0
+
+    def __init__(self, handler: AbstractExchangeHandler):
+        self.handler = handler
+        self.logger = init_logger(self.__class__.__name__)
+
+    @staticmethod
+    def for_handler(handler: AbstractExchangeHandler) -> StateSource:
+        """for_handler The state source, which fits the handler."""
+        if isinstance(handler, BitmexExchangeHandler):
+            return BitmexStateSource(handler)
+        return StateSource(handler)
+
+    async def _call(self, name: str, *args: typing.Any) -> typing.Any:
+        method = getattr(self.handler, name, None)
+        if method is None:
+            return None
+
+        result = method(*args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    async def get_open_orders(
+        self, symbol: str
+    ) -> typing.Optional[typing.List[AbstractExchangeHandler.OrderUpdate]]:
+        return await self._call("get_open_orders", symbol)
+
+    async def get_position(
+        self, symbol: str
+    ) -> typing.Optional[AbstractExchangeHandler.PositionUpdate]:
+        return await self._call("get_position", symbol)
+
+    async def get_balance(
+        self,
+    ) -> typing.Optional[AbstractExchangeHandler.BalanceUpdate]:
+        return await self._call("get_balance")
+
+    async def get_price(self, symbol: str) -> typing.Optional[float]:
+        return await self._call("get_price", symbol)
+
+    async def fetch(self, symbol: str) -> StateSource.Snapshot:
+        """fetch Request all the parts of the state at once.
+
+        A failed part is logged and left empty, so the bot could still start from the sockets.
+        """
+        snapshot = StateSource.Snapshot(requested=LatencyTracker.now())
+
+        results = await asyncio.gather(
+            self.get_open_orders(symbol),
+            self.get_position(symbol),
+            self.get_balance(),
+            self.get_price(symbol),
+            return_exceptions=True,
+        )
+        snapshot.received = LatencyTracker.now()
+
+        for name, result in zip(("orders", "position", "balance", "price"), results):
+            if isinstance(result, Exception):
+                self.logger.error(
+                    "Could not load the %s of %s: %r", name, symbol, result
+                )
+            elif result is not None:
+                setattr(snapshot, name, result)
+
+        if snapshot.orders is not None:
+            self._register_orders(snapshot.orders)
+
+        return snapshot
+
+    def _register_orders(
+        self, orders: typing.List[AbstractExchangeHandler.OrderUpdate]
+    ) -> None:
+        register = getattr(self.handler, "_register_order_data", None)
+        if register is None:
+            return
+
+        table = getattr(self.handler, "_order_table_id", {})
+        for order in orders:
+            # The socket's data could be newer
+            if order.orderID not in table:
+                register(dataclasses.asdict(order))
+
+
+def start_user_update_socket(
+    handler: AbstractExchangeHandler,
+    on_update: typing.Callable[[AbstractExchangeHandler.UserUpdate], None],
+    on_reconnect: typing.Callable[[], None],
+) -> threading.Thread:
+    """start_user_update_socket Start the handler's user update socket in a thread
+    and report its reconnects, after which the state should be resynced.
+
+    The handlers reconnect the socket themselves by calling start_user_update_socket
+    on the instance again, so the call is wrapped on the instance.
+
+    Args:
+        handler (AbstractExchangeHandler): Handler to start the socket of
+        on_update (typing.Callable[[AbstractExchangeHandler.UserUpdate], None]): Update callback
+        on_reconnect (typing.Callable[[], None]): Called from the socket's thread
+            on every reconnect, the updates could have been lost meanwhile
+
+    Returns:
+        threading.Thread: The socket's thread
+    """
+    start = handler.start_user_update_socket
+    connected = False
+
+    def run(callback: typing.Callable[[AbstractExchangeHandler.UserUpdate], None]):
+        nonlocal connected
+        if connected:
+            # Every connect registers the callback again, it would get the updates twice
+            if callback in handler._user_update_callbacks:
+                handler._user_update_callbacks.remove(callback)
+            on_reconnect()
+        connected = True
+        start(callback)
+
+    setattr(handler, "start_user_update_socket", run)
+    return handler.start_user_update_socket_threaded(on_update)
+
+
+class BitmexStateSource(StateSource):
+    """State source for BitMEX, using the REST client of the handler.
+
+    The client is blocking, so the requests run in the default executor, concurrently.
+    The results are converted the same way the handler converts the socket data.
+    """
+
+    SATOSHI = 10**-8
+    # Maximal amount of orders in a response
+    PAGE = 500
+
+    def __init__(self, handler: BitmexExchangeHandler):
+        super().__init__(handler)
+        self._client = handler._client
+
+    async def _request(self, request: typing.Callable[[], typing.Any]) -> typing.Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: request().result()[0])
+
+    @staticmethod
+    def _order_update(
+        data: typing.Dict[str, typing.Any],
+    ) -> AbstractExchangeHandler.OrderUpdate:
+        side = 1 if data["side"] == "Buy" else -1
+        status = data["ordStatus"].upper()
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, str):
+            timestamp = datetime.strptime(
+                timestamp[:-1] + "000", "%Y-%m-%dT%H:%M:%S.%f"
+            )
+
+        return AbstractExchangeHandler.OrderUpdate(
+            orderID=data["orderID"],
+            client_orderID=data.get("clOrdID") or "",
+            symbol=data["symbol"],
+            status="PARTIALLY_FILLED" if status == "PARTIALLYFILLED" else status,
+            price=data["price"],
+            average_price=data.get("avgPx"),
+            fee=0,
+            fee_asset="XBT",
+            volume_realized=(data.get("cumQty") or 0) * side,
+            volume=data["orderQty"] * side,
+            time=timestamp,
+            message=data,
+        )
+
+    async def get_open_orders(
+        self, symbol: str
+    ) -> typing.List[AbstractExchangeHandler.OrderUpdate]:
+        orders: typing.List[typing.Dict[str, typing.Any]] = []
+        while True:
+            page = await self._request(
+                lambda: self._client.Order.Order_getOrders(
+                    symbol=symbol,
+                    filter=json.dumps({"open": True}),
+                    count=self.PAGE,
+                    start=len(orders),
+                )
+            )
+            orders.extend(page)
+            if len(page) < self.PAGE:
+                break
+
+        return [self._order_update(data) for data in orders]
+
+    async def get_position(
+        self, symbol: str
+    ) -> typing.Optional[AbstractExchangeHandler.PositionUpdate]:
+        positions = await self._request(
+            lambda: self._client.Position.Position_get(
+                filter=json.dumps({"symbol": symbol})
+            )
+        )
+        if len(positions) == 0:
+            return AbstractExchangeHandler.PositionUpdate(
+                symbol=symbol, size=0, value=0, entry_price=0, liquidation_price=0
+            )
+
+        position = positions[0]
+        return AbstractExchangeHandler.PositionUpdate(
+            symbol=symbol,
+            size=position["currentQty"],
+            value=(
+                round(position["currentQty"] / position["avgCostPrice"], 8)
+                if position["avgCostPrice"]
+                else None
+            ),
+            entry_price=position["avgCostPrice"],
+            liquidation_price=position["liquidationPrice"],
+        )
+
+    async def get_balance(
+        self,
+    ) -> typing.Optional[AbstractExchangeHandler.BalanceUpdate]:
+        margin = await self._request(lambda: self._client.User.User_getMargin())
+        return AbstractExchangeHandler.BalanceUpdate(
+            balance=margin["marginBalance"] * self.SATOSHI, symbol="XBT"
+        )
+
+    async def get_price(self, symbol: str) -> typing.Optional[float]:
+        instruments = await self._request(
+            lambda: self._client.Instrument.Instrument_get(symbol=symbol)
+        )
+        if len(instruments) == 0:
+            return None
+        # The same price the price socket sends
+        return instruments[0]["lastPriceProtected"]
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import tempfile
+import typing
+
+import numpy as np
+import pandas as pd
+
+
+class CandleStore:
+    """OHLCV candles with consecutive integer ids in preallocated NumPy arrays.
+
+    The candles live in a contiguous window of the arrays, so a candle is found
+    by its id in O(1) and any range of ids is a zero-copy view. Appending into
+    a full buffer doubles it; with max_size set, the buffer works as a ring of
+    the last max_size candles instead: the oldest candle is dropped
+    and the window slides to the front of the buffer once per max_size appends.
+    Dropped candles are spilled to a temporary file, and can be read with spilled().
+    """
+
+    COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+    # A candle in the spill file
+    RECORD = np.dtype([("id", np.int64)] + [(column, np.float64) for column in COLUMNS])
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        max_size: typing.Optional[int] = None,
+        spill: bool = True,
+    ):
+        """__init__ Create an empty store.
+
+        Args:
+            capacity (int, optional): Initial amount of candles the arrays fit. Defaults to 1024.
+            max_size (typing.Optional[int], optional): Amount of the newest candles to keep in memory,
+                or None to keep all of them. Defaults to None.
+            spill (bool, optional): Write the candles, dropped from the memory, to the disk.
+                Defaults to True.
+        """
+        if max_size is not None:
+            # Twice the size, so sliding the window costs O(1) per append
+            capacity = min(capacity, 2 * max_size)
+        capacity = max(1, capacity)
+
+        self.max_size = max_size
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((len(self.COLUMNS), capacity), dtype=np.float64)
+        # The candles are self._ids[self._start:self._end]
+        self._start = 0
+        self._end = 0
+
+        self.spill = spill
+        self._spill_file: typing.Optional[typing.BinaryIO] = None
+        self._spilled = 0
+        self._spilled_first_id = 0
+
+    @classmethod
+    def from_frame(
+        cls,
+        frame: pd.DataFrame,
+        last_id: int = 0,
+        max_size: typing.Optional[int] = None,
+        spill: bool = True,
+    ) -> CandleStore:
+        """from_frame Store with the candles of the frame (with columns Open, High, Low, Close, Volume).
+
+        Args:
+            frame (pd.DataFrame): Candles from the oldest to the newest
+            last_id (int, optional): Id of the last candle. Defaults to 0.
+            max_size (typing.Optional[int], optional): See __init__. Defaults to None.
+            spill (bool, optional): See __init__. Defaults to True.
+        """
+        return cls.from_columns(
+            {column: frame[column].to_numpy(np.float64) for column in cls.COLUMNS},
+            last_id - len(frame) + 1,
+            max_size,
+            spill,
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        columns: typing.Mapping[str, np.ndarray],
+        first_id: int = 0,
+        max_size: typing.Optional[int] = None,
+        spill: bool = True,
+    ) -> CandleStore:
+        """from_columns Store with the candles of the arrays.
+
+        Args:
+            columns (typing.Mapping[str, np.ndarray]): Arrays of the same length
+                for Open, High, Low, Close and Volume, from the oldest candle to the newest
+            first_id (int, optional): Id of the first candle. Defaults to 0.
+            max_size (typing.Optional[int], optional): See __init__. Defaults to None.
+            spill (bool, optional): See __init__. Defaults to True.
+        """
+        size = len(columns[cls.COLUMNS[0]])
+        store = cls(2 * size, max_size, spill)
+        skip = 0
+
+        if max_size is not None and size > max_size:
+            skip = size - max_size
+            records = np.empty(skip, dtype=cls.RECORD)
+            records["id"] = np.arange(first_id, first_id + skip)
+            for column in cls.COLUMNS:
+                records[column] = columns[column][:skip]
+            store._spill(records)
+
+        store._end = size - skip
+        store._ids[: store._end] = np.arange(first_id + skip, first_id + size)
+        for i, column in enumerate(cls.COLUMNS):
+            store._values[i, : store._end] = columns[column][skip:]
+        return store
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __contains__(self, candle_id: int) -> bool:
+        return (
+            self._end > self._start
+            and self._ids[self._start] <= candle_id <= self._ids[self._end - 1]
+        )
+
+    @property
+    def first_id(self) -> int:
+        if self._end == self._start:
+            raise IndexError("The store is empty")
+        return int(self._ids[self._start])
+
+    @property
+    def last_id(self) -> int:
+        if self._end == self._start:
+            raise IndexError("The store is empty")
+        return int(self._ids[self._end - 1])
+
+    def index(self, candle_id: int) -> int:
+        """index Position of the candle in the arrays."""
+        if candle_id not in self:
+            raise KeyError(candle_id)
+        return self._start + candle_id - int(self._ids[self._start])
+
+    def candle(self, candle_id: int) -> typing.Dict[str, float]:
+        """candle The candle as a dict with the keys id, Open, High, Low, Close, Volume."""
+        index = self.index(candle_id)
+        candle: typing.Dict[str, float] = {"id": candle_id}
+        for i, column in enumerate(self.COLUMNS):
+            candle[column] = float(self._values[i, index])
+        return candle
+
+    def _slice(self, left_id: int, right_id: int) -> slice:
+        if self._end == self._start:
+            return slice(0, 0)
+
+        first_id = int(self._ids[self._start])
+        left = self._start + max(0, left_id - first_id)
+        right = self._start + min(self._end - self._start, right_id - first_id + 1)
+        return slice(left, max(left, right))
+
+    def ids(self, left_id: int, right_id: int) -> np.ndarray:
+        """ids View of the ids of the stored candles in [left_id, right_id]."""
+        return self._ids[self._slice(left_id, right_id)]
+
+    def column(self, name: str, left_id: int, right_id: int) -> np.ndarray:
+        """column View of a column (Open, High, Low, Close or Volume) of the stored candles in [left_id, right_id].
+
+        The view is valid until the next append.
+        """
+        return self._values[self.COLUMNS.index(name), self._slice(left_id, right_id)]
+
+    def values(self, left_id: int, right_id: int) -> np.ndarray:
+        """values View of all the columns (a row for each one, in the order of COLUMNS)
+        of the stored candles in [left_id, right_id].
+
+        The view is valid until the next append.
+        """
+        return self._values[:, self._slice(left_id, right_id)]
+
+    def price_range(
+        self, left_id: int, right_id: int
+    ) -> typing.Optional[typing.Tuple[float, float]]:
+        """price_range The lowest low and the highest high of the candles in [left_id, right_id], if any."""
+        window = self._slice(left_id, right_id)
+        if window.stop == window.start:
+            return None
+
+        low = self._values[self.COLUMNS.index("Low"), window]
+        high = self._values[self.COLUMNS.index("High"), window]
+        return float(low.min()), float(high.max())
+
+    def update(self, candle_id: int, candle: typing.Mapping[str, float]) -> None:
+        """update Change a stored candle in place (e.g. the forming one).
+
+        Args:
+            candle_id (int): Id of the candle
+            candle (typing.Mapping[str, float]): New values of the columns, the missing ones are kept
+        """
+        index = self.index(candle_id)
+        for i, column in enumerate(self.COLUMNS):
+            if column in candle:
+                self._values[i, index] = candle[column]
+
+    def _spill(self, records: np.ndarray) -> None:
+        if not self.spill or len(records) == 0:
+            return
+
+        if self._spill_file is None:
+            self._spill_file = typing.cast(typing.BinaryIO, tempfile.TemporaryFile())
+        if self._spilled == 0:
+            self._spilled_first_id = int(records["id"][0])
+
+        self._spill_file.seek(0, 2)
+        self._spill_file.write(records.tobytes())
+        self._spilled += len(records)
+
+    def spilled(self, left_id: int, right_id: int) -> np.ndarray:
+        """spilled The candles in [left_id, right_id], that were dropped from the memory and spilled to the disk.
+
+        Returns:
+            np.ndarray: Records of CandleStore.RECORD (id, Open, High, Low, Close, Volume)
+        """
+        left = max(0, left_id - self._spilled_first_id)
+        right = min(self._spilled, right_id - self._spilled_first_id + 1)
+        if self._spill_file is None or right <= left:
+            return np.empty(0, dtype=self.RECORD)
+
+        self._spill_file.seek(left * self.RECORD.itemsize)
+        data = self._spill_file.read((right - left) * self.RECORD.itemsize)
+        return np.frombuffer(data, dtype=self.RECORD)
+
+    def close(self) -> None:
+        """close Delete the spill file."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            self._spilled = 0
+
+    def _make_room(self) -> None:
+        size = len(self)
+
+        if self.max_size is not None and size >= self.max_size:
+            # Drop the oldest candle
+            if self.spill:
+                record = np.empty(1, dtype=self.RECORD)
+                record["id"] = self._ids[self._start]
+                for i, column in enumerate(self.COLUMNS):
+                    record[column] = self._values[i, self._start]
+                self._spill(record)
+            self._start += 1
+            size -= 1
+
+        if self._end < len(self._ids):
+            return
+
+        if self.max_size is not None and 2 * size <= len(self._ids):
+            # Slide the window to the front
+            self._ids[:size] = self._ids[self._start : self._end]
+            self._values[:, :size] = self._values[:, self._start : self._end]
+        else:
+            capacity = 2 * len(self._ids)
+            if self.max_size is not None:
+                capacity = min(capacity, 2 * self.max_size)
+
+            ids = np.zeros(capacity, dtype=np.int64)
+            values = np.zeros((len(self.COLUMNS), capacity), dtype=np.float64)
+            ids[:size] = self._ids[self._start : self._end]
+            values[:, :size] = self._values[:, self._start : self._end]
+            self._ids, self._values = ids, values
+
+        self._start, self._end = 0, size
+
+    def append(self, candle: typing.Mapping[str, float]) -> int:
+        """append Add a candle after the last one.
+
+        Args:
+            candle (typing.Mapping[str, float]): Open, High, Low, Close and Volume of the candle
+
+        Returns:
+            int: Id of the new candle
+        """
+        candle_id = self.last_id + 1 if len(self) > 0 else 0
+
+        self._make_room()
+        self._ids[self._end] = candle_id
+        for i, column in enumerate(self.COLUMNS):
+            self._values[i, self._end] = candle[column]
+        self._end += 1
+
+        return candle_id
+
+
+class CandlePyramid:
+    """Levels of detail of a CandleStore: its candles, aggregated by FACTORS consecutive ids.
+
+    Candle i of a level with factor f is made of the base candles with ids
+    from i * f to i * f + f - 1 (5, 15, 60... minutes for 1m candles,
+    aligned to the ids, not to the clock). The levels are built at once from the base
+    and then kept up to date candle by candle, so a zoomed out chart draws
+    about the same amount of candles, however much history it shows.
+    The levels keep all their candles, even the ones dropped from the base.
+    """
+
+    FACTORS = (5, 15, 60, 240, 1440)
+
+    def __init__(self, base: CandleStore, factors: typing.Sequence[int] = FACTORS):
+        self.base = base
+        self.factors = [1] + list(factors)
+        self.levels: typing.List[CandleStore] = [base]
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """rebuild Aggregate all the levels from the candles of the base."""
+        self.levels = [self.base]
+        if len(self.base) == 0:
+            self.levels += [CandleStore() for _ in self.factors[1:]]
+            return
+
+        first_id, last_id = self.base.first_id, self.base.last_id
+        ids = self.base.ids(first_id, last_id)
+        values = {
+            column: self.base.column(column, first_id, last_id)
+            for column in CandleStore.COLUMNS
+        }
+
+        for factor in self.factors[1:]:
+            buckets = ids // factor
+            starts = np.flatnonzero(np.diff(buckets)) + 1
+            starts = np.concatenate(([0], starts))
+            ends = np.concatenate((starts[1:], [len(ids)]))
+
+            columns = {
+                "Open": values["Open"][starts],
+                "High": np.maximum.reduceat(values["High"], starts),
+                "Low": np.minimum.reduceat(values["Low"], starts),
+                "Close": values["Close"][ends - 1],
+                "Volume": np.add.reduceat(values["Volume"], starts),
+            }
+            self.levels.append(
+                CandleStore.from_columns(columns, int(buckets[0]), spill=False)
+            )
+
+    def _aggregate(self, level: int, level_id: int) -> typing.Dict[str, float]:
+        # Made of the previous level, if its candles fit, else of the base
+        source = level - 1 if self.factors[level] % self.factors[level - 1] == 0 else 0
+        ratio = self.factors[level] // self.factors[source]
+
+        values = self.levels[source].values(
+            level_id * ratio, level_id * ratio + ratio - 1
+        )
+        return {
+            "Open": float(values[0, 0]),
+            "High": float(values[1].max()),
+            "Low": float(values[2].min()),
+            "Close": float(values[3, -1]),
+            "Volume": float(values[4].sum()),
+        }
+
+    def update(self, candle_id: int) -> typing.List[int]:
+        """update Apply an added or changed candle of the base to the levels.
+
+        Args:
+            candle_id (int): Id of the candle in the base
+
+        Returns:
+            typing.List[int]: Id of the changed candle in each level, the base included
+        """
+        if any(len(level) == 0 for level in self.levels):
+            self.rebuild()
+
+        changed = [candle_id]
+        for i in range(1, len(self.levels)):
+            level_id = candle_id // self.factors[i]
+            candle = self._aggregate(i, level_id)
+
+            if level_id in self.levels[i]:
+                self.levels[i].update(level_id, candle)
+            else:
+                self.levels[i].append(candle)
+            changed.append(level_id)
+
+        return changed
+
+    def level_for(self, width: float, budget: int) -> int:
+        """level_for Index of the most detailed level, which shows at most budget candles in the width.
+
+        Args:
+            width (float): Width of the view in the base candles
+            budget (int): Amount of candles, the view can fit
+        """
+        for i, factor in enumerate(self.factors):
+            if width / factor <= budget:
+                return i
+        return len(self.factors) - 1
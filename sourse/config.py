@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import copy
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import tempfile
+import threading
+import typing
+from dataclasses import dataclass
+
+from sourse.events import Signal
+from sourse.logger import init_logger
+
+if typing.TYPE_CHECKING:
+    from sourse.marketmaker import MarketMaker
+
+DEFAULT_FILE = "./settings.json"
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+# wd, mask, cookie, name length
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class ConfigService:
+    """Parsed settings.json, shared by everything in the process.
+
+    The file is parsed once and served as typed views (the templates are kept
+    in sourse.store.TemplateStore). Changes are written to a temporary
+    file, which then replaces the config with os.replace(), so the file is never half-written.
+    After watch() the file is parsed again on each change on the disk (inotify on Linux,
+    polling of the modification time elsewhere), and `changed` is emitted with the new config
+    in the watcher's thread.
+    """
+
+    changed = Signal(object)
+
+    @dataclass
+    class Client:
+        pair: str
+        public_key: str
+        private_key: str
+
+    def __init__(self, file: str = DEFAULT_FILE):
+        self.path = os.path.abspath(file)
+        self.logger = init_logger(self.__class__.__name__)
+
+        self._lock = threading.RLock()
+        self._config: typing.Optional[dict] = None
+        # (modification time, size, inode) of the parsed file
+        self._signature: typing.Optional[typing.Tuple[int, int, int]] = None
+        self._watcher: typing.Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _file_signature(self) -> typing.Tuple[int, int, int]:
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _load(self) -> bool:
+        """_load Parse the file, if it is not parsed yet or has changed since.
+
+        Returns:
+            bool: True, if the file was parsed
+        """
+        with self._lock:
+            signature = self._file_signature()
+            if self._config is not None and signature == self._signature:
+                return False
+
+            with open(self.path, "r") as f:
+                self._config = json.load(f)
+            self._signature = signature
+            return True
+
+    @property
+    def data(self) -> dict:
+        """data The whole parsed config. It is shared, so it should only be changed by update()."""
+        if self._config is None or self._watcher is None:
+            self._load()
+        return typing.cast(dict, self._config)
+
+    # Typed views
+
+    @property
+    def client(self) -> ConfigService.Client:
+        return ConfigService.Client(**self.data["bitmex_client"])
+
+    @property
+    def marketmaker_settings(self) -> MarketMaker.Settings:
+        from sourse.marketmaker import MarketMaker
+
+        return MarketMaker.Settings(**self.data["marketmaker_settings"])
+
+    @property
+    def settings_description(self) -> typing.Dict[str, typing.Any]:
+        return self.data["settings_description"]
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        return self.data.get(key, default)
+
+    # Changes
+
+    def _write(self, config: dict) -> None:
+        directory, name = os.path.split(self.path)
+        descriptor, temporary = tempfile.mkstemp(prefix=f".{name}.", dir=directory)
+        try:
+            with os.fdopen(descriptor, "w") as f:
+                json.dump(config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            self._copy_permissions(temporary)
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def _copy_permissions(self, file: str) -> None:
+        """_copy_permissions Give the file the mode and the owner of the config,
+        instead of the 0600 of a temporary file, if the config exists."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        os.chmod(file, stat.st_mode & 0o7777)
+        owner = (stat.st_uid, stat.st_gid)
+        if hasattr(os, "chown") and owner != (os.getuid(), os.getgid()):
+            try:
+                os.chown(file, stat.st_uid, stat.st_gid)
+            except PermissionError:
+                self.logger.warning("Could not keep the owner of %s", self.path)
+
+    def update(self, change: typing.Callable[[dict], None]) -> None:
+        """update Change the config and write it.
+
+        The file is parsed again right before the change, if it has been modified meanwhile,
+        so the edits, made by somebody else, are not lost.
+
+        Args:
+            change (typing.Callable[[dict], None]): Modifies the config, passed to it, in place
+        """
+        with self._lock:
+            self._load()
+            config = copy.deepcopy(self._config)
+            change(typing.cast(dict, config))
+
+            self._write(typing.cast(dict, config))
+            self._config = config
+            self._signature = self._file_signature()
+
+        self.changed.emit(config)
+
+    def reload(self) -> bool:
+        """reload Parse the file again, if it has changed, and notify about it.
+
+        Returns:
+            bool: True, if the config has changed
+        """
+        try:
+            if not self._load():
+                return False
+        except (OSError, ValueError) as e:
+            # The file could be in the middle of a non-atomic write by another program
+            self.logger.warning("Could not reload %s: %s", self.path, e)
+            return False
+
+        self.logger.info("Reloaded %s", self.path)
+        self.changed.emit(self._config)
+        return True
+
+    # Watching
+
+    def watch(self, poll_interval: float = 1) -> None:
+        """watch Start reloading the config, when the file changes.
+
+        Args:
+            poll_interval (float, optional): Seconds between the checks,
+                if inotify is not available. Defaults to 1.
+        """
+        if self._watcher is not None:
+            return
+
+        self._load()
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_loop,
+            args=(poll_interval,),
+            name="ConfigWatcher",
+            daemon=True,
+        )
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch_loop(self, poll_interval: float) -> None:
+        descriptor = self._inotify_init()
+        if descriptor is None:
+            while not self._stop.wait(poll_interval):
+                self.reload()
+            return
+
+        name = os.path.basename(self.path).encode()
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([descriptor], [], [], poll_interval)
+                if not ready:
+                    continue
+
+                data = os.read(descriptor, 4096)
+                offset = 0
+                touched = False
+                while offset < len(data):
+                    _, _, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                    offset += _INOTIFY_EVENT.size
+                    touched |= data[offset : offset + length].rstrip(b"\0") == name
+                    offset += length
+
+                if touched:
+                    self.reload()
+        finally:
+            os.close(descriptor)
+
+    def _inotify_init(self) -> typing.Optional[int]:
+        """_inotify_init Inotify descriptor, watching the config's directory, or None.
+
+        The directory is watched, not the file, since os.replace() puts a new file
+        in place of the watched one.
+        """
+        library = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(library, use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return None
+
+        descriptor = inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if descriptor < 0:
+            return None
+
+        watch = inotify_add_watch(
+            descriptor,
+            os.fsencode(os.path.dirname(self.path)),
+            _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE,
+        )
+        if watch < 0:
+            os.close(descriptor)
+            return None
+
+        return descriptor
+
+
+_services: typing.Dict[str, ConfigService] = {}
+_services_lock = threading.Lock()
+
+
+def get_config(file: str = DEFAULT_FILE) -> ConfigService:
+    """get_config The shared config service of the file."""
+    path = os.path.abspath(file)
+    with _services_lock:
+        service = _services.get(path)
+        if service is None:
+            service = _services[path] = ConfigService(path)
+        return service
@@ -0,0 +1,156 @@
+"""Headless runner of the marketmaker bot.
+
+Usage:
+    python -m sourse.daemon [config.json] [--template name] [--cancel-on-exit]
+
+The config has the layout of settings.json: the keys are taken from "bitmex_client",
+the settings from "marketmaker_settings" (or from the given template of the store),
+an optional "metrics_port" starts the metrics server and an optional "journal" file
+keeps the bot's orders, position and balance between the runs. The run and its pnl
+are recorded in the store. Nothing from PyQt5 or pyqtgraph is imported, so it runs
+on a machine without a display.
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import asyncio
+import resource
+import signal
+import sys
+import time
+import typing
+
+from sourse.config import get_config
+from sourse.store import TemplateStore, get_store
+
+
+def load_config(file: str, template: typing.Optional[str] = None) -> dict:
+    """load_config Read the config and put the settings of the template, if it is given, in place."""
+    # A copy, since the parsed config is shared
+    config = dict(get_config(file).data)
+
+    if template is not None:
+        saved = get_store(get_config(file)).template(template)
+        if saved is None:
+            raise KeyError(f"There is no template called {template!r}")
+        config["marketmaker_settings"] = dataclasses.asdict(saved.settings)
+        config["template"] = template
+
+    return config
+
+
+async def run(
+    config: dict,
+    cancel_on_exit: bool = False,
+    started: typing.Optional[float] = None,
+    store: typing.Optional[TemplateStore] = None,
+) -> None:
+    """run Run the bot until SIGINT or SIGTERM.
+
+    Args:
+        config (dict): Loaded config
+        cancel_on_exit (bool, optional): Cancel the bot's orders before exiting. Defaults to False.
+        started (typing.Optional[float], optional): time.perf_counter() of the process start
+            for the startup report. Defaults to the call time.
+        store (typing.Optional[TemplateStore], optional): Store to record the run in.
+            Defaults to None.
+    """
+    if started is None:
+        started = time.perf_counter()
+
+    # Imported here, so the startup report covers the import time
+    from crypto_futures_py import BitmexExchangeHandler
+    from sourse.logger import init_logger
+    from sourse.journal import Journal
+    from sourse.marketmaker import MarketMaker
+    from sourse.metrics import MetricsServer
+
+    logger = init_logger("Daemon")
+
+    handler = BitmexExchangeHandler(
+        config["bitmex_client"]["public_key"], config["bitmex_client"]["private_key"]
+    )
+    market_maker = MarketMaker(
+        config["bitmex_client"]["pair"],
+        handler,
+        MarketMaker.Settings(**config["marketmaker_settings"]),
+        journal=Journal(config["journal"]) if config.get("journal") else None,
+    )
+    market_maker.error_occured.connect(
+        lambda error: logger.error("%s: %s", error.__class__.__name__, error)
+    )
+
+    server = None
+    if config.get("metrics_port") is not None:
+        server = MetricsServer(port=config["metrics_port"])
+        await server.start()
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_event_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stopped.set)
+
+    task = asyncio.ensure_future(market_maker.start())
+    run_id = (
+        store.start_run(config.get("template"), market_maker.pair_name)
+        if store is not None
+        else None
+    )
+
+    logger.info(
+        "Started %s in %.2fs, max RSS %.1f MB",
+        market_maker.pair_name,
+        time.perf_counter() - started,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+    if "PyQt5" in sys.modules:
+        logger.warning("PyQt5 was imported by the daemon")
+
+    await asyncio.wait(
+        [task, asyncio.ensure_future(stopped.wait())],
+        return_when=asyncio.FIRST_COMPLETED,
+    )
+
+    logger.info("Stopping")
+    market_maker.stop()
+    task.cancel()
+
+    if cancel_on_exit:
+        await market_maker.cancel_orders()
+    if server is not None:
+        server.stop()
+    if store is not None and run_id is not None:
+        store.finish_run(run_id, market_maker.pnl)
+
+    # Get the bot's error, if it has stopped on its own
+    if task.done() and not task.cancelled() and task.exception() is not None:
+        raise typing.cast(BaseException, task.exception())
+
+
+def main():
+    started = time.perf_counter()
+
+    parser = argparse.ArgumentParser(description="Run the marketmaker bot without UI")
+    parser.add_argument("config", nargs="?", default="settings.json")
+    parser.add_argument("--template", help="Use the settings of this template")
+    parser.add_argument(
+        "--cancel-on-exit",
+        action="store_true",
+        help="Cancel the bot's orders, when it is stopped",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(
+        run(
+            load_config(args.config, args.template),
+            args.cancel_on_exit,
+            started,
+            get_store(get_config(args.config)),
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
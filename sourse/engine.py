@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import typing
+
+import websocket
+
+from crypto_futures_py import AbstractExchangeHandler, BitmexExchangeHandler
+from sourse.bootstrap import start_user_update_socket
+from sourse.logger import init_logger
+from sourse.marketmaker import MarketMaker
+from sourse.order_gateway import OrderGateway
+
+
+class MarketMakerEngine:
+    """This class hosts several MarketMaker bots on one event loop.
+
+    All the bots share one handler, one order gateway (so they share the exchange rate limit),
+    one user update socket and one price socket, which are fanned out by symbol.
+    """
+
+    def __init__(self, handler: AbstractExchangeHandler):
+        self.handler = handler
+        self.gateway = OrderGateway(handler)
+        self.logger = init_logger(self.__class__.__name__)
+
+        self._routes: typing.Dict[str, typing.List[MarketMaker]] = {}
+        self._working = False
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: typing.List[asyncio.Future] = []
+        self._price_socket: typing.Optional[websocket.WebSocketApp] = None
+
+    @property
+    def symbols(self) -> typing.List[str]:
+        return list(self._routes.keys())
+
+    @property
+    def market_makers(self) -> typing.List[MarketMaker]:
+        return [bot for bots in self._routes.values() for bot in bots]
+
+    def create_market_maker(
+        self, pair_name: str, settings: MarketMaker.Settings
+    ) -> MarketMaker:
+        """create_market_maker Create a new bot, which uses the engine's handler and gateway, and add it."""
+        market_maker = MarketMaker(pair_name, self.handler, settings, self.gateway)
+        self.add(market_maker)
+        return market_maker
+
+    def add(self, market_maker: MarketMaker) -> None:
+        """add Add a bot to the engine. If the engine is working, the bot is started at once."""
+        new_symbol = market_maker.pair_name not in self._routes
+        self._routes.setdefault(market_maker.pair_name, []).append(market_maker)
+
+        if self._working:
+            assert self._loop is not None
+            if new_symbol:
+                self._subscribe_price(market_maker.pair_name)
+            self._loop.call_soon_threadsafe(self._start_market_maker, market_maker)
+
+    def _start_market_maker(self, market_maker: MarketMaker) -> None:
+        self._tasks.append(asyncio.ensure_future(market_maker.start(subscribe=False)))
+
+    def _on_user_update(self, data: AbstractExchangeHandler.UserUpdate) -> None:
+        if isinstance(data, AbstractExchangeHandler.BalanceUpdate):
+            # The margin is shared by all the symbols
+            for market_maker in self.market_makers:
+                market_maker._on_user_update(data)
+            return
+
+        for market_maker in self._routes.get(data.symbol, []):
+            market_maker._on_user_update(data)
+
+    def _on_price_changed(
+        self, symbol: str, data: AbstractExchangeHandler.PriceCallback
+    ) -> None:
+        for market_maker in self._routes.get(symbol, []):
+            market_maker._on_price_changed(data)
+
+    def _subscribe_price(self, symbol: str) -> None:
+        if self._price_socket is not None:
+            self._price_socket.send(
+                json.dumps({"op": "subscribe", "args": [f"instrument:{symbol}"]})
+            )
+        else:
+            self.handler.start_price_socket_threaded(
+                lambda data, symbol=symbol: self._on_price_changed(symbol, data),
+                symbol,
+            )
+
+    def _start_bitmex_price_socket(self) -> None:
+        """_start_bitmex_price_socket Start one BitMEX instrument socket for all the symbols."""
+
+        def __on_message(ws, msg):
+            msg = json.loads(msg)
+            for data in msg.get("data", []):
+                if "symbol" in data and "lastPriceProtected" in data:
+                    self._on_price_changed(
+                        data["symbol"],
+                        AbstractExchangeHandler.PriceCallback(
+                            price=data["lastPriceProtected"]
+                        ),
+                    )
+
+        def __on_error(ws, error):
+            self.logger.error("Error occured in %s: %s", ws, error)
+
+        def __on_close(ws, *args):
+            if self._working:
+                self.logger.warning(
+                    "Websocket is restarting, might have lost some data"
+                )
+                self._start_bitmex_price_socket()
+                self.resync()
+
+        subscription = ",".join(f"instrument:{symbol}" for symbol in self.symbols)
+        self._price_socket = websocket.WebSocketApp(
+            f"{BitmexExchangeHandler.domen}/realtime?subscribe={subscription}",
+            on_message=__on_message,
+            on_error=__on_error,
+            on_close=__on_close,
+        )
+        threading.Thread(target=self._price_socket.run_forever, daemon=True).start()
+
+    def resync(self) -> None:
+        """resync Reload the state of all the bots from the exchange. Could be called from any thread."""
+        if self._loop is None:
+            return
+
+        for market_maker in self.market_makers:
+            asyncio.run_coroutine_threadsafe(market_maker.resync(), self._loop)
+
+    async def start(self) -> None:
+        """Start all the bots and the shared sockets."""
+        self._working = True
+        self._loop = asyncio.get_event_loop()
+
+        for market_maker in self.market_makers:
+            self._start_market_maker(market_maker)
+
+        # Let the bots set up their event queues before the first updates arrive
+        await asyncio.sleep(0)
+
+        start_user_update_socket(self.handler, self._on_user_update, self.resync)
+
+        if isinstance(self.handler, BitmexExchangeHandler):
+            self._start_bitmex_price_socket()
+        else:
+            for symbol in self.symbols:
+                self._subscribe_price(symbol)
+
+        while self._working:
+            await asyncio.sleep(1)
+
+    def stop(self) -> None:
+        self._working = False
+
+        for market_maker in self.market_makers:
+            market_maker.stop()
+
+        if self._price_socket is not None:
+            self._price_socket.close()
+            self._price_socket = None
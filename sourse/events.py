@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import typing
+
+Slot = typing.Callable[..., typing.Any]
+
+
+class BoundSignal:
+    """Signal of one object: the connected slots are called in the emitting thread."""
+
+    def __init__(self, name: str):
+        self.name = name
+        # A tuple is replaced, not modified, so emit() could run while other threads connect
+        self._slots: typing.Tuple[Slot, ...] = ()
+
+    def connect(self, slot: Slot) -> None:
+        self._slots = self._slots + (slot,)
+
+    def disconnect(self, slot: typing.Optional[Slot] = None) -> None:
+        """disconnect Disconnect the slot, or all the slots, if it is not given."""
+        if slot is None:
+            self._slots = ()
+        elif slot in self._slots:
+            slots = list(self._slots)
+            slots.remove(slot)
+            self._slots = tuple(slots)
+        else:
+            raise TypeError(f"{slot} is not connected to {self.name}")
+
+    def emit(self, *args: typing.Any) -> None:
+        for slot in self._slots:
+            slot(*args)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+class Signal:
+    """Plain Python replacement of QtCore.pyqtSignal, declared as a class attribute.
+
+    Each instance of the class gets its own BoundSignal on the first access.
+    There is no event loop behind it, so a slot, that has to run in a different thread
+    (for example, in the Qt main thread), should be connected through a bridge.
+    """
+
+    def __init__(self, *types: typing.Any):
+        self.types = types
+        self.name = ""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(
+        self, instance: typing.Any, owner: typing.Optional[type] = None
+    ) -> typing.Any:
+        if instance is None:
+            return self
+
+        # Stored under the same name, so the next lookups do not reach the descriptor
+        bound = instance.__dict__[self.name] = BoundSignal(self.name)
+        return bound
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import functools
+import typing
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from crypto_futures_py import AbstractExchangeHandler
+from sourse.order_store import OrderLevel, OrderStore
+
+if typing.TYPE_CHECKING:
+    from sourse.marketmaker import MarketMaker
+
+GridOrder = typing.Tuple[str, float, float, str]
+GridParameters = typing.Tuple[
+    float, bool, typing.Optional[float], int, float, float, float, float
+]
+
+# One row per grid level: side is 1 for "Buy" and -1 for "Sell"
+GRID_DTYPE = np.dtype([("side", "i1"), ("price", "f8"), ("volume", "i8")])
+
+
+def generate_grid(
+    price: float,
+    position: MarketMaker.Position,
+    settings: MarketMaker.Settings,
+) -> np.ndarray:
+    """generate_grid Compute the whole grid ladder for both sides at once.
+
+    The grid is cached by everything it depends on, so the returned array is read-only.
+
+    Args:
+        price (float): The price, the grid is built from
+        position (MarketMaker.Position): Current position, used for min/max position gating
+        settings (MarketMaker.Settings): Settings of the bot
+
+    Returns:
+        np.ndarray: Structured array of GRID_DTYPE, short levels first,
+            each side from the nearest to the price outwards
+    """
+    return _grid_levels(*grid_parameters(price, position, settings))
+
+
+def grid_parameters(
+    price: float,
+    position: MarketMaker.Position,
+    settings: MarketMaker.Settings,
+) -> GridParameters:
+    """grid_parameters Everything the grid depends on, the same parameters give the same grid."""
+
+    half_spread = settings.min_spread // 2
+
+    # Creating long orders
+    long_start_price: typing.Optional[float] = None
+    if position.volume < settings.max_position:
+        long_start_price = (
+            position.price
+            if settings.adjust_grid_by_position
+            and position.volume < 0
+            and price - half_spread > position.price
+            else price - half_spread
+        )
+
+    return (
+        price,
+        # Creating short orders
+        position.volume > settings.min_position,
+        long_start_price,
+        settings.orders_pairs,
+        settings.orders_start_size,
+        settings.order_step_size,
+        settings.interval,
+        half_spread,
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _grid_levels(
+    price: float,
+    shorts: bool,
+    long_start_price: typing.Optional[float],
+    orders_pairs: int,
+    orders_start_size: float,
+    order_step_size: float,
+    interval: float,
+    half_spread: float,
+) -> np.ndarray:
+    levels = np.arange(orders_pairs)
+    volumes = orders_start_size + order_step_size * levels
+
+    sides: typing.List[np.ndarray] = []
+    prices: typing.List[np.ndarray] = []
+
+    if shorts:
+        sides.append(np.full(orders_pairs, -1))
+        prices.append(price + (half_spread + levels * interval))
+
+    if long_start_price is not None:
+        sides.append(np.full(orders_pairs, 1))
+        prices.append(long_start_price - levels * interval)
+
+    grid = np.empty(len(sides) * orders_pairs, dtype=GRID_DTYPE)
+
+    if len(sides) > 0:
+        grid["side"] = np.concatenate(sides)
+        grid["price"] = np.round(np.trunc(np.concatenate(prices) * 2) / 2, 1)
+        grid["volume"] = np.tile(volumes, len(sides))
+
+    grid.flags.writeable = False
+    return grid
+
+
+def grid_orders(grid: np.ndarray) -> typing.List[GridOrder]:
+    """grid_orders Convert grid levels into the handler's order tuples with new client order ids."""
+    return [
+        (
+            "Buy" if side > 0 else "Sell",
+            price,
+            volume,
+            AbstractExchangeHandler.generate_client_order_id(),
+        )
+        for side, price, volume in zip(
+            grid["side"].tolist(), grid["price"].tolist(), grid["volume"].tolist()
+        )
+    ]
+
+
+@dataclass
+class GridDiff:
+    """The difference between the target grid and the orders, that are already placed.
+
+    Attributes:
+        to_cancel (typing.List[str]): Server order ids of the levels, that went away
+        to_create (np.ndarray): Grid levels, that are not placed yet
+        kept (typing.List[GridOrder]): Orders, that are already placed and stay as they are
+        naive_requests (int): Amount of requests the cancel-all/recreate rebuild would make
+        batch_size (int): Maximal amount of orders in one request
+    """
+
+    to_cancel: typing.List[str] = field(default_factory=list)
+    to_create: np.ndarray = field(default_factory=lambda: np.empty(0, GRID_DTYPE))
+    kept: typing.List[GridOrder] = field(default_factory=list)
+    naive_requests: int = 0
+    batch_size: int = 1
+
+    def batches(self, orders: int) -> int:
+        return -(-orders // self.batch_size)
+
+    @property
+    def requests(self) -> int:
+        return self.batches(len(self.to_cancel)) + self.batches(len(self.to_create))
+
+    @property
+    def saved_requests(self) -> int:
+        return self.naive_requests - self.requests
+
+
+def reconcile_grid(
+    target: np.ndarray, live_orders: OrderStore, batch_size: int = 1
+) -> GridDiff:
+    """reconcile_grid Compare the target grid with the live orders by (side, price) level.
+
+    A live order is kept only if it stands on the level of the target grid with the same volume.
+    Live orders on levels, that went away (or with a different volume), are canceled.
+    Orders, that did not get their server id yet (PENDING), could not be canceled:
+    with the right volume they are kept, otherwise they are left alone and the level
+    is created anew, the next rebuild will cancel them, if still unneeded.
+
+    Args:
+        target (np.ndarray): Grid of GRID_DTYPE, as returned by generate_grid()
+        live_orders (OrderStore): Store of the placed orders
+        batch_size (int, optional): Maximal amount of orders in one request,
+            to count the requests with. Defaults to 1.
+
+    Returns:
+        GridDiff: Orders to cancel, levels to create and orders to keep
+    """
+
+    diff = GridDiff(batch_size=batch_size)
+    diff.naive_requests = diff.batches(len(live_orders.order_ids())) + diff.batches(
+        len(target)
+    )
+
+    create = np.zeros(len(target), dtype=bool)
+    target_levels: typing.Set[OrderLevel] = set()
+
+    for i, (side, price, volume) in enumerate(
+        zip(
+            target["side"].tolist(), target["price"].tolist(), target["volume"].tolist()
+        )
+    ):
+        side = "Buy" if side > 0 else "Sell"
+        target_levels.add((side, price))
+
+        placed = live_orders.at_level(side, price)
+        kept = next((order for order in placed if order.volume == volume), None)
+
+        if kept is None:
+            create[i] = True
+        else:
+            diff.kept.append((side, price, kept.volume, kept.client_orderID))
+
+        # Two orders on the same level (for example left from a previous run)
+        diff.to_cancel.extend(
+            order.orderID
+            for order in placed
+            if order is not kept and order.orderID != ""
+        )
+
+    diff.to_create = target[create]
+
+    for level in list(live_orders.levels()):
+        if level not in target_levels:
+            diff.to_cancel.extend(
+                order.orderID
+                for order in live_orders.at_level(*level)
+                if order.orderID != ""
+            )
+
+    return diff
@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+import threading
+import typing
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from crypto_futures_py import AbstractExchangeHandler
+from sourse.logger import init_logger
+from sourse.order_store import OrderRecord, OrderStore
+
+# Record: header (payload length, type), payload, trailer (crc32 of the payload, payload length).
+# The trailing length lets the journal be read backwards from its end.
+_HEADER = struct.Struct("<IB")
+_TRAILER = struct.Struct("<II")
+_STRING_LENGTH = struct.Struct("<H")
+
+_ORDER = struct.Struct("<dddddd")
+_POSITION = struct.Struct("<dd")
+_BALANCE = struct.Struct("<d")
+_SNAPSHOT = struct.Struct("<dddI")
+_SNAPSHOT_ORDER = struct.Struct("<ddd")
+
+
+def _pack_strings(*values: str) -> bytes:
+    data = b""
+    for value in values:
+        encoded = value.encode()
+        data += _STRING_LENGTH.pack(len(encoded)) + encoded
+    return data
+
+
+def _unpack_strings(
+    buffer: typing.Any, offset: int, count: int
+) -> typing.Tuple[typing.List[str], int]:
+    values = []
+    for _ in range(count):
+        (length,) = _STRING_LENGTH.unpack_from(buffer, offset)
+        offset += _STRING_LENGTH.size
+        values.append(bytes(buffer[offset : offset + length]).decode())
+        offset += length
+    return values, offset
+
+
+class Journal:
+    """Append-only binary journal of a bot's order updates, position and balance.
+
+    Records are encoded on the caller's thread and written by a writer thread,
+    which commits everything, that has piled up during the previous fsync, with one write
+    and one fsync (group commit), so appending never waits for the disk.
+
+    A snapshot of the whole state is appended every snapshot_interval records,
+    so the recovery only has to scan back to the last snapshot and replay the records after it.
+    """
+
+    ORDER = 1
+    POSITION = 2
+    BALANCE = 3
+    SNAPSHOT = 4
+
+    @dataclass
+    class State:
+        orders: OrderStore = field(default_factory=OrderStore)
+        position: typing.Optional[typing.Tuple[float, float]] = None
+        balance: typing.Optional[float] = None
+        replayed: int = 0
+
+    def __init__(self, path: str, snapshot_interval: int = 10000):
+        """__init__ Create a new journal.
+
+        Args:
+            path (str): Journal file, created if it does not exist
+            snapshot_interval (int, optional): Amount of records between the snapshots.
+                Defaults to 10000.
+        """
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+
+        self.logger = init_logger(self.__class__.__name__)
+
+        self._file: typing.Optional[typing.BinaryIO] = None
+        self._thread: typing.Optional[threading.Thread] = None
+        self._condition = threading.Condition()
+        self._pending: typing.List[bytes] = []
+        self._appended = 0
+        self._committed = 0
+        self._closing = False
+        self._since_snapshot = 0
+
+    @property
+    def snapshot_due(self) -> bool:
+        return self._since_snapshot >= self.snapshot_interval
+
+    @staticmethod
+    def _record_end(buffer: typing.Any, start: int, size: int) -> int:
+        """_record_end End of a valid record, starting at start, or -1."""
+        if start + _HEADER.size + _TRAILER.size > size:
+            return -1
+
+        length, kind = _HEADER.unpack_from(buffer, start)
+        end = start + _HEADER.size + length + _TRAILER.size
+        if not 1 <= kind <= 4 or end > size:
+            return -1
+
+        crc, trailing_length = _TRAILER.unpack_from(buffer, end - _TRAILER.size)
+        payload = buffer[start + _HEADER.size : end - _TRAILER.size]
+        if trailing_length != length or zlib.crc32(payload) != crc:
+            return -1
+        return end
+
+    def _valid_size(self, buffer: typing.Any, size: int) -> int:
+        """_valid_size Size of the journal without a torn tail.
+
+        A crash could leave a part of the last write at the end, so the end of the last
+        valid record is searched backwards, byte by byte, from the end of the file.
+        """
+        end = size
+        while end >= _HEADER.size + _TRAILER.size:
+            _, length = _TRAILER.unpack_from(buffer, end - _TRAILER.size)
+            start = end - _TRAILER.size - length - _HEADER.size
+            if start >= 0 and self._record_end(buffer, start, end) == end:
+                return end
+            end -= 1
+
+        return 0
+
+    @staticmethod
+    def _order_update(
+        strings: typing.List[str], numbers: typing.Tuple[float, ...]
+    ) -> AbstractExchangeHandler.OrderUpdate:
+        orderID, client_orderID, status, symbol, fee_asset = strings
+        price, average_price, fee, volume, volume_realized, timestamp = numbers
+        return AbstractExchangeHandler.OrderUpdate(
+            orderID=orderID,
+            client_orderID=client_orderID,
+            status=status,
+            symbol=symbol,
+            price=price,
+            average_price=average_price,
+            fee=fee,
+            fee_asset=fee_asset,
+            volume=volume,
+            volume_realized=volume_realized,
+            time=datetime.fromtimestamp(timestamp, timezone.utc),
+            message={},
+        )
+
+    def _replay_snapshot(self, buffer: typing.Any, offset: int) -> Journal.State:
+        volume, price, balance, count = _SNAPSHOT.unpack_from(buffer, offset)
+        (symbol,), offset = _unpack_strings(buffer, offset + _SNAPSHOT.size, 1)
+
+        state = Journal.State(
+            position=(volume, price), balance=None if math.isnan(balance) else balance
+        )
+        for _ in range(count):
+            order_price, order_volume, realized = _SNAPSHOT_ORDER.unpack_from(
+                buffer, offset
+            )
+            (client_orderID, orderID, side, status), offset = _unpack_strings(
+                buffer, offset + _SNAPSHOT_ORDER.size, 4
+            )
+            sign = 1 if side == "Buy" else -1
+            state.orders.apply(
+                self._order_update(
+                    [orderID, client_orderID, status, symbol, ""],
+                    (
+                        order_price,
+                        order_price,
+                        0,
+                        sign * order_volume,
+                        sign * realized,
+                        0,
+                    ),
+                )
+            )
+
+        return state
+
+    def recover(self) -> Journal.State:
+        """recover Rebuild the state from the last snapshot and the records after it.
+
+        Should be called before open().
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return Journal.State()
+
+        with open(self.path, "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buffer:
+            size = self._valid_size(buffer, len(buffer))
+
+            # Back to the last snapshot, using the trailing lengths
+            start = size
+            while start > 0:
+                _, length = _TRAILER.unpack_from(buffer, start - _TRAILER.size)
+                start -= _HEADER.size + length + _TRAILER.size
+                if buffer[start + 4] == self.SNAPSHOT:
+                    break
+
+            state = Journal.State()
+            offset = start
+            while offset < size:
+                length, kind = _HEADER.unpack_from(buffer, offset)
+                payload = offset + _HEADER.size
+
+                if kind == self.ORDER:
+                    numbers = _ORDER.unpack_from(buffer, payload)
+                    strings, _ = _unpack_strings(buffer, payload + _ORDER.size, 5)
+                    state.orders.apply(self._order_update(strings, numbers))
+                elif kind == self.POSITION:
+                    state.position = _POSITION.unpack_from(buffer, payload)
+                elif kind == self.BALANCE:
+                    (state.balance,) = _BALANCE.unpack_from(buffer, payload)
+                else:
+                    state = self._replay_snapshot(buffer, payload)
+
+                state.replayed += 1
+                offset = payload + length + _TRAILER.size
+
+        self.logger.info(
+            "Recovered %s orders from %s records of %s",
+            len(state.orders),
+            state.replayed,
+            self.path,
+        )
+        return state
+
+    def open(self) -> None:
+        """open Start appending to the journal. A torn last record is cut off."""
+        self._file = open(self.path, "ab")
+
+        size = os.path.getsize(self.path)
+        if size > 0:
+            with open(self.path, "rb") as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as buffer:
+                valid = self._valid_size(buffer, size)
+            if valid != size:
+                self.logger.warning("Cutting off a torn record of %s", self.path)
+                self._file.truncate(valid)
+
+        self._closing = False
+        self._thread = threading.Thread(
+            target=self._write_loop, name="Journal", daemon=True
+        )
+        self._thread.start()
+
+    def _write_loop(self) -> None:
+        assert self._file is not None
+
+        while True:
+            with self._condition:
+                while len(self._pending) == 0 and not self._closing:
+                    self._condition.wait()
+                if len(self._pending) == 0:
+                    return
+                pending, self._pending = self._pending, []
+
+            self._file.write(b"".join(pending))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            with self._condition:
+                self._committed += len(pending)
+                self._condition.notify_all()
+
+    def _append(self, kind: int, payload: bytes) -> None:
+        record = (
+            _HEADER.pack(len(payload), kind)
+            + payload
+            + _TRAILER.pack(zlib.crc32(payload), len(payload))
+        )
+        with self._condition:
+            self._pending.append(record)
+            self._appended += 1
+            self._condition.notify()
+
+        self._since_snapshot += 1
+
+    def append_order(self, update: AbstractExchangeHandler.OrderUpdate) -> None:
+        self._append(
+            self.ORDER,
+            _ORDER.pack(
+                update.price,
+                update.average_price,
+                update.fee,
+                update.volume,
+                update.volume_realized,
+                update.time.timestamp() if update.time is not None else 0,
+            )
+            + _pack_strings(
+                update.orderID,
+                update.client_orderID,
+                update.status,
+                update.symbol,
+                update.fee_asset,
+            ),
+        )
+
+    def append_position(self, volume: float, price: float) -> None:
+        self._append(self.POSITION, _POSITION.pack(volume, price))
+
+    def append_balance(self, balance: float) -> None:
+        self._append(self.BALANCE, _BALANCE.pack(balance))
+
+    def append_snapshot(
+        self,
+        symbol: str,
+        orders: typing.Iterable[OrderRecord],
+        volume: float,
+        price: float,
+        balance: float,
+    ) -> None:
+        orders = list(orders)
+        payload = [
+            _SNAPSHOT.pack(volume, price, balance, len(orders)),
+            _pack_strings(symbol),
+        ]
+        for order in orders:
+            payload.append(
+                _SNAPSHOT_ORDER.pack(order.price, order.volume, order.volume_realized)
+            )
+            payload.append(
+                _pack_strings(
+                    order.client_orderID, order.orderID, order.side, order.status
+                )
+            )
+
+        self._append(self.SNAPSHOT, b"".join(payload))
+        self._since_snapshot = 0
+
+    def flush(self, timeout: typing.Optional[float] = None) -> bool:
+        """flush Wait until the records, appended so far, are on the disk.
+
+        Returns:
+            bool: False, if the timeout has passed earlier
+        """
+        with self._condition:
+            target = self._appended
+            return self._condition.wait_for(lambda: self._committed >= target, timeout)
+
+    def close(self) -> None:
+        """close Commit the pending records and stop the writer thread."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+import math
+import time
+import typing
+
+
+class LatencyHistogram:
+    """HDR-style histogram of durations in nanoseconds.
+
+    Values are counted in log-linear buckets: each power of two is split into
+    2 ** (precision_bits - 1) linear sub-buckets, so any recorded value is kept
+    with a relative error below 2 ** (1 - precision_bits) (1.6% by default),
+    while the memory grows only with the logarithm of the maximal value.
+    """
+
+    def __init__(self, precision_bits: int = 7):
+        self._bits = precision_bits
+        self._half = 1 << (precision_bits - 1)
+        self._counts: typing.List[int] = []
+
+        self.count = 0
+        self.total = 0
+        self.min: typing.Optional[int] = None
+        self.max: typing.Optional[int] = None
+
+    def _index(self, value: int) -> int:
+        if value < 2 * self._half:
+            return value
+
+        shift = value.bit_length() - self._bits
+        return (shift + 1) * self._half + (value >> shift) - self._half
+
+    def _bucket_range(self, index: int) -> typing.Tuple[int, int]:
+        if index < 2 * self._half:
+            return index, index
+
+        shift = index // self._half - 1
+        lowest = (index % self._half + self._half) << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def record(self, nanoseconds: int) -> None:
+        value = max(0, int(nanoseconds))
+        index = self._index(value)
+
+        if index >= len(self._counts):
+            self._counts.extend([0] * (index + 1 - len(self._counts)))
+        self._counts[index] += 1
+
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count > 0 else 0
+
+    def percentile(self, percent: float) -> int:
+        """percentile Value in nanoseconds, that percent of the recorded values do not exceed."""
+        if self.count == 0:
+            return 0
+
+        rank = max(1, math.ceil(percent / 100 * self.count))
+        seen = 0
+
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                lowest, highest = self._bucket_range(index)
+                return min((lowest + highest) // 2, typing.cast(int, self.max))
+
+        return typing.cast(int, self.max)
+
+    def summary(self) -> typing.Dict[str, float]:
+        """summary Count and the statistics in microseconds."""
+        return {
+            "count": self.count,
+            "min": (self.min or 0) / 1000,
+            "mean": self.mean / 1000,
+            "p50": self.percentile(50) / 1000,
+            "p90": self.percentile(90) / 1000,
+            "p99": self.percentile(99) / 1000,
+            "p999": self.percentile(99.9) / 1000,
+            "max": (self.max or 0) / 1000,
+        }
+
+    def reset(self) -> None:
+        self._counts.clear()
+        self.count = 0
+        self.total = 0
+        self.min = self.max = None
+
+
+class LatencyTracker:
+    """Tick-to-trade latency of the grid orders, measured per client order id.
+
+    Each order is stamped with time.perf_counter_ns() at these points:
+        tick: the price update, the grid was built from, arrived
+        generated: the grid was generated
+        created: the create request returned
+        acknowledged: the NEW update of the order arrived
+
+    and the intervals are aggregated into one histogram per stage:
+        strategy: tick -> generated (queueing, debounce and the grid logic)
+        request: generated -> created (rate limit and the http request)
+        acknowledge: generated -> acknowledged (the exchange and the user socket)
+        tick_to_trade: tick -> acknowledged
+    """
+
+    STAGES = ("strategy", "request", "acknowledge", "tick_to_trade")
+
+    def __init__(self, max_pending: int = 100000):
+        """__init__ Create a new tracker.
+
+        Args:
+            max_pending (int, optional): Maximal amount of orders, waiting for the last stamp.
+                The oldest ones are dropped after that. Defaults to 100000.
+        """
+        self.max_pending = max_pending
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+
+        # client order id -> [tick, generated, created, acknowledged]
+        self._pending: typing.Dict[str, typing.List[typing.Optional[int]]] = {}
+
+    @staticmethod
+    def now() -> int:
+        return time.perf_counter_ns()
+
+    def on_grid_generated(
+        self,
+        tick: typing.Optional[int],
+        generated: int,
+        client_orderIDs: typing.Iterable[str],
+    ) -> None:
+        if tick is not None:
+            self.histograms["strategy"].record(generated - tick)
+
+        for client_orderID in client_orderIDs:
+            self._pending[client_orderID] = [tick, generated, None, None]
+
+        while len(self._pending) > self.max_pending:
+            del self._pending[next(iter(self._pending))]
+
+    def on_orders_created(
+        self, client_orderIDs: typing.Iterable[str], created: int
+    ) -> None:
+        for client_orderID in client_orderIDs:
+            stamps = self._pending.get(client_orderID)
+            if stamps is None:
+                continue
+
+            stamps[2] = created
+            self.histograms["request"].record(created - typing.cast(int, stamps[1]))
+            self._finish(client_orderID, stamps)
+
+    def on_acknowledged(self, client_orderID: str, acknowledged: int) -> None:
+        stamps = self._pending.get(client_orderID)
+        if stamps is None or stamps[3] is not None:
+            return
+
+        stamps[3] = acknowledged
+        self.histograms["acknowledge"].record(
+            acknowledged - typing.cast(int, stamps[1])
+        )
+        if stamps[0] is not None:
+            self.histograms["tick_to_trade"].record(acknowledged - stamps[0])
+        self._finish(client_orderID, stamps)
+
+    def forget(self, client_orderID: str) -> None:
+        """forget Stop waiting for the order (for example, it has failed)."""
+        self._pending.pop(client_orderID, None)
+
+    def _finish(
+        self, client_orderID: str, stamps: typing.List[typing.Optional[int]]
+    ) -> None:
+        if stamps[2] is not None and stamps[3] is not None:
+            del self._pending[client_orderID]
+
+    def get_stamps(
+        self, client_orderID: str
+    ) -> typing.Optional[typing.List[typing.Optional[int]]]:
+        return self._pending.get(client_orderID)
+
+    def summary(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        """summary Statistics of each stage in microseconds."""
+        return {
+            stage: histogram.summary() for stage, histogram in self.histograms.items()
+        }
+
+    def dump(self, file: typing.Optional[str] = None) -> str:
+        """dump Return the summary as json, and write it to the file, if it is given."""
+        data = json.dumps(self.summary(), indent=4)
+
+        if file is not None:
+            with open(file, "w") as f:
+                f.write(data)
+
+        return data
+
+    def reset(self) -> None:
+        self._pending.clear()
+        for histogram in self.histograms.values():
+            histogram.reset()
@@ -2,30 +2,78 @@ from __future__ import annotations
 
 import asyncio
 import time
-import json
 import traceback
 import typing
 from datetime import datetime
 from dataclasses import dataclass
 
+import numpy as np
+
 from crypto_futures_py import AbstractExchangeHandler, BitmexExchangeHandler
+from sourse.bootstrap import StateSource, start_user_update_socket
+from sourse.config import get_config
+from sourse.events import Signal
 from sourse.logger import init_logger
-from PyQt5 import QtCore
-
-
-class MarketMaker(QtCore.QObject):
-    """This class encapsulates a handler and starts a marketmaking bot."""
-
-    period_updated = QtCore.pyqtSignal(object)
-    candle_appeared = QtCore.pyqtSignal(object)
-    grid_updates = QtCore.pyqtSignal(object)
-    order_updated = QtCore.pyqtSignal(object)
-    position_updated = QtCore.pyqtSignal(object)
-    server_position_updated = QtCore.pyqtSignal(object)
-    price_updated = QtCore.pyqtSignal(float)
-    balance_updated = QtCore.pyqtSignal(float)
-    server_balance_updated = QtCore.pyqtSignal(float)
-    error_occured = QtCore.pyqtSignal(object)
+from sourse.grid import GridOrder, generate_grid, grid_orders, reconcile_grid
+from sourse.journal import Journal
+from sourse.latency import LatencyTracker
+from sourse.metrics import REGISTRY, MetricsServer
+from sourse.order_gateway import CreateOrdersError, OrderGateway
+from sourse.order_store import OrderStore
+
+ORDERS_SENT = REGISTRY.counter(
+    "marketmaker_orders_sent_total", "Orders sent to the exchange", ["symbol"]
+)
+ORDERS_CANCELED = REGISTRY.counter(
+    "marketmaker_orders_canceled_total", "Orders canceled by the exchange", ["symbol"]
+)
+ORDERS_FILLED = REGISTRY.counter(
+    "marketmaker_orders_filled_total", "Orders filled by the exchange", ["symbol"]
+)
+REBUILDS = REGISTRY.counter("marketmaker_rebuilds_total", "Grid rebuilds", ["symbol"])
+REBUILD_DURATION = REGISTRY.histogram(
+    "marketmaker_rebuild_duration_seconds",
+    "Duration of a grid rebuild, including the requests",
+    ["symbol"],
+)
+OPEN_ORDERS = REGISTRY.gauge(
+    "marketmaker_open_orders", "Orders of the bot, open on the exchange", ["symbol"]
+)
+POSITION = REGISTRY.gauge(
+    "marketmaker_position", "Calculated position volume", ["symbol"]
+)
+BALANCE_DRIFT = REGISTRY.gauge(
+    "marketmaker_balance_drift",
+    "Server balance minus the calculated balance",
+    ["symbol"],
+)
+EVENTS_QUEUE_DEPTH = REGISTRY.gauge(
+    "marketmaker_events_queue_depth",
+    "Feed events, drained from the queue in the last batch",
+    ["symbol"],
+)
+
+
+class MarketMaker:
+    """This class encapsulates a handler and starts a marketmaking bot.
+
+    Signals are emitted in the thread of the event loop, the bot runs on.
+    """
+
+    period_updated = Signal(object)
+    candle_appeared = Signal(object)
+    grid_updates = Signal(object)
+    order_updated = Signal(object)
+    position_updated = Signal(object)
+    server_position_updated = Signal(object)
+    price_updated = Signal(float)
+    balance_updated = Signal(float)
+    server_balance_updated = Signal(float)
+    error_occured = Signal(object)
+    grid_reconciled = Signal(object)
+
+    # Seconds an order waits for its server id, before it is considered lost
+    PENDING_TIMEOUT = 60.0
 
     @dataclass
     class Settings:
@@ -41,6 +89,7 @@ class MarketMaker(QtCore.QObject):
         adjust_grid_by_position: bool
         min_position: int
         max_position: int
+        rebuild_min_interval: float = 1.0
 
     @dataclass
     class Position:
@@ -58,6 +107,8 @@ class MarketMaker(QtCore.QObject):
         pair_name: str,
         handler: AbstractExchangeHandler,
         settings: MarketMaker.Settings,
+        gateway: typing.Optional[OrderGateway] = None,
+        journal: typing.Optional[Journal] = None,
     ):
         """__init__ Create a new MarketMaker bot.
 
@@ -65,24 +116,56 @@ class MarketMaker(QtCore.QObject):
             pair_name (str): [description]
             handler (AbstractExchangeHandler): [description]
             settings (MarketMaker.Settings): [description]
+            gateway (typing.Optional[OrderGateway], optional): Gateway to send orders through,
+                could be shared by several bots. Defaults to a new gateway for the handler.
+            journal (typing.Optional[Journal], optional): Journal to record the orders, position
+                and balance in, and to recover them from on start. Defaults to None.
         """
-        super().__init__(None)
-
         self.pair_name = pair_name
         self.handler = handler
+        self.gateway = gateway if gateway is not None else OrderGateway(handler)
         self.update_settings(settings)
         self.position = MarketMaker.Position()
         self.balance: float = float("nan")
+        # Balance, when it was loaded by this run, for the pnl
+        self.start_balance: float = float("nan")
 
         self.logger = init_logger(self.__class__.__name__)
 
-        self._current_orders: typing.Dict[str, str] = {}
+        self.orders = OrderStore()
+        # Client ids of the orders, whose create requests are not answered yet
+        self._in_flight: typing.Set[str] = set()
+        self.journal = journal
+        self.state_source = StateSource.for_handler(handler)
+        self.latency = LatencyTracker()
+        self._metrics_sent = ORDERS_SENT.labels(pair_name)
+        self._metrics_canceled = ORDERS_CANCELED.labels(pair_name)
+        self._metrics_filled = ORDERS_FILLED.labels(pair_name)
+        self._metrics_rebuilds = REBUILDS.labels(pair_name)
+        self._metrics_rebuild_duration = REBUILD_DURATION.labels(pair_name)
+        self._metrics_open_orders = OPEN_ORDERS.labels(pair_name)
+        self._metrics_position = POSITION.labels(pair_name)
+        self._metrics_balance_drift = BALANCE_DRIFT.labels(pair_name)
+        self._metrics_events = EVENTS_QUEUE_DEPTH.labels(pair_name)
         self._current_price: typing.Optional[float] = None
         self._grid_price: typing.Optional[float] = None
+        # When the price update, which set the current price, arrived
+        self._price_received: typing.Optional[int] = None
         self.__current_grid_orders: typing.List[
             typing.Tuple[str, float, float, str]
         ] = []
 
+        self._working = False
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._events: typing.Optional[asyncio.Queue] = None
+        self._events_task: typing.Optional[asyncio.Task] = None
+        # Feed events, received before this stamp, are already in the loaded state
+        self._drop_before: typing.Optional[int] = None
+        self._resyncing = False
+        self._rebuild_task: typing.Optional[asyncio.Task] = None
+        self._rebuild_timer: typing.Optional[asyncio.TimerHandle] = None
+        self._last_rebuild_time = float("-inf")
+
     def update_settings(self, settings: MarketMaker.Settings):
         self.settings = settings
 
@@ -114,12 +197,77 @@ class MarketMaker(QtCore.QObject):
             self.position.price = order.average_price
 
         self.balance -= order.fee
+        self._metrics_position.set(self.position.volume)
 
         self.position_updated.emit(self.position)
         self.balance_updated.emit(self.balance)
 
     def _on_user_update(self, data: AbstractExchangeHandler.UserUpdate):
-        if data.symbol != "XBTUSD":
+        self._put_event(data)
+
+    def _on_user_socket_reconnected(self) -> None:
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.resync(), self._loop)
+
+    def _on_price_changed(self, data: AbstractExchangeHandler.PriceCallback):
+        self._put_event(data)
+
+    def _put_event(
+        self,
+        data: typing.Union[
+            AbstractExchangeHandler.UserUpdate, AbstractExchangeHandler.PriceCallback
+        ],
+    ) -> None:
+        """_put_event Pass a feed event from any thread to the event loop thread.
+
+        The event is stamped with its arrival time for the latency tracker.
+        """
+        if self._loop is None or self._events is None:
+            return
+
+        self._loop.call_soon_threadsafe(
+            self._events.put_nowait, (LatencyTracker.now(), data)
+        )
+
+    async def _process_events(self) -> None:
+        """_process_events Drain the feed events in batches on the event loop thread.
+
+        Consecutive price updates in a batch are coalesced, so only the latest one is processed.
+        """
+        assert self._events is not None
+
+        while self._working:
+            batch = [await self._events.get()]
+            while not self._events.empty():
+                batch.append(self._events.get_nowait())
+            self._metrics_events.set(len(batch))
+
+            for i, (received, data) in enumerate(batch):
+                if self._drop_before is not None and received < self._drop_before:
+                    continue
+
+                try:
+                    if isinstance(data, AbstractExchangeHandler.PriceCallback):
+                        if i + 1 < len(batch) and isinstance(
+                            batch[i + 1][1], AbstractExchangeHandler.PriceCallback
+                        ):
+                            continue
+                        self._process_price_update(data, received)
+                    else:
+                        self._process_user_update(data, received)
+                except Exception:
+                    self.logger.exception("Could not process %s", data)
+
+    def _process_user_update(
+        self,
+        data: AbstractExchangeHandler.UserUpdate,
+        received: typing.Optional[int] = None,
+    ):
+        # Balance updates come for the margin asset, not for the pair
+        if (
+            not isinstance(data, AbstractExchangeHandler.BalanceUpdate)
+            and data.symbol != self.pair_name
+        ):
             return
 
         if isinstance(data, AbstractExchangeHandler.OrderUpdate):
@@ -127,8 +275,23 @@ class MarketMaker(QtCore.QObject):
             if data.client_orderID == "":
                 return
 
-            if data.orderID != "":
-                self._current_orders[data.orderID] = data.status
+            self.orders.apply(data)
+            self._metrics_open_orders.set(len(self.orders))
+            if self.journal is not None:
+                self.journal.append_order(data)
+
+            if data.status == "NEW":
+                self.latency.on_acknowledged(
+                    data.client_orderID,
+                    received if received is not None else LatencyTracker.now(),
+                )
+            elif data.status == "FAILED" or data.status == "CANCELED":
+                self.latency.forget(data.client_orderID)
+
+            if data.status == "FILLED":
+                self._metrics_filled.inc()
+            elif data.status == "CANCELED":
+                self._metrics_canceled.inc()
 
             self.logger.debug(
                 "Order %s (%s;%s): %s",
@@ -141,9 +304,10 @@ class MarketMaker(QtCore.QObject):
             self.order_updated.emit(data)
 
             if data.status == "CANCELED" or data.status == "FILLED":
-                del self._current_orders[data.orderID]
                 if data.status == "FILLED":
                     self._on_order_filled(data)
+                    self._journal_position()
+                    self._journal_balance()
 
                 self.logger.info(
                     "Balance: %s, Position: %s, %s",
@@ -170,28 +334,228 @@ class MarketMaker(QtCore.QObject):
                     self.position.volume,
                 )
 
-                self.position.price = data.price
-                self.position.volume = data.volume
+                self.position.price = data.entry_price
+                self.position.volume = data.size
+                self._metrics_position.set(self.position.volume)
+                self._journal_position()
 
         elif isinstance(data, AbstractExchangeHandler.BalanceUpdate):
             if self.balance != self.balance:
-                self.balance = data.balance
+                self.balance = self.start_balance = data.balance
+                self._journal_balance()
                 self.balance_updated.emit(self.balance)
+            self._metrics_balance_drift.set(data.balance - self.balance)
             self.server_balance_updated.emit(data.balance)
 
-    def _on_price_changed(self, data: AbstractExchangeHandler.PriceCallback):
+        if self.journal is not None and self.journal.snapshot_due:
+            self._journal_snapshot()
+
+    def _journal_snapshot(self) -> None:
+        if self.journal is not None:
+            self.journal.append_snapshot(
+                self.pair_name,
+                self.orders,
+                self.position.volume,
+                self.position.price,
+                self.balance,
+            )
+
+    def _journal_position(self) -> None:
+        if self.journal is not None:
+            self.journal.append_position(self.position.volume, self.position.price)
+
+    def _journal_balance(self) -> None:
+        if self.journal is not None:
+            self.journal.append_balance(self.balance)
+
+    def _recover_journal(self) -> None:
+        """_recover_journal Restore the orders, position and balance, recorded by the previous run."""
+        assert self.journal is not None
+
+        state = self.journal.recover()
+        self.orders = state.orders
+        self._metrics_open_orders.set(len(self.orders))
+
+        if state.position is not None:
+            volume, price = state.position
+            self.position = MarketMaker.Position(
+                int(volume) if float(volume).is_integer() else volume, price
+            )
+            self._metrics_position.set(self.position.volume)
+            self.position_updated.emit(self.position)
+
+        if state.balance is not None:
+            self.balance = self.start_balance = state.balance
+            self.balance_updated.emit(self.balance)
+
+        self.journal.open()
+        # The next recovery starts from here
+        self._journal_snapshot()
+
+    async def _load_state(self) -> None:
+        """_load_state Seed the orders, position, balance and price from the exchange.
+
+        All the parts are requested at once. Feed events, received before the requests were sent,
+        are already in the loaded state and are dropped, the later ones are applied on top of it
+        in the order they have arrived.
+        """
+        snapshot = await self.state_source.fetch(self.pair_name)
+        self._drop_before = snapshot.requested
+
+        if snapshot.orders is not None:
+            live = set()
+            for update in snapshot.orders:
+                if update.symbol != self.pair_name or update.client_orderID == "":
+                    continue
+                live.add(update.client_orderID)
+                self.orders.apply(update)
+                if self.journal is not None:
+                    self.journal.append_order(update)
+                self.order_updated.emit(update)
+
+            # Orders, that have finished while the bot was not listening.
+            # Only the ones, this run is still creating, could be unknown to the exchange yet.
+            for record in self.orders:
+                if (
+                    record.client_orderID not in live
+                    and record.client_orderID not in self._in_flight
+                ):
+                    self.logger.info("Order %s is not open any more", record)
+                    self.orders.discard(record.client_orderID)
+
+            self._metrics_open_orders.set(len(self.orders))
+
+        if snapshot.position is not None:
+            self.position = MarketMaker.Position(
+                snapshot.position.size, snapshot.position.entry_price or 0
+            )
+            self._metrics_position.set(self.position.volume)
+            self._journal_position()
+            self.position_updated.emit(self.position)
+            self.server_position_updated.emit(
+                MarketMaker.Position(self.position.volume, self.position.price)
+            )
+
+        if snapshot.balance is not None:
+            self._process_user_update(snapshot.balance)
+
+        self._journal_snapshot()
+
+        self.logger.info(
+            "Loaded %s open orders, position (%s; %s), balance %s and price %s in %.3fs",
+            len(self.orders),
+            self.position.price,
+            self.position.volume,
+            self.balance,
+            snapshot.price,
+            (snapshot.received - snapshot.requested) / 10**9,
+        )
+
+        if snapshot.price is not None:
+            self._process_price_update(
+                AbstractExchangeHandler.PriceCallback(price=snapshot.price),
+                snapshot.received,
+            )
+
+    async def resync(self) -> None:
+        """resync Reload the state from the exchange, e.g. after a socket has reconnected
+        and could have lost some updates. Should be called from the event loop thread.
+
+        The same way as on start, the feed events are buffered while the state is loading:
+        the ones received before the requests are dropped, the rest are replayed on top
+        of the loaded state in the order they have arrived.
+        """
+        # Not started yet (start() loads the state itself), stopped or already resyncing
+        if self._resyncing or self._events_task is None or not self._working:
+            return
+
+        self._resyncing = True
+        try:
+            # The task is only interrupted while waiting for events, so none are lost
+            self._events_task.cancel()
+            try:
+                await self._events_task
+            except asyncio.CancelledError:
+                pass
+            self._events_task = None
+
+            await self._load_state()
+        finally:
+            self._resyncing = False
+            if self._working and self._loop is not None:
+                self._events_task = self._loop.create_task(self._process_events())
+
+    def _process_price_update(
+        self,
+        data: AbstractExchangeHandler.PriceCallback,
+        received: typing.Optional[int] = None,
+    ):
         self._current_price = data.price
+        self._price_received = received
         self.price_updated.emit(self._current_price)
+        self._schedule_rebuild()
 
-    @staticmethod
-    def __convert_order_data(
-        price: float, volume: float
-    ) -> typing.Tuple[str, float, float]:
-        return ("Buy" if volume > 0 else "Sell", price, abs(volume))
+    def _rebuild_needed(self) -> bool:
+        if self._current_price is None:
+            return False
+
+        return (
+            self._grid_price is None
+            or 100 * abs(self._grid_price - self._current_price) / self._current_price
+            >= self.settings.rebuild_after_change
+        )
 
-    def _generate_orders(self) -> typing.List[typing.Tuple[str, float, float, str]]:
-        orders = []
+    def _schedule_rebuild(self) -> None:
+        """_schedule_rebuild Start a grid rebuild, if the price has moved enough.
 
+        Rebuilds are debounced: the next one will not start earlier than
+        rebuild_min_interval seconds after the previous one, and only one rebuild runs at a time.
+        Should be called from the event loop thread.
+        """
+
+        if (
+            not self._working
+            or self._rebuild_task is not None
+            or self._rebuild_timer is not None
+            or not self._rebuild_needed()
+        ):
+            return
+
+        assert self._loop is not None
+        delay = (
+            self._last_rebuild_time
+            + self.settings.rebuild_min_interval
+            - self._loop.time()
+        )
+
+        if delay > 0:
+            self._rebuild_timer = self._loop.call_later(delay, self._on_rebuild_timer)
+        else:
+            self._rebuild_task = self._loop.create_task(self._rebuild())
+
+    def _on_rebuild_timer(self) -> None:
+        self._rebuild_timer = None
+        self._schedule_rebuild()
+
+    async def _rebuild(self) -> None:
+        started = time.perf_counter()
+        try:
+            await self.update_grid()
+        except Exception as e:
+            traceback.print_tb(e.__traceback__)
+            print(e.__class__.__name__, e, "\n")
+            self.error_occured.emit(e)
+        finally:
+            assert self._loop is not None
+            self._last_rebuild_time = self._loop.time()
+            self._rebuild_task = None
+            self._metrics_rebuilds.inc()
+            self._metrics_rebuild_duration.observe(time.perf_counter() - started)
+
+        # The price could have moved further while the grid was rebuilding
+        self._schedule_rebuild()
+
+    def _generate_orders(self) -> np.ndarray:
         if self._current_price is None:
             raise RuntimeError(
                 "Current price is not loaded yet, can not generate orders"
@@ -200,87 +564,129 @@ class MarketMaker(QtCore.QObject):
         used_price = self._current_price
         self._grid_price = used_price
 
-        # Creating short orders
-        if self.position.volume > self.settings.min_position:
-            for i in range(self.settings.orders_pairs):
-                start_price = (
-                    self.position.price
-                    if self.settings.adjust_grid_by_position
-                    and self.position.volume > 0
-                    and used_price + self.settings.min_spread // 2 < self.position.price
-                    else used_price + self.settings.min_spread // 2
-                )
-                price = used_price + (
-                    self.settings.min_spread // 2 + i * self.settings.interval
-                )
-                price = round(int(price * 2) / 2, 1)
-                volume = -(
-                    self.settings.orders_start_size + self.settings.order_step_size * i
-                )
-                orders.append(
-                    (
-                        *self.__convert_order_data(price, volume),
-                        AbstractExchangeHandler.generate_client_order_id(),
-                    )
-                )
+        return generate_grid(used_price, self.position, self.settings)
 
-        # Creating long orders
-        if self.position.volume < self.settings.max_position:
-            for i in range(self.settings.orders_pairs):
-                start_price = (
-                    self.position.price
-                    if self.settings.adjust_grid_by_position
-                    and self.position.volume < 0
-                    and used_price - self.settings.min_spread // 2 > self.position.price
-                    else used_price - self.settings.min_spread // 2
-                )
-                price = start_price - i * self.settings.interval
-                price = round(int(price * 2) / 2, 1)
-                volume = (
-                    self.settings.orders_start_size + self.settings.order_step_size * i
-                )
-                orders.append(
-                    (
-                        *self.__convert_order_data(price, volume),
-                        AbstractExchangeHandler.generate_client_order_id(),
-                    )
-                )
-
-        return orders
+    @property
+    def pnl(self) -> typing.Optional[float]:
+        """pnl Realized pnl of this run, None if the balance is not loaded."""
+        if self.start_balance != self.start_balance:
+            return None
+        return self.balance - self.start_balance
 
     def get_current_position_data(self) -> MarketMaker.Position:
         return self.position
 
     def get_current_orders_count(self) -> int:
-        return len(self._current_orders)
+        return len(self.orders)
 
     async def create_orders(
-        self, orders: typing.List[typing.Tuple[str, float, float, str]]
+        self, orders: typing.Union[np.ndarray, typing.List[GridOrder]]
     ):
+        if isinstance(orders, np.ndarray):
+            orders = grid_orders(orders)
+
         self.logger.debug("Creating grid from current price (%s)", self._current_price)
-        await self.handler.create_orders(self.pair_name, orders)
+        self._metrics_sent.inc(len(orders))
+        client_ids = [order[3] for order in orders]
+        self._in_flight.update(client_ids)
+        try:
+            await self.gateway.create_orders(self.pair_name, orders)
+        except CreateOrdersError as e:
+            self._on_create_failed(e.failed)
+            raise
+        finally:
+            self._in_flight.difference_update(client_ids)
+        self.latency.on_orders_created(
+            (order[3] for order in orders), LatencyTracker.now()
+        )
+
+    def _on_create_failed(self, orders: typing.List[GridOrder]) -> None:
+        """_on_create_failed Finish the PENDING records of the orders, that were not created.
+
+        The FAILED updates go through the events queue, so they are applied
+        after the PENDING ones, the handler has already put there.
+        """
+        for side, price, volume, client_orderID in orders:
+            self._put_event(
+                AbstractExchangeHandler.OrderUpdate(
+                    orderID="",
+                    client_orderID=client_orderID,
+                    status="FAILED",
+                    symbol=self.pair_name,
+                    price=price,
+                    average_price=float("nan"),
+                    fee=0,
+                    fee_asset="",
+                    volume=volume if side == "Buy" else -volume,
+                    volume_realized=0,
+                    time=datetime.now(),
+                    message={},
+                )
+            )
 
     async def cancel_orders(self):
-        if len(self._current_orders) > 0:
-            await self.handler.cancel_orders(list(self._current_orders.keys()))
+        if len(self.orders) > 0:
+            await self.gateway.cancel_orders(self.orders.order_ids())
 
     async def cancel_order(self, client_orderID: str):
-        await self.handler.cancel_order(client_orderID=client_orderID)
+        await self.gateway.cancel_order(client_orderID=client_orderID)
 
     async def update_grid(self):
-        await self.cancel_orders()
-        orders = self.__current_grid_orders = self._generate_orders()
+        tick = self._price_received
+        for record in self.orders.expire_pending(
+            self.PENDING_TIMEOUT, keep=self._in_flight
+        ):
+            self.logger.warning("Order %s was not acknowledged in time", record)
+
+        diff = reconcile_grid(
+            self._generate_orders(), self.orders, self.gateway.batch_size
+        )
+        created = grid_orders(diff.to_create)
+        self.latency.on_grid_generated(
+            tick, LatencyTracker.now(), (order[3] for order in created)
+        )
+        orders = self.__current_grid_orders = diff.kept + created
         self.grid_updates.emit(orders)
-        await self.create_orders(orders)
 
-    async def start(self):
-        """Start the marketmaker bot."""
+        # The cancels are answered before the creates are sent,
+        # so the account never holds both the old and the new orders
+        await self.gateway.cancel_orders(diff.to_cancel)
+        await self.create_orders(created)
+
+        self.logger.info(
+            "Grid rebuilt: %s kept, %s canceled, %s created, %s requests saved",
+            len(diff.kept),
+            len(diff.to_cancel),
+            len(diff.to_create),
+            diff.saved_requests,
+        )
+        self.grid_reconciled.emit(diff)
+
+    async def start(self, subscribe: bool = True):
+        """start Start the marketmaker bot.
+
+        Args:
+            subscribe (bool, optional): Open the bot's own user update and price sockets.
+                Should be False, if the updates are fed by a MarketMakerEngine. Defaults to True.
+        """
+        if self.journal is not None:
+            self._recover_journal()
+
         self._working = True
+        self._loop = asyncio.get_event_loop()
+        # The updates are buffered, while the state is loading
+        self._events = asyncio.Queue()
 
-        self.handler.start_user_update_socket_threaded(self._on_user_update)
-        self.handler.start_price_socket_threaded(self._on_price_changed, self.pair_name)
+        if subscribe:
+            start_user_update_socket(
+                self.handler, self._on_user_update, self._on_user_socket_reconnected
+            )
+            self.handler.start_price_socket_threaded(
+                self._on_price_changed, self.pair_name
+            )
 
-        await asyncio.sleep(2)
+        await self._load_state()
+        self._events_task = self._loop.create_task(self._process_events())
 
         while self._working:
             try:
@@ -291,14 +697,9 @@ class MarketMaker(QtCore.QObject):
                     )
 
                 if self._working:
-                    if (
-                        self._grid_price is None
-                        or 100
-                        * abs(self._grid_price - self._current_price)
-                        / self._current_price
-                        >= self.settings.rebuild_after_change
-                    ):
-                        await self.update_grid()
+                    # Rebuilds are triggered by the price updates,
+                    # this is only a fallback in case the price socket is silent
+                    self._schedule_rebuild()
                     self.period_updated.emit(self.__current_grid_orders)
             except Exception as e:
                 traceback.print_tb(e.__traceback__)
@@ -308,18 +709,35 @@ class MarketMaker(QtCore.QObject):
     def stop(self):
         self._working = False
 
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._on_stopped)
+
+    def _on_stopped(self) -> None:
+        if self._rebuild_timer is not None:
+            self._rebuild_timer.cancel()
+            self._rebuild_timer = None
+
+        if self._events_task is not None:
+            self._events_task.cancel()
+            self._events_task = None
+
+        if self.journal is not None:
+            self.journal.close()
+
 
 def main():
-    file_settings = json.load(open("settings.json", "r"))
-    handler = BitmexExchangeHandler(
-        file_settings["bitmex_client"]["public_key"],
-        file_settings["bitmex_client"]["private_key"],
-    )
-    settings = MarketMaker.Settings(**file_settings["marketmaker_settings"])
-    market_maker = MarketMaker(
-        file_settings["bitmex_client"]["pair"], handler, settings
-    )
-    asyncio.run(market_maker.start())
+    config = get_config()
+    client = config.client
+    handler = BitmexExchangeHandler(client.public_key, client.private_key)
+    market_maker = MarketMaker(client.pair, handler, config.marketmaker_settings)
+
+    async def run():
+        # Optional "metrics_port" serves the metrics on http://127.0.0.1:<port>/metrics
+        if config.get("metrics_port") is not None:
+            await MetricsServer(port=config.get("metrics_port")).start()
+        await market_maker.start()
+
+    asyncio.run(run())
 
 
 if __name__ == "__main__":
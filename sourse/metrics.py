@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import bisect
+import math
+import typing
+
+from sourse.logger import init_logger
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names: typing.Sequence[str], values: typing.Sequence[str]) -> str:
+    if len(names) == 0:
+        return ""
+
+    escaped = (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in values
+    )
+    return (
+        "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+    )
+
+
+class Metric(abc.ABC):
+    """Base of the metric families.
+
+    A family without label names is recorded directly, a family with label names
+    is recorded through the children, returned by labels(...). The children should be
+    taken once and kept, so the hot path is only an attribute update.
+    """
+
+    TYPE = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: typing.Sequence[str] = (),
+        label_values: typing.Sequence[str] = (),
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.label_values = tuple(label_values)
+
+        self._children: typing.Dict[typing.Tuple[str, ...], Metric] = {}
+
+    @abc.abstractmethod
+    def _new_child(self, label_values: typing.Tuple[str, ...]) -> Metric:
+        pass
+
+    def labels(self, *label_values: str) -> typing.Any:
+        if len(label_values) != len(self.label_names):
+            raise ValueError(
+                f"{self.name} expects labels {self.label_names}, got {label_values}"
+            )
+
+        key = tuple(str(value) for value in label_values)
+        if key not in self._children:
+            self._children[key] = self._new_child(key)
+        return self._children[key]
+
+    def remove(self, *label_values: str) -> None:
+        self._children.pop(tuple(str(value) for value in label_values), None)
+
+    @abc.abstractmethod
+    def _samples(self) -> typing.Iterator[typing.Tuple[str, str, float]]:
+        pass
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+
+        metrics = list(self._children.values()) if self.label_names else [self]
+        for metric in metrics:
+            for suffix, labels, value in metric._samples():
+                lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.value: float = 0
+
+    def _new_child(self, label_values: typing.Tuple[str, ...]) -> Counter:
+        return Counter(self.name, self.documentation, self.label_names, label_values)
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def _samples(self) -> typing.Iterator[typing.Tuple[str, str, float]]:
+        yield "", _format_labels(self.label_names, self.label_values), self.value
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.value: float = 0
+        self._function: typing.Optional[typing.Callable[[], float]] = None
+
+    def _new_child(self, label_values: typing.Tuple[str, ...]) -> Gauge:
+        return Gauge(self.name, self.documentation, self.label_names, label_values)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set_function(self, function: typing.Callable[[], float]) -> None:
+        """set_function Compute the value on each scrape instead of recording it."""
+        self._function = function
+
+    def _samples(self) -> typing.Iterator[typing.Tuple[str, str, float]]:
+        value = self._function() if self._function is not None else self.value
+        yield "", _format_labels(self.label_names, self.label_values), value
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: typing.Sequence[str] = (),
+        label_values: typing.Sequence[str] = (),
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names, label_values)
+        self.buckets = sorted(buckets)
+        # One more bucket for the values above the last bound (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0
+
+    def _new_child(self, label_values: typing.Tuple[str, ...]) -> Histogram:
+        return Histogram(
+            self.name, self.documentation, self.label_names, label_values, self.buckets
+        )
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def _samples(self) -> typing.Iterator[typing.Tuple[str, str, float]]:
+        names = self.label_names + ("le",)
+        cumulative = 0
+
+        for bound, count in zip(self.buckets + [math.inf], self.counts):
+            cumulative += count
+            yield "_bucket", _format_labels(
+                names, self.label_values + (_format_value(bound),)
+            ), cumulative
+
+        labels = _format_labels(self.label_names, self.label_values)
+        yield "_sum", labels, self.sum
+        yield "_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """Metric families by name, rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: typing.Dict[str, Metric] = {}
+
+    def _get_or_create(
+        self, kind: typing.Type[Metric], name: str, *args, **kwargs
+    ) -> typing.Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = kind(name, *args, **kwargs)
+        elif not isinstance(metric, kind):
+            raise ValueError(f"{name} is already registered as a {metric.TYPE}")
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, label_names: typing.Sequence[str] = ()
+    ) -> Counter:
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(
+        self, name: str, documentation: str, label_names: typing.Sequence[str] = ()
+    ) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: typing.Sequence[str] = (),
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, label_names, buckets=buckets
+        )
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+REGISTRY = MetricsRegistry()
+
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds",
+    "Delay of the event loop in running a scheduled callback",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+class MetricsServer:
+    """Serves a registry in the Prometheus text format over http on the running event loop.
+
+    Also measures the lag of the event loop, it runs on.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(
+        self,
+        registry: MetricsRegistry = REGISTRY,
+        host: str = "127.0.0.1",
+        port: int = 9108,
+        lag_interval: float = 0.5,
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.lag_interval = lag_interval
+
+        self.logger = init_logger(self.__class__.__name__)
+
+        self._server: typing.Optional[asyncio.AbstractServer] = None
+        self._lag_task: typing.Optional[asyncio.Task] = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            method, path, *_ = request.split(b"\r\n", 1)[0].decode().split(" ")
+
+            if method == "GET" and path.split("?")[0] in ("/", "/metrics"):
+                status, content_type = "200 OK", self.CONTENT_TYPE
+                body = self.registry.render().encode()
+            else:
+                status, content_type = "404 Not Found", "text/plain"
+                body = b"Not found\n"
+
+            writer.write(
+                (
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+                + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except Exception:
+            self.logger.exception("Could not serve the metrics")
+        finally:
+            writer.close()
+
+    async def _measure_lag(self) -> None:
+        loop = asyncio.get_event_loop()
+
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self._lag_task = asyncio.ensure_future(self._measure_lag())
+        self.logger.info(
+            "Serving metrics on http://%s:%s/metrics", self.host, self.port
+        )
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
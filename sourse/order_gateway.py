@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from crypto_futures_py import AbstractExchangeHandler
+from sourse.logger import init_logger
+from sourse.metrics import REGISTRY
+
+T = typing.TypeVar("T")
+
+GATEWAY_QUEUE_DEPTH = REGISTRY.gauge(
+    "order_gateway_queue_depth",
+    "Requests waiting for the rate limit",
+    ["gateway"],
+)
+GATEWAY_IN_FLIGHT = REGISTRY.gauge(
+    "order_gateway_in_flight", "Requests sent and not answered yet", ["gateway"]
+)
+GATEWAY_REQUESTS = REGISTRY.counter(
+    "order_gateway_requests_total", "Requests sent to the exchange", ["gateway"]
+)
+GATEWAY_WAIT = REGISTRY.histogram(
+    "order_gateway_wait_seconds",
+    "Time spent by a request waiting for the rate limit",
+    ["gateway"],
+)
+
+
+class CreateOrdersError(Exception):
+    """Some of the batches of a bulk create request have failed.
+
+    Attributes:
+        failed (typing.List[typing.Tuple[str, float, float, typing.Optional[str]]]): Orders
+            of the failed batches, they were not placed
+        created (typing.List[AbstractExchangeHandler.NewOrderData]): Orders
+            of the batches, that went through
+    """
+
+    def __init__(
+        self,
+        failed: typing.List[typing.Tuple[str, float, float, typing.Optional[str]]],
+        created: typing.List[AbstractExchangeHandler.NewOrderData],
+        error: BaseException,
+    ):
+        super().__init__(f"{len(failed)} orders were not created: {error!r}")
+        self.failed = failed
+        self.created = created
+
+
+class TokenBucket:
+    """Token bucket rate limiter, where waiters with a lower priority value are served first."""
+
+    def __init__(self, rate: float, capacity: float):
+        """__init__ Create a new token bucket.
+
+        Args:
+            rate (float): Amount of tokens, restored each second
+            capacity (float): Maximal amount of tokens, that could be spent at once
+        """
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._counter = itertools.count()
+        self._waiters: typing.List[typing.Tuple[int, int, float, asyncio.Future]] = []
+        self._wakeup: typing.Optional[asyncio.TimerHandle] = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def _release_waiters(self) -> None:
+        self._wakeup = None
+        self._refill()
+
+        while len(self._waiters) > 0:
+            _, _, tokens, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            if tokens > self._tokens:
+                break
+
+            heapq.heappop(self._waiters)
+            self._tokens -= tokens
+            future.set_result(None)
+
+        if len(self._waiters) > 0:
+            delay = (self._waiters[0][2] - self._tokens) / self.rate
+            self._wakeup = asyncio.get_event_loop().call_later(
+                delay, self._release_waiters
+            )
+
+    async def acquire(self, tokens: float = 1, priority: int = 0) -> float:
+        """acquire Wait until the tokens are available and take them.
+
+        Args:
+            tokens (float, optional): Amount of tokens to take. Defaults to 1.
+            priority (int, optional): Lower values are served first. Defaults to 0.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+
+        self._refill()
+
+        if len(self._waiters) == 0 and self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0
+
+        started = time.monotonic()
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), tokens, future))
+
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._release_waiters()
+
+        await future
+        return time.monotonic() - started
+
+
+class OrderGateway:
+    """This class stands between a bot and the exchange handler and paces bulk order requests.
+
+    Bulk requests are split into batches, independent batches are sent concurrently
+    and each batch takes a token from a shared budget, where cancels are served before creates.
+    """
+
+    CANCEL_PRIORITY = 0
+    CREATE_PRIORITY = 1
+
+    @dataclass
+    class Stats:
+        queue_depth: int = 0
+        in_flight: int = 0
+        requests: int = 0
+        wait_time: float = 0
+        max_wait_time: float = 0
+
+        @property
+        def average_wait_time(self) -> float:
+            return self.wait_time / self.requests if self.requests > 0 else 0
+
+    def __init__(
+        self,
+        handler: AbstractExchangeHandler,
+        batch_size: int = 100,
+        rate: float = 1,
+        capacity: float = 60,
+        max_concurrency: int = 4,
+        blocking_handler: bool = True,
+        name: str = "default",
+    ):
+        """__init__ Create a new gateway for the handler.
+
+        Args:
+            handler (AbstractExchangeHandler): Exchange handler to send the requests with
+            batch_size (int, optional): Maximal amount of orders in one request. Defaults to 100.
+            rate (float, optional): Requests per second, allowed by the exchange. Defaults to 1.
+            capacity (float, optional): Burst of requests, allowed by the exchange. Defaults to 60.
+            max_concurrency (int, optional): Maximal amount of requests in flight. Defaults to 4.
+            blocking_handler (bool, optional): Handler's coroutines block on http calls
+                (as BitmexExchangeHandler does), so each request is sent from a worker thread.
+                Defaults to True.
+            name (str, optional): Label of the gateway's metrics,
+                gateways with the same name are summed up. Defaults to "default".
+        """
+        self.handler = handler
+        self.batch_size = batch_size
+        self.bucket = TokenBucket(rate, capacity)
+
+        self.logger = init_logger(self.__class__.__name__)
+
+        self._stats = OrderGateway.Stats()
+        self._queue_depth = GATEWAY_QUEUE_DEPTH.labels(name)
+        self._in_flight = GATEWAY_IN_FLIGHT.labels(name)
+        self._requests = GATEWAY_REQUESTS.labels(name)
+        self._wait = GATEWAY_WAIT.labels(name)
+        self._semaphore: typing.Optional[asyncio.Semaphore] = None
+        self._max_concurrency = max_concurrency
+        self._executor = (
+            ThreadPoolExecutor(max_concurrency, thread_name_prefix="OrderGateway")
+            if blocking_handler
+            else None
+        )
+
+    def get_stats(self) -> OrderGateway.Stats:
+        self._stats.queue_depth = self.bucket.waiting
+        return self._stats
+
+    def _batches(self, data: typing.List[T]) -> typing.List[typing.List[T]]:
+        return [
+            data[i : i + self.batch_size] for i in range(0, len(data), self.batch_size)
+        ]
+
+    async def _request(
+        self, priority: int, request: typing.Callable[[], typing.Awaitable[T]]
+    ) -> T:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        self._queue_depth.inc()
+        try:
+            waited = await self.bucket.acquire(priority=priority)
+        finally:
+            self._queue_depth.dec()
+
+        self._stats.requests += 1
+        self._stats.wait_time += waited
+        self._stats.max_wait_time = max(self._stats.max_wait_time, waited)
+        self._requests.inc()
+        self._wait.observe(waited)
+
+        if waited > 0:
+            self.logger.debug("Request waited %.3fs for the rate limit", waited)
+
+        async with self._semaphore:
+            self._stats.in_flight += 1
+            self._in_flight.inc()
+            try:
+                if self._executor is None:
+                    return await request()
+
+                return await asyncio.get_event_loop().run_in_executor(
+                    self._executor, lambda: asyncio.run(request())
+                )
+            finally:
+                self._stats.in_flight -= 1
+                self._in_flight.dec()
+
+    async def create_orders(
+        self,
+        symbol: str,
+        data: typing.List[typing.Tuple[str, float, float, typing.Optional[str]]],
+    ) -> typing.List[AbstractExchangeHandler.NewOrderData]:
+        """create_orders Create the orders in batches.
+
+        Raises:
+            CreateOrdersError: If some of the batches have failed, the other ones are still sent
+        """
+        batches = self._batches(data)
+        results = await asyncio.gather(
+            *[
+                self._request(
+                    self.CREATE_PRIORITY,
+                    lambda batch=batch: self.handler.create_orders(symbol, batch),
+                )
+                for batch in batches
+            ],
+            return_exceptions=True,
+        )
+
+        created: typing.List[AbstractExchangeHandler.NewOrderData] = []
+        failed: typing.List[typing.Tuple[str, float, float, typing.Optional[str]]] = []
+        error: typing.Optional[BaseException] = None
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                failed.extend(batch)
+                error = result
+            else:
+                created.extend(result)
+
+        if error is not None:
+            raise CreateOrdersError(failed, created, error) from error
+        return created
+
+    async def cancel_orders(self, orders: typing.List[str]) -> None:
+        await asyncio.gather(
+            *[
+                self._request(
+                    self.CANCEL_PRIORITY,
+                    lambda batch=batch: self.handler.cancel_orders(batch),
+                )
+                for batch in self._batches(orders)
+            ]
+        )
+
+    async def cancel_order(
+        self,
+        order_id: typing.Optional[str] = None,
+        client_orderID: typing.Optional[str] = None,
+    ) -> None:
+        await self._request(
+            self.CANCEL_PRIORITY,
+            lambda: self.handler.cancel_order(
+                order_id=order_id, client_orderID=client_orderID
+            ),
+        )
+
+    async def create_market_order(
+        self,
+        symbol: str,
+        side: str,
+        volume: float,
+        client_ordID: typing.Optional[str] = None,
+    ) -> AbstractExchangeHandler.NewOrderData:
+        return await self._request(
+            self.CREATE_PRIORITY,
+            lambda: self.handler.create_market_order(
+                symbol, side, volume, client_ordID
+            ),
+        )
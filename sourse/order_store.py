@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import time
+import typing
+
+from crypto_futures_py import AbstractExchangeHandler
+
+OrderLevel = typing.Tuple[str, float]
+
+FINAL_STATUSES = frozenset(["FILLED", "CANCELED", "FAILED", "EXPIRED"])
+
+
+class OrderRecord:
+    """The last known state of one bot's order."""
+
+    __slots__ = (
+        "client_orderID",
+        "orderID",
+        "side",
+        "price",
+        "volume",
+        "volume_realized",
+        "status",
+        "created",
+    )
+
+    def __init__(self, update: AbstractExchangeHandler.OrderUpdate):
+        self.client_orderID: str = update.client_orderID
+        self.orderID: str = update.orderID
+        self.side: str = "Buy" if update.volume > 0 else "Sell"
+        self.price: float = update.price
+        self.volume: float = abs(update.volume)
+        self.volume_realized: float = abs(update.volume_realized)
+        self.status: str = update.status
+        # When the record was added to the store, to expire the lost PENDING orders
+        self.created: float = time.monotonic()
+
+    @property
+    def level(self) -> OrderLevel:
+        return (self.side, self.price)
+
+    @property
+    def resting_volume(self) -> float:
+        return self.volume - self.volume_realized
+
+    def __repr__(self) -> str:
+        return (
+            f"OrderRecord({self.client_orderID}, {self.orderID}, {self.status}, "
+            f"{self.side} {self.volume_realized}/{self.volume} @ {self.price})"
+        )
+
+
+class OrderStore:
+    """Live orders of a bot, indexed by client order id, server order id and (side, price) level.
+
+    Finished orders (FILLED, CANCELED, FAILED, EXPIRED) are removed from the store.
+    """
+
+    def __init__(self):
+        self._by_client_id: typing.Dict[str, OrderRecord] = {}
+        self._by_id: typing.Dict[str, OrderRecord] = {}
+        self._by_level: typing.Dict[OrderLevel, typing.Dict[str, OrderRecord]] = {}
+
+        self._count: typing.Dict[str, int] = {"Buy": 0, "Sell": 0}
+        self._resting_volume: typing.Dict[str, float] = {"Buy": 0, "Sell": 0}
+
+    def __len__(self) -> int:
+        return len(self._by_client_id)
+
+    def __iter__(self) -> typing.Iterator[OrderRecord]:
+        return iter(list(self._by_client_id.values()))
+
+    def __contains__(self, client_orderID: str) -> bool:
+        return client_orderID in self._by_client_id
+
+    def get(self, client_orderID: str) -> typing.Optional[OrderRecord]:
+        return self._by_client_id.get(client_orderID)
+
+    def get_by_id(self, orderID: str) -> typing.Optional[OrderRecord]:
+        return self._by_id.get(orderID)
+
+    def at_level(self, side: str, price: float) -> typing.List[OrderRecord]:
+        return list(self._by_level.get((side, price), {}).values())
+
+    def levels(self) -> typing.KeysView[OrderLevel]:
+        return self._by_level.keys()
+
+    def order_ids(self) -> typing.List[str]:
+        """order_ids Server ids of the live orders (PENDING orders do not have one yet)."""
+        return list(self._by_id.keys())
+
+    def count(self, side: typing.Optional[str] = None) -> int:
+        return len(self) if side is None else self._count[side]
+
+    def resting_volume(self, side: str) -> float:
+        return self._resting_volume[side]
+
+    def _add(self, record: OrderRecord) -> None:
+        self._by_client_id[record.client_orderID] = record
+        if record.orderID != "":
+            self._by_id[record.orderID] = record
+        self._by_level.setdefault(record.level, {})[record.client_orderID] = record
+
+        self._count[record.side] += 1
+        self._resting_volume[record.side] += record.resting_volume
+
+    def _remove(self, record: OrderRecord) -> None:
+        del self._by_client_id[record.client_orderID]
+        self._by_id.pop(record.orderID, None)
+
+        level = self._by_level[record.level]
+        del level[record.client_orderID]
+        if len(level) == 0:
+            del self._by_level[record.level]
+
+        self._count[record.side] -= 1
+        self._resting_volume[record.side] -= record.resting_volume
+
+    def apply(
+        self, update: AbstractExchangeHandler.OrderUpdate
+    ) -> typing.Optional[OrderRecord]:
+        """apply Apply an order update to the store.
+
+        Args:
+            update (AbstractExchangeHandler.OrderUpdate): Update, received from the exchange
+
+        Returns:
+            typing.Optional[OrderRecord]: The updated record, or None if the order is finished
+        """
+
+        record = self._by_client_id.get(update.client_orderID)
+
+        if update.status in FINAL_STATUSES:
+            if record is not None:
+                self._remove(record)
+            return None
+
+        if (
+            record is None
+            or record.price != update.price
+            or record.volume != abs(update.volume)
+            or record.side != ("Buy" if update.volume > 0 else "Sell")
+        ):
+            # A new or an amended order
+            if record is not None:
+                self._remove(record)
+            record = OrderRecord(update)
+            self._add(record)
+            return record
+
+        self._resting_volume[record.side] -= record.resting_volume
+        record.volume_realized = abs(update.volume_realized)
+        record.status = update.status
+        self._resting_volume[record.side] += record.resting_volume
+
+        if record.orderID == "" and update.orderID != "":
+            record.orderID = update.orderID
+            self._by_id[record.orderID] = record
+
+        return record
+
+    def discard(self, client_orderID: str) -> None:
+        """discard Forget the order, e.g. if the exchange does not know it any more."""
+        record = self._by_client_id.get(client_orderID)
+        if record is not None:
+            self._remove(record)
+
+    def expire_pending(
+        self, timeout: float, keep: typing.Container[str] = ()
+    ) -> typing.List[OrderRecord]:
+        """expire_pending Forget the PENDING orders, that have not got a server id in time.
+
+        Their create requests are considered lost, the exchange would have answered otherwise.
+
+        Args:
+            timeout (float): Seconds a PENDING order is waited for
+            keep (typing.Container[str], optional): Client ids of the orders,
+                whose requests are still in flight. Defaults to ().
+
+        Returns:
+            typing.List[OrderRecord]: The forgotten orders
+        """
+
+        deadline = time.monotonic() - timeout
+        expired = [
+            record
+            for record in self._by_client_id.values()
+            if record.orderID == ""
+            and record.created < deadline
+            and record.client_orderID not in keep
+        ]
+        for record in expired:
+            self._remove(record)
+        return expired
+
+    def clear(self) -> None:
+        self._by_client_id.clear()
+        self._by_id.clear()
+        self._by_level.clear()
+
+        for side in self._count:
+            self._count[side] = 0
+            self._resting_volume[side] = 0
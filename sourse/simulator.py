@@ -0,0 +1,770 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import collections
+import itertools
+import queue
+import random
+import threading
+import time
+import typing
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from crypto_futures_py import AbstractExchangeHandler
+from sourse.logger import init_logger
+
+CANDLE_SECONDS = {"1m": 60, "5m": 5 * 60, "1h": 60 * 60, "1d": 24 * 60 * 60}
+
+
+def random_walk(
+    start: float = 10000, volatility: float = 0.0005, seed: typing.Optional[int] = None
+) -> typing.Iterator[float]:
+    """random_walk Endless geometric random walk, rounded to the XBTUSD tick of 0.5."""
+    generator = random.Random(seed)
+    price = start
+
+    while True:
+        yield round(price * 2) / 2
+        price *= 1 + generator.gauss(0, volatility)
+
+
+def kline_path(
+    open: typing.Iterable[float],
+    high: typing.Iterable[float],
+    low: typing.Iterable[float],
+    close: typing.Iterable[float],
+) -> typing.Iterator[float]:
+    """kline_path Replay candles as a price path: open, the nearer extreme, the other extreme, close."""
+    for o, h, l, c in zip(open, high, low, close):
+        yield from ((o, l, h, c) if c >= o else (o, h, l, c))
+
+
+class SimulatedOrder:
+    __slots__ = (
+        "orderID",
+        "client_orderID",
+        "symbol",
+        "side",
+        "price",
+        "volume",
+        "volume_realized",
+        "cost",
+        "fee",
+        "status",
+    )
+
+    def __init__(
+        self,
+        client_orderID: str,
+        symbol: str,
+        side: str,
+        price: typing.Optional[float],
+        volume: float,
+    ):
+        self.orderID = str(uuid.uuid4())
+        self.client_orderID = client_orderID
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.volume = volume
+        self.volume_realized: float = 0
+        # Sum of volume / price of the fills, to get the average price of an inverse contract
+        self.cost: float = 0
+        self.fee: float = 0
+        self.status = "NEW"
+
+    @property
+    def average_price(self) -> float:
+        return self.volume_realized / self.cost if self.cost > 0 else float("nan")
+
+    def to_update(self) -> AbstractExchangeHandler.OrderUpdate:
+        volume_side = 1 if self.side == "Buy" else -1
+        return AbstractExchangeHandler.OrderUpdate(
+            orderID=self.orderID,
+            client_orderID=self.client_orderID,
+            status=self.status,
+            symbol=self.symbol,
+            price=self.price if self.price is not None else float("nan"),
+            average_price=self.average_price,
+            fee=self.fee,
+            fee_asset="XBT",
+            volume=self.volume * volume_side,
+            volume_realized=self.volume_realized * volume_side,
+            time=datetime.now(),
+            message={},
+        )
+
+
+class OrderBook:
+    """Resting limit orders of one symbol with price-time priority.
+
+    Orders on the same price level are kept in a FIFO queue, so the earlier order
+    is filled first, when a trade does not take the whole level.
+    """
+
+    def __init__(self):
+        self._levels: typing.Dict[
+            str, typing.Dict[float, typing.Deque[SimulatedOrder]]
+        ] = {"Buy": {}, "Sell": {}}
+        # Prices of the levels, sorted ascending
+        self._prices: typing.Dict[str, typing.List[float]] = {"Buy": [], "Sell": []}
+
+    def __len__(self) -> int:
+        return sum(
+            len(level) for levels in self._levels.values() for level in levels.values()
+        )
+
+    def best(self, side: str) -> typing.Optional[float]:
+        prices = self._prices[side]
+        if len(prices) == 0:
+            return None
+        return prices[-1] if side == "Buy" else prices[0]
+
+    def add(self, order: SimulatedOrder) -> None:
+        assert order.price is not None
+
+        levels = self._levels[order.side]
+        if order.price not in levels:
+            levels[order.price] = collections.deque()
+            bisect.insort(self._prices[order.side], order.price)
+        levels[order.price].append(order)
+
+    def remove(self, order: SimulatedOrder) -> None:
+        level = self._levels[order.side][order.price]
+        level.remove(order)
+        if len(level) == 0:
+            self._remove_level(order.side, typing.cast(float, order.price))
+
+    def _remove_level(self, side: str, price: float) -> None:
+        del self._levels[side][price]
+        prices = self._prices[side]
+        del prices[bisect.bisect_left(prices, price)]
+
+    def match(
+        self, price: float, volume: typing.Optional[float] = None
+    ) -> typing.List[typing.Tuple[SimulatedOrder, float]]:
+        """match Match the resting orders against a trade.
+
+        Orders with a better price than the trade are traded through and filled completely.
+        Orders on the trade price are filled in time priority up to the traded volume.
+
+        Args:
+            price (float): Price of the trade
+            volume (typing.Optional[float], optional): Volume of the trade on its price level,
+                unlimited if None. Defaults to None.
+
+        Returns:
+            typing.List[typing.Tuple[SimulatedOrder, float]]: Orders and their filled volumes
+        """
+
+        fills: typing.List[typing.Tuple[SimulatedOrder, float]] = []
+
+        for side in ("Buy", "Sell"):
+            best = self.best(side)
+            while best is not None and (
+                best > price if side == "Buy" else best < price
+            ):
+                for order in self._levels[side].pop(best):
+                    fills.append((order, order.volume - order.volume_realized))
+                self._prices[side].remove(best)
+                best = self.best(side)
+
+            if best != price:
+                continue
+
+            level = self._levels[side][price]
+            left = float("inf") if volume is None else volume
+            while len(level) > 0 and left > 0:
+                order = level[0]
+                filled = min(order.volume - order.volume_realized, left)
+                left -= filled
+                fills.append((order, filled))
+
+                if filled == order.volume - order.volume_realized:
+                    level.popleft()
+
+            if len(level) == 0:
+                self._remove_level(side, price)
+
+        return fills
+
+
+class SimulatedExchangeHandler(AbstractExchangeHandler):
+    """In-process exchange, which behaves like BitMEX for the bot, without any network.
+
+    A market thread walks the price path of each symbol, matches the resting orders,
+    builds candles and pushes the updates to the socket threads. Orders are post-only
+    (as the BitMEX handler places them), inverse contracts are used for the position
+    and the balance. Requests and user updates are delayed by the injected latency.
+    """
+
+    SYMBOLS = ["XBTUSD"]
+
+    @dataclass
+    class Stats:
+        requests: int = 0
+        orders_created: int = 0
+        orders_canceled: int = 0
+        orders_rejected: int = 0
+        fills: int = 0
+        ticks: int = 0
+
+    def __init__(
+        self,
+        public_key: str = "",
+        private_key: str = "",
+        price_paths: typing.Optional[
+            typing.Mapping[str, typing.Iterable[float]]
+        ] = None,
+        tick_interval: float = 1,
+        tick_seconds: float = 1,
+        tick_volume: typing.Optional[float] = None,
+        latency: float = 0,
+        latency_jitter: float = 0,
+        balance: float = 1,
+        maker_fee: float = -0.00025,
+        taker_fee: float = 0.00075,
+        seed: typing.Optional[int] = None,
+    ):
+        """__init__ Create a new simulated exchange.
+
+        Args:
+            public_key (str, optional): Ignored. Defaults to "".
+            private_key (str, optional): Ignored. Defaults to "".
+            price_paths (typing.Optional[typing.Mapping[str, typing.Iterable[float]]], optional):
+                Price path of each symbol (a list, kline_path(...) or random_walk(...)).
+                Defaults to a random walk for XBTUSD.
+            tick_interval (float, optional): Real seconds between the ticks, 0 to run
+                as fast as possible. Defaults to 1.
+            tick_seconds (float, optional): Market seconds of one tick, for the candles. Defaults to 1.
+            tick_volume (typing.Optional[float], optional): Volume, traded on the tick price level,
+                unlimited if None. Defaults to None.
+            latency (float, optional): Seconds, each request and user update is delayed by. Defaults to 0.
+            latency_jitter (float, optional): Maximal random addition to the latency. Defaults to 0.
+            balance (float, optional): Initial balance in XBT. Defaults to 1.
+            maker_fee (float, optional): Fee rate of the limit orders. Defaults to -0.00025.
+            taker_fee (float, optional): Fee rate of the market orders. Defaults to 0.00075.
+            seed (typing.Optional[int], optional): Seed of the latency jitter and the default walk.
+                Defaults to None.
+        """
+        super().__init__(public_key, private_key)
+
+        if price_paths is None:
+            price_paths = {"XBTUSD": random_walk(seed=seed)}
+
+        self.tick_interval = tick_interval
+        self.tick_seconds = tick_seconds
+        self.tick_volume = tick_volume
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+
+        self.logger = init_logger(self.__class__.__name__)
+
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._paths = {symbol: iter(path) for symbol, path in price_paths.items()}
+        self._prices: typing.Dict[str, float] = {
+            symbol: next(path) for symbol, path in self._paths.items()
+        }
+        self._books = {symbol: OrderBook() for symbol in self._paths}
+        self._orders: typing.Dict[str, SimulatedOrder] = {}
+        self._orders_by_client_id: typing.Dict[str, SimulatedOrder] = {}
+
+        self._balance = balance
+        # symbol -> [size, entry price]
+        self._positions: typing.Dict[str, typing.List[float]] = {
+            symbol: [0, 0] for symbol in self._paths
+        }
+
+        self._clock = datetime.now().replace(second=0, microsecond=0)
+        # (symbol, candle seconds) -> closed candles and the forming one
+        self._candles: typing.Dict[
+            typing.Tuple[str, int], typing.List[typing.Dict[str, typing.Any]]
+        ] = {(symbol, 60): [] for symbol in self._paths}
+        self._forming: typing.Dict[
+            typing.Tuple[str, int], typing.Dict[str, typing.Any]
+        ] = {}
+
+        self._price_queues: typing.Dict[str, typing.List[queue.Queue]] = {
+            symbol: [] for symbol in self._paths
+        }
+        self._kline_queues: typing.Dict[
+            typing.Tuple[str, int], typing.List[queue.Queue]
+        ] = {}
+        self._user_queues: typing.List[queue.Queue] = []
+        # When the last update to each user queue is delivered
+        self._last_delivery: typing.Dict[queue.Queue, float] = {}
+        self._sequence = itertools.count()
+
+        self._stats = SimulatedExchangeHandler.Stats()
+        self._market_thread: typing.Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.finished = threading.Event()
+
+    @staticmethod
+    def get_pairs_list() -> typing.List[str]:
+        return list(SimulatedExchangeHandler.SYMBOLS)
+
+    def get_symbols_data(self) -> typing.Dict[str, AbstractExchangeHandler.SymbolData]:
+        return {
+            symbol: AbstractExchangeHandler.SymbolData(
+                min_volume=1, max_volume=10**7, step_size=1
+            )
+            for symbol in self._paths
+        }
+
+    def get_stats(self) -> SimulatedExchangeHandler.Stats:
+        return self._stats
+
+    def get_price(self, symbol: str) -> float:
+        return self._prices[symbol]
+
+    def _latency(self) -> float:
+        return self.latency + self._random.uniform(0, self.latency_jitter)
+
+    # Market
+
+    def start(self) -> None:
+        """Start the market thread, if it is not started yet (the sockets start it as well)."""
+        with self._lock:
+            if self._market_thread is None:
+                self._market_thread = threading.Thread(
+                    target=self._run_market, name="SimulatedMarket", daemon=True
+                )
+                self._market_thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run_market(self) -> None:
+        next_tick = time.monotonic()
+
+        while not self._stopped.is_set():
+            if self.tick_interval > 0:
+                next_tick += self.tick_interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            if not self.tick():
+                self.logger.info("Price path is over")
+                self.finished.set()
+                return
+
+    def tick(self) -> bool:
+        """tick Move the market one step along the price paths.
+
+        Returns:
+            bool: False, if all the price paths are over
+        """
+        with self._lock:
+            self._clock += timedelta(seconds=self.tick_seconds)
+            self._stats.ticks += 1
+            moved = False
+
+            for symbol, path in self._paths.items():
+                price = next(path, None)
+                if price is None:
+                    continue
+
+                moved = True
+                self._prices[symbol] = price
+
+                for order, volume in self._books[symbol].match(price, self.tick_volume):
+                    self._fill(order, typing.cast(float, order.price), volume, True)
+
+                for subscriber in self._price_queues[symbol]:
+                    subscriber.put(AbstractExchangeHandler.PriceCallback(price=price))
+
+                for key in self._candles:
+                    if key[0] == symbol:
+                        self._update_candle(key, price)
+
+            return moved
+
+    def _update_candle(self, key: typing.Tuple[str, int], price: float) -> None:
+        seconds = key[1]
+        start = datetime.fromtimestamp(
+            self._clock.timestamp() // seconds * seconds
+        ).replace(microsecond=0)
+
+        candle = self._forming.get(key)
+        if candle is not None and candle["time"] != start:
+            self._candles[key].append(candle)
+            for subscriber in self._kline_queues.get(key, []):
+                subscriber.put(
+                    AbstractExchangeHandler.KlineCallback(
+                        **candle, final=True, message={}
+                    )
+                )
+            candle = None
+
+        if candle is None:
+            self._forming[key] = dict(
+                time=start, open=price, high=price, low=price, close=price, volume=0
+            )
+        else:
+            candle["high"] = max(candle["high"], price)
+            candle["low"] = min(candle["low"], price)
+            candle["close"] = price
+
+        self._forming[key]["volume"] += (
+            self.tick_volume if self.tick_volume is not None else 1
+        )
+
+    # Orders
+
+    def _emit_user_update(self, update: AbstractExchangeHandler.UserUpdate) -> None:
+        deliver_at = time.monotonic() + self._latency()
+        for subscriber in self._user_queues:
+            # The jitter could delay an update, but never past the next one,
+            # so a socket keeps the order of the updates
+            at = max(deliver_at, self._last_delivery.get(subscriber, deliver_at))
+            self._last_delivery[subscriber] = at
+            subscriber.put((at, next(self._sequence), update))
+
+    def _emit_order_update(self, order: SimulatedOrder) -> None:
+        update = order.to_update()
+        self._register_order_data(dict(update.__dict__))
+        self._emit_user_update(update)
+
+    def _fill(
+        self, order: SimulatedOrder, price: float, volume: float, maker: bool
+    ) -> None:
+        fee = volume / price * (self.maker_fee if maker else self.taker_fee)
+
+        order.volume_realized += volume
+        order.cost += volume / price
+        order.fee += fee
+        order.status = (
+            "FILLED" if order.volume_realized >= order.volume else "PARTIALLY_FILLED"
+        )
+        if order.status == "FILLED":
+            self._orders.pop(order.orderID, None)
+            self._orders_by_client_id.pop(order.client_orderID, None)
+        self._stats.fills += 1
+
+        # Inverse contract position, the same math the bot uses
+        position = self._positions[order.symbol]
+        size = volume if order.side == "Buy" else -volume
+        if position[0] == 0 or (position[0] > 0) == (size > 0):
+            position[1] = (position[0] + size) / (
+                size / price + (position[0] / position[1] if position[0] != 0 else 0)
+            )
+            position[0] += size
+        elif abs(position[0]) >= abs(size):
+            self._balance += size * (-1 / position[1] + 1 / price)
+            position[0] += size
+        else:
+            self._balance += position[0] * (1 / position[1] - 1 / price)
+            position[0] += size
+            position[1] = price
+        if position[0] == 0:
+            position[1] = 0
+        self._balance -= fee
+
+        self._emit_order_update(order)
+        self._emit_user_update(
+            AbstractExchangeHandler.PositionUpdate(
+                symbol=order.symbol,
+                size=position[0],
+                value=round(position[0] / position[1], 8) if position[1] else 0,
+                entry_price=position[1],
+                liquidation_price=0,
+            )
+        )
+        self._emit_user_update(
+            AbstractExchangeHandler.BalanceUpdate(balance=self._balance, symbol="XBT")
+        )
+
+    def _place(
+        self,
+        symbol: str,
+        side: str,
+        price: typing.Optional[float],
+        volume: float,
+        client_orderID: typing.Optional[str],
+    ) -> AbstractExchangeHandler.NewOrderData:
+        order = SimulatedOrder(
+            (
+                client_orderID
+                if client_orderID is not None
+                else self.generate_client_order_id()
+            ),
+            symbol,
+            side,
+            price,
+            volume,
+        )
+
+        with self._lock:
+            current = self._prices[symbol]
+
+            if price is None:
+                self._emit_order_update(order)
+                self._fill(order, current, volume, False)
+            elif price >= current if side == "Buy" else price <= current:
+                # Post-only (ParticipateDoNotInitiate) order would take liquidity
+                order.status = "CANCELED"
+                self._stats.orders_rejected += 1
+                self._emit_order_update(order)
+            else:
+                self._orders[order.orderID] = order
+                self._orders_by_client_id[order.client_orderID] = order
+                self._books[symbol].add(order)
+                self._stats.orders_created += 1
+                self._emit_order_update(order)
+
+        return AbstractExchangeHandler.NewOrderData(
+            orderID=order.orderID, client_orderID=order.client_orderID
+        )
+
+    def _cancel(self, order: typing.Optional[SimulatedOrder]) -> None:
+        # Orders, that are already finished, are skipped as BitMEX does
+        if order is None or order.orderID not in self._orders:
+            return
+
+        del self._orders[order.orderID]
+        del self._orders_by_client_id[order.client_orderID]
+        self._books[order.symbol].remove(order)
+
+        order.status = "CANCELED"
+        self._stats.orders_canceled += 1
+        self._emit_order_update(order)
+
+    async def create_order(
+        self,
+        symbol: str,
+        side: str,
+        price: typing.Optional[float],
+        volume: float,
+        client_ordID: typing.Optional[str] = None,
+    ) -> AbstractExchangeHandler.NewOrderData:
+        if client_ordID is not None:
+            self._user_update_pending(client_ordID, price, volume, symbol, side)
+
+        self._stats.requests += 1
+        await asyncio.sleep(self._latency())
+        return self._place(symbol, side, price, volume, client_ordID)
+
+    async def create_orders(
+        self,
+        symbol: str,
+        data: typing.List[typing.Tuple[str, float, float, typing.Optional[str]]],
+    ) -> typing.List[AbstractExchangeHandler.NewOrderData]:
+        for order_data in data:
+            if len(order_data) > 3 and order_data[3] is not None:
+                self._user_update_pending(
+                    order_data[3], order_data[1], order_data[2], symbol, order_data[0]
+                )
+
+        self._stats.requests += 1
+        await asyncio.sleep(self._latency())
+        return [
+            self._place(
+                symbol,
+                order_data[0],
+                order_data[1],
+                order_data[2],
+                order_data[3] if len(order_data) > 3 else None,
+            )
+            for order_data in data
+        ]
+
+    async def cancel_order(
+        self,
+        order_id: typing.Optional[str] = None,
+        client_orderID: typing.Optional[str] = None,
+    ) -> None:
+        if order_id is None and client_orderID is None:
+            raise ValueError(
+                "Either order_id of client_orderID should be sent, but both are None"
+            )
+
+        order = (
+            self._orders.get(order_id)
+            if order_id is not None
+            else self._orders_by_client_id.get(typing.cast(str, client_orderID))
+        )
+        if order is not None:
+            self._user_update_pending_cancel(order_id=order.orderID)
+
+        self._stats.requests += 1
+        await asyncio.sleep(self._latency())
+        with self._lock:
+            self._cancel(order)
+
+    async def cancel_orders(self, orders: typing.List[str]) -> None:
+        for order_id in orders:
+            if order_id in self._orders:
+                self._user_update_pending_cancel(order_id=order_id)
+
+        self._stats.requests += 1
+        await asyncio.sleep(self._latency())
+        with self._lock:
+            for order_id in orders:
+                self._cancel(self._orders.get(order_id))
+
+    # Account state, as the REST requests return it
+
+    async def get_open_orders(
+        self, symbol: str
+    ) -> typing.List[AbstractExchangeHandler.OrderUpdate]:
+        self._stats.requests += 1
+        await asyncio.sleep(self._latency())
+        with self._lock:
+            return [
+                order.to_update()
+                for order in self._orders.values()
+                if order.symbol == symbol
+            ]
+
+    async def get_position(self, symbol: str) -> AbstractExchangeHandler.PositionUpdate:
+        self._stats.requests += 1
+        await asyncio.sleep(self._latency())
+        with self._lock:
+            size, price = self._positions[symbol]
+            return AbstractExchangeHandler.PositionUpdate(
+                symbol=symbol,
+                size=size,
+                value=round(size / price, 8) if price else 0,
+                entry_price=price,
+                liquidation_price=0,
+            )
+
+    async def get_balance(self) -> AbstractExchangeHandler.BalanceUpdate:
+        self._stats.requests += 1
+        await asyncio.sleep(self._latency())
+        with self._lock:
+            return AbstractExchangeHandler.BalanceUpdate(
+                balance=self._balance, symbol="XBT"
+            )
+
+    # Data
+
+    async def load_historical_data(
+        self, symbol: str, candle_type: str, amount: int
+    ) -> pd.DataFrame:
+        """load_historical_data Candles, built by the simulation so far.
+
+        If there are less than amount of them, the history is padded in front
+        with flat candles on the first price.
+        """
+        with self._lock:
+            candles = list(self._candles.get((symbol, CANDLE_SECONDS[candle_type]), []))
+
+        seconds = CANDLE_SECONDS[candle_type]
+        first_price = candles[0]["open"] if len(candles) > 0 else self._prices[symbol]
+        first_time = candles[0]["time"] if len(candles) > 0 else self._clock
+
+        padding = [
+            dict(
+                time=first_time - timedelta(seconds=seconds * i),
+                open=first_price,
+                high=first_price,
+                low=first_price,
+                close=first_price,
+                volume=0,
+            )
+            for i in range(max(0, amount - len(candles)), 0, -1)
+        ]
+
+        df = pd.DataFrame(
+            (padding + candles)[-amount:],
+            columns=["time", "open", "high", "low", "close", "volume"],
+        )
+        df = df.rename(
+            columns={
+                "time": "Date",
+                "open": "Open",
+                "high": "High",
+                "low": "Low",
+                "close": "Close",
+                "volume": "Volume",
+            }
+        )
+        df["Date"] = df["Date"].map(lambda x: x.strftime("%Y-%m-%d %H:%M"))
+
+        return df
+
+    # Sockets
+
+    def _run_socket(
+        self, subscriber: queue.Queue, on_update: typing.Callable[[typing.Any], None]
+    ) -> None:
+        self.start()
+
+        while not self._stopped.is_set():
+            try:
+                data = subscriber.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            try:
+                on_update(data)
+            except Exception:
+                self.logger.exception("Socket subscriber failed")
+
+    def start_kline_socket(
+        self,
+        on_update: typing.Callable[[AbstractExchangeHandler.KlineCallback], None],
+        candle_type: str,
+        pair_name: str,
+    ) -> None:
+        self.logger.info("Starting kline socket")
+
+        key = (pair_name, CANDLE_SECONDS[candle_type])
+        subscriber: queue.Queue = queue.Queue()
+        with self._lock:
+            self._candles.setdefault(key, [])
+            self._kline_queues.setdefault(key, []).append(subscriber)
+
+        self._run_socket(subscriber, on_update)
+
+    def start_price_socket(
+        self,
+        on_update: typing.Callable[[AbstractExchangeHandler.PriceCallback], None],
+        pair_name: str,
+    ) -> None:
+        self.logger.info("Starting price socket")
+
+        subscriber: queue.Queue = queue.Queue()
+        with self._lock:
+            self._price_queues[pair_name].append(subscriber)
+        subscriber.put(AbstractExchangeHandler.PriceCallback(self._prices[pair_name]))
+
+        self._run_socket(subscriber, on_update)
+
+    def start_user_update_socket(
+        self, on_update: typing.Callable[[AbstractExchangeHandler.UserUpdate], None]
+    ) -> None:
+        self.logger.info("Starting user update socket")
+
+        super().start_user_update_socket(on_update)
+
+        # Updates are delivered in the order they were emitted,
+        # each one not earlier than its latency allows
+        subscriber: queue.Queue = queue.PriorityQueue()
+        with self._lock:
+            self._user_queues.append(subscriber)
+            self._emit_user_update(
+                AbstractExchangeHandler.BalanceUpdate(
+                    balance=self._balance, symbol="XBT"
+                )
+            )
+
+        def deliver(item: typing.Tuple[float, int, AbstractExchangeHandler.UserUpdate]):
+            deliver_at, _, update = item
+            delay = deliver_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            on_update(update)
+
+        self._run_socket(subscriber, deliver)
@@ -0,0 +1,496 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+from dataclasses import dataclass
+
+from sourse.config import ConfigService, get_config
+from sourse.events import Signal
+from sourse.logger import init_logger
+
+if typing.TYPE_CHECKING:
+    from sourse.marketmaker import MarketMaker
+
+DEFAULT_FILE = "bot.db"
+
+# Schema changes, applied in order. PRAGMA user_version keeps the amount of the applied ones.
+_MIGRATIONS = [
+    """
+    CREATE TABLE templates (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        desc TEXT NOT NULL,
+        settings TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        updated REAL NOT NULL
+    );
+    CREATE TABLE template_versions (
+        template_id INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        desc TEXT NOT NULL,
+        settings TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (template_id, version)
+    );
+    CREATE TABLE runs (
+        id INTEGER PRIMARY KEY,
+        template TEXT,
+        template_version INTEGER,
+        kind TEXT NOT NULL,
+        symbol TEXT,
+        started REAL NOT NULL,
+        finished REAL,
+        pnl REAL
+    );
+    CREATE INDEX runs_by_template ON runs (template, started);
+    CREATE INDEX runs_by_start ON runs (started);
+    """,
+    """
+    CREATE TABLE config_imports (
+        path TEXT PRIMARY KEY,
+        imported REAL NOT NULL
+    );
+    """,
+]
+
+
+class TemplateStore:
+    """Settings templates and the history of the bot's runs in an SQLite database.
+
+    Each save of a template makes a new version of it, the previous versions are kept.
+    A run records which template (and version) was run, when, and its pnl.
+
+    Changes are announced by template_saved, template_deleted and run_recorded in the thread,
+    that made them. Changes, made by other processes (e.g. a parameter sweep),
+    are found by refresh(), which watch() calls periodically.
+    """
+
+    template_saved = Signal(object)
+    template_deleted = Signal(str)
+    run_recorded = Signal(object)
+
+    @dataclass
+    class Template:
+        name: str
+        desc: str
+        settings: MarketMaker.Settings
+        version: int
+        updated: float
+
+    @dataclass
+    class Run:
+        id: int
+        template: typing.Optional[str]
+        template_version: typing.Optional[int]
+        kind: str
+        symbol: typing.Optional[str]
+        started: float
+        finished: typing.Optional[float] = None
+        pnl: typing.Optional[float] = None
+
+    def __init__(self, path: str = DEFAULT_FILE):
+        """__init__ Open the store, creating or migrating the database if needed.
+
+        Args:
+            path (str, optional): Database file. Defaults to "bot.db".
+        """
+        self.path = path
+        self.logger = init_logger(self.__class__.__name__)
+
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        # Readers do not wait for a writer in another process
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+
+        # name -> version, to find the changes, made by other connections
+        self._versions: typing.Dict[str, int] = {
+            row["name"]: row["version"]
+            for row in self._connection.execute("SELECT name, version FROM templates")
+        }
+        self._data_version = self._get_data_version()
+        self._watcher: typing.Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _migrate(self) -> None:
+        with self._lock:
+            (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+            for number in range(version, len(_MIGRATIONS)):
+                self.logger.info("Migrating %s to the schema %s", self.path, number + 1)
+                with self._transaction():
+                    for statement in _MIGRATIONS[number].split(";"):
+                        if statement.strip() != "":
+                            self._connection.execute(statement)
+                    self._connection.execute(f"PRAGMA user_version = {number + 1}")
+
+    @contextlib.contextmanager
+    def _transaction(self) -> typing.Iterator[None]:
+        # The connection does not open transactions on its own (isolation_level=None)
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def _get_data_version(self) -> int:
+        return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self) -> None:
+        self.stop_watching()
+        self._connection.close()
+
+    # Templates
+
+    @staticmethod
+    def _template(row: sqlite3.Row) -> TemplateStore.Template:
+        from sourse.marketmaker import MarketMaker
+
+        return TemplateStore.Template(
+            name=row["name"],
+            desc=row["desc"],
+            settings=MarketMaker.Settings(**json.loads(row["settings"])),
+            version=row["version"],
+            updated=row["updated"],
+        )
+
+    def templates(self) -> typing.List[TemplateStore.Template]:
+        """templates All the templates, in the order they were created."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM templates ORDER BY id"
+            ).fetchall()
+        return [self._template(row) for row in rows]
+
+    def template(self, name: str) -> typing.Optional[TemplateStore.Template]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM templates WHERE name = ?", (name,)
+            ).fetchone()
+        return self._template(row) if row is not None else None
+
+    def __contains__(self, name: str) -> bool:
+        return self.template(name) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM templates"
+            ).fetchone()[0]
+
+    def versions(self, name: str) -> typing.List[TemplateStore.Template]:
+        """versions All the saved versions of the template, from the first one."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT templates.name, template_versions.desc, template_versions.settings, "
+                "template_versions.version, template_versions.created AS updated "
+                "FROM template_versions JOIN templates ON templates.id = template_id "
+                "WHERE templates.name = ? ORDER BY template_versions.version",
+                (name,),
+            ).fetchall()
+        return [self._template(row) for row in rows]
+
+    def _save(self, name: str, desc: str, settings: str, now: float) -> None:
+        row = self._connection.execute(
+            "SELECT id, version FROM templates WHERE name = ?", (name,)
+        ).fetchone()
+
+        if row is None:
+            template_id = self._connection.execute(
+                "INSERT INTO templates (name, desc, settings, version, updated) "
+                "VALUES (?, ?, ?, 1, ?)",
+                (name, desc, settings, now),
+            ).lastrowid
+            version = 1
+        else:
+            template_id, version = row["id"], row["version"] + 1
+            self._connection.execute(
+                "UPDATE templates SET desc = ?, settings = ?, version = ?, updated = ? "
+                "WHERE id = ?",
+                (desc, settings, version, now, template_id),
+            )
+
+        self._connection.execute(
+            "INSERT INTO template_versions (template_id, version, desc, settings, created) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (template_id, version, desc, settings, now),
+        )
+        self._versions[name] = version
+
+    def save_templates(
+        self,
+        templates: typing.Iterable[
+            typing.Tuple[
+                str,
+                str,
+                typing.Union[MarketMaker.Settings, typing.Mapping[str, typing.Any]],
+            ]
+        ],
+    ) -> typing.List[TemplateStore.Template]:
+        """save_templates Save the templates in one transaction.
+
+        Args:
+            templates: (name, description, settings) of each template. A template with an existing
+                name gets a new version.
+
+        Returns:
+            typing.List[TemplateStore.Template]: The saved templates
+        """
+        now = time.time()
+        names = []
+
+        with self._lock:
+            with self._transaction():
+                for name, desc, settings in templates:
+                    if dataclasses.is_dataclass(settings):
+                        settings = dataclasses.asdict(settings)
+                    self._save(name, desc, json.dumps(dict(settings)), now)
+                    names.append(name)
+
+        saved = [
+            typing.cast(TemplateStore.Template, self.template(name)) for name in names
+        ]
+        for template in saved:
+            self.template_saved.emit(template)
+        return saved
+
+    def save_template(
+        self,
+        name: str,
+        desc: str,
+        settings: typing.Union[MarketMaker.Settings, typing.Mapping[str, typing.Any]],
+    ) -> TemplateStore.Template:
+        return self.save_templates([(name, desc, settings)])[0]
+
+    def delete_template(self, name: str) -> None:
+        """delete_template Delete the template with all its versions. The runs keep its name."""
+        with self._lock:
+            with self._transaction():
+                row = self._connection.execute(
+                    "SELECT id FROM templates WHERE name = ?", (name,)
+                ).fetchone()
+                if row is None:
+                    return
+                self._connection.execute(
+                    "DELETE FROM template_versions WHERE template_id = ?", (row["id"],)
+                )
+                self._connection.execute(
+                    "DELETE FROM templates WHERE id = ?", (row["id"],)
+                )
+            self._versions.pop(name, None)
+
+        self.template_deleted.emit(name)
+
+    # Runs
+
+    @staticmethod
+    def _run(row: sqlite3.Row) -> TemplateStore.Run:
+        return TemplateStore.Run(**{key: row[key] for key in row.keys()})
+
+    def start_run(
+        self,
+        template: typing.Optional[str],
+        symbol: typing.Optional[str],
+        kind: str = "live",
+    ) -> int:
+        """start_run Record the start of a run.
+
+        Args:
+            template (typing.Optional[str]): Name of the template, None for hand-made settings
+            symbol (typing.Optional[str]): Traded symbol, None if it is not known (backtests)
+            kind (str, optional): "live", "backtest" or "sweep". Defaults to "live".
+
+        Returns:
+            int: Id of the run, for finish_run()
+        """
+        with self._lock:
+            version = self._versions.get(template) if template is not None else None
+            return typing.cast(
+                int,
+                self._connection.execute(
+                    "INSERT INTO runs (template, template_version, kind, symbol, started) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (template, version, kind, symbol, time.time()),
+                ).lastrowid,
+            )
+
+    def finish_run(self, run_id: int, pnl: typing.Optional[float]) -> TemplateStore.Run:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE runs SET finished = ?, pnl = ? WHERE id = ?",
+                (time.time(), pnl, run_id),
+            )
+            run = self._run(
+                self._connection.execute(
+                    "SELECT * FROM runs WHERE id = ?", (run_id,)
+                ).fetchone()
+            )
+
+        self.run_recorded.emit(run)
+        return run
+
+    def record_run(
+        self,
+        template: typing.Optional[str],
+        symbol: typing.Optional[str],
+        pnl: typing.Optional[float],
+        kind: str = "backtest",
+    ) -> TemplateStore.Run:
+        """record_run Record a finished run, e.g. a backtest."""
+        return self.finish_run(self.start_run(template, symbol, kind), pnl)
+
+    def runs(
+        self, template: typing.Optional[str] = None, limit: int = 100
+    ) -> typing.List[TemplateStore.Run]:
+        """runs The latest runs, of all the templates or of the given one."""
+        with self._lock:
+            if template is None:
+                rows = self._connection.execute(
+                    "SELECT * FROM runs ORDER BY started DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                rows = self._connection.execute(
+                    "SELECT * FROM runs WHERE template = ? ORDER BY started DESC LIMIT ?",
+                    (template, limit),
+                ).fetchall()
+        return [self._run(row) for row in rows]
+
+    # Migration from settings.json
+
+    def import_config_templates(self, config: ConfigService) -> int:
+        """import_config_templates Copy the templates of settings.json into the store.
+
+        The config is imported only once, so the templates, deleted from the store later,
+        do not come back. The config file itself is left as it is.
+
+        Returns:
+            int: Amount of the imported templates
+        """
+        path = os.path.abspath(config.path)
+        templates = config.get("templates") or {}
+
+        with self._lock:
+            with self._transaction():
+                if (
+                    self._connection.execute(
+                        "SELECT 1 FROM config_imports WHERE path = ?", (path,)
+                    ).fetchone()
+                    is not None
+                ):
+                    return 0
+
+                now = time.time()
+                names = [name for name in templates if name not in self._versions]
+                for name in names:
+                    settings = {k: v for k, v in templates[name].items() if k != "desc"}
+                    self._save(name, templates[name]["desc"], json.dumps(settings), now)
+                self._connection.execute(
+                    "INSERT INTO config_imports (path, imported) VALUES (?, ?)",
+                    (path, now),
+                )
+
+        for name in names:
+            self.template_saved.emit(
+                typing.cast(TemplateStore.Template, self.template(name))
+            )
+
+        if len(names) > 0:
+            self.logger.info(
+                "Imported %s templates from %s to %s",
+                len(names),
+                config.path,
+                self.path,
+            )
+        return len(names)
+
+    # Changes of other processes
+
+    def refresh(self) -> bool:
+        """refresh Announce the templates, changed by other connections since the last check.
+
+        Returns:
+            bool: True, if there were changes
+        """
+        with self._lock:
+            data_version = self._get_data_version()
+            if data_version == self._data_version:
+                return False
+            self._data_version = data_version
+
+            versions = {
+                row["name"]: row["version"]
+                for row in self._connection.execute(
+                    "SELECT name, version FROM templates"
+                )
+            }
+            deleted = [name for name in self._versions if name not in versions]
+            changed = [
+                name
+                for name, version in versions.items()
+                if self._versions.get(name) != version
+            ]
+            self._versions = versions
+
+        for name in deleted:
+            self.template_deleted.emit(name)
+        for name in changed:
+            template = self.template(name)
+            if template is not None:
+                self.template_saved.emit(template)
+        return True
+
+    def watch(self, interval: float = 1) -> None:
+        """watch Call refresh() every interval seconds in a thread."""
+        if self._watcher is not None:
+            return
+
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_loop, args=(interval,), name="StoreWatcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                self.logger.exception("Could not refresh %s", self.path)
+
+
+_stores: typing.Dict[str, TemplateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(config: typing.Optional[ConfigService] = None) -> TemplateStore:
+    """get_store The shared store of the config.
+
+    The database is the config's "store" (relative to the config's directory, "bot.db"
+    by default). The templates of the config are copied into it on the first open.
+    """
+    if config is None:
+        config = get_config()
+
+    path = os.path.join(os.path.dirname(config.path), config.get("store", DEFAULT_FILE))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = TemplateStore(path)
+            store.import_config_templates(config)
+        return store
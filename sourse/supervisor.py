@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import multiprocessing.synchronize
+import queue
+import threading
+import time
+import typing
+import zlib
+from dataclasses import dataclass, field
+
+from crypto_futures_py import AbstractExchangeHandler, BitmexExchangeHandler
+from sourse.logger import init_logger
+from sourse.marketmaker import MarketMaker
+
+# Signals of MarketMaker, that are forwarded from the workers to the coordinator.
+# Events are sent as (shard, symbol, channel index, value) tuples.
+CHANNELS = (
+    "period_updated",
+    "grid_updates",
+    "order_updated",
+    "position_updated",
+    "server_position_updated",
+    "price_updated",
+    "balance_updated",
+    "server_balance_updated",
+    "error_occured",
+    "grid_reconciled",
+)
+
+HandlerFactory = typing.Callable[[str, str], AbstractExchangeHandler]
+
+
+@dataclass
+class Shard:
+    """A group of bots, that runs in one worker process on one MarketMakerEngine."""
+
+    index: int
+    keys: typing.Tuple[str, str]
+    bots: typing.List[typing.Tuple[str, MarketMaker.Settings]] = field(
+        default_factory=list
+    )
+
+
+def _run_shard(
+    shard: Shard,
+    handler_factory: HandlerFactory,
+    events: multiprocessing.Queue,
+    stop_event: multiprocessing.synchronize.Event,
+) -> None:
+    """_run_shard Worker process entry point: run the shard's bots and forward their events."""
+    from sourse.engine import MarketMakerEngine
+
+    engine = MarketMakerEngine(handler_factory(*shard.keys))
+
+    for pair_name, settings in shard.bots:
+        market_maker = engine.create_market_maker(pair_name, settings)
+
+        for channel, name in enumerate(CHANNELS):
+            getattr(market_maker, name).connect(
+                lambda value, symbol=pair_name, channel=channel: events.put(
+                    (shard.index, symbol, channel, value)
+                )
+            )
+
+    async def watch_stop():
+        while not stop_event.is_set():
+            await asyncio.sleep(0.5)
+        engine.stop()
+
+    async def run():
+        await asyncio.gather(engine.start(), watch_stop())
+
+    asyncio.run(run())
+
+
+class Supervisor:
+    """This class runs the bots in worker processes, assigned by account or by symbol.
+
+    Events of all the bots are forwarded to this (coordinator) process and dispatched
+    to the subscribers. Crashed workers are restarted.
+    """
+
+    def __init__(
+        self,
+        processes: int = multiprocessing.cpu_count(),
+        shard_by: str = "symbol",
+        handler_factory: HandlerFactory = BitmexExchangeHandler,
+        restart_delay: float = 5,
+    ):
+        """__init__ Create a new supervisor.
+
+        Args:
+            processes (int, optional): Maximal amount of worker processes. Defaults to the cpu count.
+            shard_by (str, optional): "symbol" to spread the symbols over the workers,
+                "account" to run all the bots of one account in one worker. Defaults to "symbol".
+            handler_factory (HandlerFactory, optional): Picklable callable, creating a handler
+                from (public_key, private_key) in a worker. Defaults to BitmexExchangeHandler.
+            restart_delay (float, optional): Seconds to wait before restarting a crashed worker.
+                Defaults to 5.
+        """
+        if shard_by not in ("symbol", "account"):
+            raise ValueError(
+                f'shard_by should be "symbol" or "account", not {shard_by}'
+            )
+
+        self.processes = processes
+        self.shard_by = shard_by
+        self.handler_factory = handler_factory
+        self.restart_delay = restart_delay
+
+        self.logger = init_logger(self.__class__.__name__)
+
+        self._context = multiprocessing.get_context("spawn")
+        self._events: multiprocessing.Queue = self._context.Queue()
+        self._shards: typing.Dict[typing.Tuple[str, typing.Hashable], Shard] = {}
+        self._workers: typing.Dict[int, multiprocessing.Process] = {}
+        self._stop_events: typing.Dict[int, multiprocessing.synchronize.Event] = {}
+        self._restarts: typing.Dict[int, int] = {}
+        self._subscribers: typing.Dict[
+            str, typing.List[typing.Callable[[str, typing.Any], None]]
+        ] = {name: [] for name in CHANNELS}
+
+        self._working = False
+        self._dispatching = False
+        self._threads: typing.List[threading.Thread] = []
+
+    def add_bot(
+        self,
+        keys: typing.Tuple[str, str],
+        pair_name: str,
+        settings: MarketMaker.Settings,
+    ) -> int:
+        """add_bot Assign a bot to a shard. Should be called before start().
+
+        Returns:
+            int: Index of the shard, the bot was assigned to
+        """
+        if self.shard_by == "account":
+            slot: typing.Hashable = zlib.crc32(keys[0].encode()) % self.processes
+        else:
+            slot = zlib.crc32(pair_name.encode()) % self.processes
+
+        # Bots of different accounts never share a worker's sockets
+        shard_key = (keys[0], slot)
+        if shard_key not in self._shards:
+            self._shards[shard_key] = Shard(len(self._shards), keys)
+
+        shard = self._shards[shard_key]
+        shard.bots.append((pair_name, settings))
+        return shard.index
+
+    def subscribe(
+        self, channel: str, callback: typing.Callable[[str, typing.Any], None]
+    ) -> None:
+        """subscribe Call callback(symbol, value) on each event of the channel (a MarketMaker signal name)."""
+        self._subscribers[channel].append(callback)
+
+    def get_restarts(self) -> typing.Dict[int, int]:
+        return dict(self._restarts)
+
+    def _start_worker(self, shard: Shard) -> None:
+        stop_event = self._context.Event()
+        process = self._context.Process(
+            target=_run_shard,
+            args=(shard, self.handler_factory, self._events, stop_event),
+            name=f"MarketMakerShard-{shard.index}",
+            daemon=True,
+        )
+        process.start()
+
+        self._workers[shard.index] = process
+        self._stop_events[shard.index] = stop_event
+        self.logger.info(
+            "Shard %s started in process %s: %s",
+            shard.index,
+            process.pid,
+            ", ".join(pair_name for pair_name, _ in shard.bots),
+        )
+
+    def _dispatch_events(self) -> None:
+        while self._dispatching:
+            try:
+                _, symbol, channel, value = self._events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            for callback in self._subscribers[CHANNELS[channel]]:
+                try:
+                    callback(symbol, value)
+                except Exception:
+                    self.logger.exception("Subscriber of %s failed", CHANNELS[channel])
+
+    def _watch_workers(self) -> None:
+        while self._working:
+            time.sleep(1)
+
+            for shard in self._shards.values():
+                process = self._workers[shard.index]
+                if process.is_alive() or not self._working:
+                    continue
+
+                self.logger.error(
+                    "Shard %s worker exited with code %s, restarting in %ss",
+                    shard.index,
+                    process.exitcode,
+                    self.restart_delay,
+                )
+                time.sleep(self.restart_delay)
+                if self._working:
+                    self._restarts[shard.index] = self._restarts.get(shard.index, 0) + 1
+                    self._start_worker(shard)
+
+    def start(self) -> None:
+        """Start all the workers and the coordinator threads."""
+        self._working = True
+        self._dispatching = True
+
+        for shard in self._shards.values():
+            self._start_worker(shard)
+
+        self._threads = [
+            threading.Thread(target=self._dispatch_events, daemon=True),
+            threading.Thread(target=self._watch_workers, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop all the workers, waiting up to timeout seconds for each of them."""
+        self._working = False
+
+        for stop_event in self._stop_events.values():
+            stop_event.set()
+
+        # Keep reading the events, so the workers could flush their queues and exit
+        for process in self._workers.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+        self._dispatching = False
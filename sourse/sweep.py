@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import dataclasses
+import itertools
+import json
+import multiprocessing
+import sys
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from sourse.backtest import Backtester, Klines
+from sourse.store import TemplateStore, get_store
+from sourse.logger import init_logger
+from sourse.marketmaker import MarketMaker
+
+# Candles of the worker process, attached to the shared memory by _attach_klines()
+_klines: typing.Optional[Klines] = None
+_memory: typing.Optional[shared_memory.SharedMemory] = None
+
+
+def _attach_klines(name: str, length: int) -> None:
+    global _klines, _memory
+
+    _memory = shared_memory.SharedMemory(name=name)
+    data = np.ndarray((4, length), dtype=np.float64, buffer=_memory.buf)
+    _klines = Klines(data[0], data[1], data[2], data[3])
+
+
+def _evaluate(
+    settings: MarketMaker.Settings, fill_model: str, fee: float
+) -> typing.Tuple[float, float, int, int]:
+    assert _klines is not None
+
+    result = Backtester(settings, fill_model, fee).run(_klines)
+    return result.pnl, result.max_drawdown, result.fills, result.rebuilds
+
+
+class ParameterSweep:
+    """This class backtests every combination of the given settings values in a process pool.
+
+    The candles are copied once into shared memory, which the workers attach to,
+    so they are not pickled for each worker or each task.
+    """
+
+    @dataclass
+    class Run:
+        settings: MarketMaker.Settings
+        pnl: float
+        max_drawdown: float
+        fills: int
+        rebuilds: int
+        score: float
+
+    def __init__(
+        self,
+        base: MarketMaker.Settings,
+        ranges: typing.Dict[str, typing.Sequence[typing.Any]],
+        processes: int = multiprocessing.cpu_count(),
+        fill_model: str = "touch",
+        fee: float = -0.00025,
+        drawdown_penalty: float = 1,
+    ):
+        """__init__ Create a new sweep.
+
+        Args:
+            base (MarketMaker.Settings): Settings, which are used for the fields without a range
+            ranges (typing.Dict[str, typing.Sequence[typing.Any]]): Values to try for each field
+            processes (int, optional): Amount of worker processes. Defaults to the cpu count.
+            fill_model (str, optional): Fill model of the Backtester. Defaults to "touch".
+            fee (float, optional): Fee rate of the Backtester. Defaults to -0.00025.
+            drawdown_penalty (float, optional): Runs are ranked by pnl - drawdown_penalty * max_drawdown.
+                Defaults to 1.
+        """
+        fields = {field.name for field in dataclasses.fields(MarketMaker.Settings)}
+        unknown = set(ranges.keys()) - fields
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+
+        self.base = base
+        self.ranges = ranges
+        self.processes = processes
+        self.fill_model = fill_model
+        self.fee = fee
+        self.drawdown_penalty = drawdown_penalty
+
+        self.logger = init_logger(self.__class__.__name__)
+
+    def combinations(self) -> typing.List[MarketMaker.Settings]:
+        names = list(self.ranges.keys())
+        return [
+            dataclasses.replace(self.base, **dict(zip(names, values)))
+            for values in itertools.product(*(self.ranges[name] for name in names))
+        ]
+
+    def run(self, klines: Klines) -> typing.List[ParameterSweep.Run]:
+        """run Backtest all the combinations.
+
+        Returns:
+            typing.List[ParameterSweep.Run]: Runs, sorted from the best score to the worst
+        """
+
+        combinations = self.combinations()
+        self.logger.info(
+            "Sweeping %s combinations over %s candles in %s processes",
+            len(combinations),
+            len(klines),
+            self.processes,
+        )
+
+        memory = shared_memory.SharedMemory(create=True, size=4 * len(klines) * 8)
+        data = np.ndarray((4, len(klines)), dtype=np.float64, buffer=memory.buf)
+        try:
+            data[:] = (klines.open, klines.high, klines.low, klines.close)
+
+            with ProcessPoolExecutor(
+                self.processes,
+                initializer=_attach_klines,
+                initargs=(memory.name, len(klines)),
+            ) as executor:
+                results = list(
+                    executor.map(
+                        _evaluate,
+                        combinations,
+                        itertools.repeat(self.fill_model),
+                        itertools.repeat(self.fee),
+                        chunksize=max(1, len(combinations) // (self.processes * 8)),
+                    )
+                )
+        finally:
+            del data
+            memory.close()
+            memory.unlink()
+
+        runs = [
+            ParameterSweep.Run(
+                settings,
+                pnl,
+                max_drawdown,
+                fills,
+                rebuilds,
+                score=pnl - self.drawdown_penalty * max_drawdown,
+            )
+            for settings, (pnl, max_drawdown, fills, rebuilds) in zip(
+                combinations, results
+            )
+        ]
+        runs.sort(key=lambda run: run.score, reverse=True)
+        return runs
+
+    @staticmethod
+    def save_templates(
+        runs: typing.List[ParameterSweep.Run],
+        top: int = 3,
+        prefix: str = "Sweep",
+        store: typing.Optional[TemplateStore] = None,
+    ) -> typing.List[str]:
+        """save_templates Save the best runs as settings templates and record their runs.
+
+        Args:
+            store (typing.Optional[TemplateStore], optional): Store to save to. Defaults to the shared one.
+
+        Returns:
+            typing.List[str]: Names of the saved templates
+        """
+        if store is None:
+            store = get_store()
+
+        best = runs[:top]
+        # All the templates are written in one transaction
+        saved = store.save_templates(
+            (
+                f"{prefix} #{place}",
+                f"Found by a parameter sweep: pnl {run.pnl:.8f} XBT, "
+                f"max drawdown {run.max_drawdown:.8f} XBT",
+                run.settings,
+            )
+            for place, run in enumerate(best, 1)
+        )
+        for template, run in zip(saved, best):
+            store.record_run(template.name, None, run.pnl, "sweep")
+
+        return [template.name for template in saved]
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(
+            "Usage: python -m sourse.sweep <klines.csv> <ranges.json> [base template]"
+        )
+        return
+
+    base = get_store().template(sys.argv[3] if len(sys.argv) > 3 else "Flat")
+    if base is None:
+        print("No such template")
+        return
+
+    with open(sys.argv[2], "r") as file:
+        sweep = ParameterSweep(base.settings, json.load(file))
+    runs = sweep.run(Klines.from_csv(sys.argv[1]))
+
+    for run in runs[:10]:
+        print(
+            f"score {run.score:.8f}: pnl {run.pnl:.8f} XBT, "
+            f"max drawdown {run.max_drawdown:.8f} XBT, {run.settings}"
+        )
+
+    print("Saved templates:", ", ".join(ParameterSweep.save_templates(runs)))
+
+
+if __name__ == "__main__":
+    main()
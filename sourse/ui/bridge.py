@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import typing
+
+from PyQt5 import QtCore
+
+from sourse.events import BoundSignal
+
+
+class SignalBridge(QtCore.QObject):
+    """This class delivers plain signals to the Qt thread, the bridge lives in.
+
+    Slots, connected through the bridge, are queued to that thread's event loop,
+    like the slots of a pyqtSignal, emitted from a different thread.
+    """
+
+    _received = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, parent: typing.Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self._received.connect(self._call)
+
+    @QtCore.pyqtSlot(object, object)
+    def _call(self, slot: typing.Callable[..., typing.Any], args: tuple) -> None:
+        slot(*args)
+
+    def connect(
+        self, signal: BoundSignal, slot: typing.Callable[..., typing.Any]
+    ) -> None:
+        signal.connect(lambda *args: self._received.emit(slot, args))
@@ -0,0 +1,93 @@
+"""Precompiled Qt Designer forms.
+
+uic.loadUi parses the .ui file on each start, so the forms are compiled to python modules
+once and the modules are kept in __uicache__, named by the hash of the .ui file.
+A changed form gets a new hash and is compiled again on the next start.
+
+Usage (optional build step, compiles all the forms of sourse/ui):
+    python -m sourse.ui.compiled
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import importlib.util
+import io
+import os
+import types
+import typing
+
+from PyQt5 import QtWidgets
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "__uicache__")
+
+
+def _module_path(ui_file: str) -> str:
+    with open(ui_file, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+
+    name = os.path.splitext(os.path.basename(ui_file))[0]
+    return os.path.join(CACHE_DIR, f"{name}_{digest}.py")
+
+
+def compile_ui(ui_file: str) -> str:
+    """compile_ui Compile the form, unless it is already cached.
+
+    Returns:
+        str: Path of the compiled module
+    """
+    path = _module_path(ui_file)
+    if os.path.exists(path):
+        return path
+
+    # uic is only needed for compiling
+    from PyQt5 import uic
+
+    source = io.StringIO()
+    uic.compileUi(ui_file, source)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(source.getvalue())
+    os.replace(temporary, path)
+
+    return path
+
+
+def _load_module(path: str) -> types.ModuleType:
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(f"_uicache_{name}", path)
+    assert spec is not None and spec.loader is not None
+
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_ui(ui_file: str, widget: QtWidgets.QWidget) -> typing.Any:
+    """load_ui Set up the widget from the form, as uic.loadUi(ui_file, widget) does.
+
+    Returns:
+        typing.Any: The form object, holding the created widgets as attributes
+    """
+    module = _load_module(compile_ui(ui_file))
+    form_class = next(
+        value
+        for name, value in vars(module).items()
+        if name.startswith("Ui_") and isinstance(value, type)
+    )
+
+    form = form_class()
+    form.setupUi(widget)
+    return form
+
+
+def main():
+    for ui_file in glob.glob(os.path.join(os.path.dirname(__file__), "*.ui")):
+        print(ui_file, "->", compile_ui(ui_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,39 @@
 from __future__ import annotations
 
-from PyQt5 import QtCore, QtGui, QtWidgets, uic
+from PyQt5 import QtCore, QtGui, QtWidgets
 import sourse.ui.modules as UiModules
 import asyncio
+import concurrent.futures
 import traceback
-import pandas as pd
-import threading
+from sourse.config import get_config
+from sourse.logger import init_logger
 from sourse.marketmaker import MarketMaker
+from sourse.store import get_store
+from sourse.ui.bridge import SignalBridge
+from sourse.ui.compiled import load_ui
+from sourse.ui.startup import StartupTimer
+from sourse.ui.throttler import UpdateThrottler
 from crypto_futures_py import BitmexExchangeHandler
 import typing
 
 
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self, asyncio_event_loop: asyncio.AbstractEventLoop):
+    history_loaded = QtCore.pyqtSignal(object)
+    # Candles come from the kline socket's thread
+    kline_appeared = QtCore.pyqtSignal(object)
+
+    def __init__(
+        self,
+        asyncio_event_loop: asyncio.AbstractEventLoop,
+        startup: typing.Optional[StartupTimer] = None,
+    ):
         self.asyncio_event_loop: asyncio.AbstractEventLoop = asyncio_event_loop
+        self.startup = startup if startup is not None else StartupTimer()
+        self.logger = init_logger(self.__class__.__name__)
 
         super().__init__()
-        uic.loadUi("sourse/ui/mainwindow.ui", self)  # Load the .ui file
+        load_ui("sourse/ui/mainwindow.ui", self)  # Load the precompiled .ui file
+        self.startup.mark("ui")
         self.setWindowIcon(QtGui.QIcon("assets/bitcoin (1).png"))
         self.setWindowTitle("Bitmex Marketmaker Bot")
 
@@ -48,13 +65,11 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         # current_settings signals
-        self.current_settings.templates_updated.connect(
-            self.setting_templates.refresh_templates
-        )
         self.current_settings.settings_changed.connect(
             self.setting_templates.reset_load_buttons
         )
         self.current_settings.start_button_pressed.connect(self.start)
+        self.current_settings.stop_button_pressed.connect(self._on_stop)
         self.current_settings.cancel_all_orders.connect(
             self._on_client_cancels_all_orders
         )
@@ -69,26 +84,44 @@ class MainWindow(QtWidgets.QMainWindow):
         self.current_orders.rebuild_grid.connect(self._on_client_rebuilds_grid)
 
         self.data_module = UiModules.DataModule(self.top_left_dockwidget)
+        self.data_module.set_pair_name(self.current_settings.get_current_pair())
 
         self.handle = BitmexExchangeHandler(*self.current_settings.get_current_keys())
-        self.chart = UiModules.Chart(self)
+        self.startup.mark("modules")
+
+        # The chart is created after the first paint and filled, when the history is loaded
+        self.chart: typing.Optional[UiModules.Chart] = None
+        self._painted = False
+        self._pending_history: typing.Optional[concurrent.futures.Future] = None
+        self.history_loaded.connect(self._on_history_loaded)
+        self.kline_appeared.connect(self._on_kline_event_appeared)
 
         data_loading = asyncio.run_coroutine_threadsafe(
-            self.handle.load_historical_data("XBTUSD", "1m", 1000),
+            self.handle.load_historical_data(
+                self.current_settings.get_current_pair(), "1m", 1000
+            ),
             self.asyncio_event_loop,
         )
-
-        self.handle.start_kline_socket_threaded(
-            self._on_kline_event_appeared, "1m", "XBTUSD"
-        )
-
-        self.chart.draw_historical_data(data_loading.result())
-
-        # data_loading.add_done_callback(
-        #     lambda x: self.chart.draw_historical_data(x.result())
-        # )
+        # Called in the asyncio thread, the signal passes the result to the main thread
+        data_loading.add_done_callback(self.history_loaded.emit)
 
         self.marketmaker: MarketMaker = None
+        # MarketMaker emits its signals in the asyncio thread
+        self.signal_bridge = SignalBridge(self)
+        # The frequent ones are coalesced and delivered at most "ui_fps" times a second
+        self.update_throttler = UpdateThrottler(get_config().get("ui_fps", 20), self)
+
+        # Templates, saved here or by another program (e.g. a parameter sweep),
+        # update the templates panel row by row
+        store = get_store()
+        self.signal_bridge.connect(
+            store.template_saved, self.setting_templates.on_template_saved
+        )
+        self.signal_bridge.connect(
+            store.template_deleted, self.setting_templates.on_template_deleted
+        )
+        store.watch()
+        self._run_id: typing.Optional[int] = None
         self.worker_thread: QtCore.QThread = None
 
         self.show()
@@ -99,23 +132,27 @@ class MainWindow(QtWidgets.QMainWindow):
                 *mainwindow.current_settings.get_current_keys()
             )
             mainwindow.marketmaker = MarketMaker(
-                "XBTUSD", handler, mainwindow.current_settings.get_current_settings()
+                mainwindow.current_settings.get_current_pair(),
+                handler,
+                mainwindow.current_settings.get_current_settings(),
             )
 
-            mainwindow.marketmaker.candle_appeared.connect(
-                lambda x: mainwindow._on_kline_event_appeared(x)
+            mainwindow.signal_bridge.connect(
+                mainwindow.marketmaker.candle_appeared,
+                lambda x: mainwindow._on_kline_event_appeared(x),
             )
-            mainwindow.marketmaker.period_updated.connect(
-                lambda x: mainwindow._on_period_updates(x)
+            mainwindow.signal_bridge.connect(
+                mainwindow.marketmaker.period_updated,
+                lambda x: mainwindow._on_period_updates(x),
             )
-            mainwindow.marketmaker.grid_updates.connect(
-                lambda x: mainwindow._on_grid_updates(x)
+            mainwindow.update_throttler.connect_batch(
+                mainwindow.marketmaker.order_updated,
+                lambda x: mainwindow._on_orders_updated(x),
+                key=lambda order: order.client_orderID or order.orderID,
             )
-            mainwindow.marketmaker.order_updated.connect(
-                lambda x: mainwindow._on_order_updated(x)
-            )
-            mainwindow.marketmaker.error_occured.connect(
-                lambda x: mainwindow._on_error_occured(x)
+            mainwindow.signal_bridge.connect(
+                mainwindow.marketmaker.error_occured,
+                lambda x: mainwindow._on_error_occured(x),
             )
 
             mainwindow.current_settings.settings_changed.connect(
@@ -124,26 +161,77 @@ class MainWindow(QtWidgets.QMainWindow):
                 )
             )
 
-            mainwindow.marketmaker.position_updated.connect(
-                lambda x: mainwindow.data_module.update_position(x)
+            mainwindow.update_throttler.connect_latest(
+                mainwindow.marketmaker.position_updated,
+                lambda x: mainwindow.data_module.update_position(x),
             )
-            mainwindow.marketmaker.server_position_updated.connect(
-                lambda x: mainwindow.data_module.update_position_server(x)
+            mainwindow.update_throttler.connect_latest(
+                mainwindow.marketmaker.server_position_updated,
+                lambda x: mainwindow.data_module.update_position_server(x),
             )
-            mainwindow.marketmaker.balance_updated.connect(
-                lambda x: mainwindow.data_module.update_balance(x)
+            mainwindow.update_throttler.connect_latest(
+                mainwindow.marketmaker.balance_updated,
+                lambda x: mainwindow.data_module.update_balance(x),
             )
-            mainwindow.marketmaker.server_balance_updated.connect(
-                lambda x: mainwindow.data_module.update_balance_server(x)
+            mainwindow.update_throttler.connect_latest(
+                mainwindow.marketmaker.server_balance_updated,
+                lambda x: mainwindow.data_module.update_balance_server(x),
             )
-            mainwindow.marketmaker.price_updated.connect(
-                lambda x: mainwindow.data_module.update_price(x)
+            mainwindow.update_throttler.connect_latest(
+                mainwindow.marketmaker.price_updated,
+                lambda x: mainwindow.data_module.update_price(x),
             )
 
             asyncio.run_coroutine_threadsafe(
                 mainwindow.marketmaker.start(), mainwindow.asyncio_event_loop
             )
 
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        super().paintEvent(event)
+
+        if not self._painted:
+            self._painted = True
+            self.startup.mark("first paint")
+            QtCore.QTimer.singleShot(0, self._on_first_paint)
+
+    def _on_first_paint(self):
+        self._create_chart()
+
+        if self._pending_history is not None:
+            self._on_history_loaded(self._pending_history)
+            self._pending_history = None
+
+    def _create_chart(self) -> UiModules.Chart:
+        if self.chart is None:
+            self.chart = UiModules.Chart(
+                self, get_config().get("chart_candles", UiModules.Chart.MAX_CANDLES)
+            )
+            self.startup.mark("chart")
+        return self.chart
+
+    @QtCore.pyqtSlot(object)
+    def _on_history_loaded(self, data_loading: concurrent.futures.Future):
+        if not self._painted:
+            # Let the window show up first
+            self._pending_history = data_loading
+            return
+
+        try:
+            history = data_loading.result()
+        except Exception as error:
+            self._on_error_occured(error)
+            return
+
+        self._create_chart().draw_historical_data(history)
+        self.handle.start_kline_socket_threaded(
+            self.kline_appeared.emit,
+            "1m",
+            self.current_settings.get_current_pair(),
+        )
+
+        self.startup.mark("history")
+        self.logger.info(self.startup.report())
+
     def is_marketmaker_finished(self) -> typing.Tuple[bool, bool]:
         """is_marketmaker_finished [summary]
 
@@ -163,8 +251,18 @@ class MainWindow(QtWidgets.QMainWindow):
     def start(self):
         self.worker_thread = self.Worker()
         self.worker_thread.run(self)
+        self._run_id = get_store().start_run(
+            self.current_settings.get_current_template(),
+            self.current_settings.get_current_pair(),
+        )
 
     @QtCore.pyqtSlot()
+    def _on_stop(self):
+        if self._run_id is not None and self.marketmaker is not None:
+            get_store().finish_run(self._run_id, self.marketmaker.pnl)
+            self._run_id = None
+
+    @QtCore.pyqtSlot(object)
     def _on_kline_event_appeared(self, candle: BitmexExchangeHandler.KlineCallback):
         candle_dict = {
             "Open": candle.open,
@@ -172,6 +270,8 @@ class MainWindow(QtWidgets.QMainWindow):
             "Low": candle.low,
             "Close": candle.close,
             "Volume": candle.volume,
+            "time": candle.time,
+            "final": candle.final,
         }
         self.chart.add_candle(candle_dict)
 
@@ -179,20 +279,17 @@ class MainWindow(QtWidgets.QMainWindow):
     def _on_period_updates(
         self, current_orders: typing.List[typing.Tuple[str, float, float, str]]
     ):
+        if self.chart is None:
+            return
+
         self.chart.add_grid(
             [p for d, p, _, _ in current_orders if d == "Buy"],
             [p for d, p, _, _ in current_orders if d == "Sell"],
         )
 
     @QtCore.pyqtSlot(object)
-    def _on_grid_updates(
-        self, orders: typing.List[typing.Tuple[str, float, float, str]]
-    ):
-        self.current_orders.remove_all_orders()
-
-    @QtCore.pyqtSlot(object)
-    def _on_order_updated(self, data: BitmexExchangeHandler.OrderUpdate):
-        self.current_orders.add_order(data)
+    def _on_orders_updated(self, data: typing.List[BitmexExchangeHandler.OrderUpdate]):
+        self.current_orders.add_orders(data)
 
     @QtCore.pyqtSlot(str)
     def _on_client_cancels_order(self, client_orderID: str):
@@ -215,7 +312,7 @@ class MainWindow(QtWidgets.QMainWindow):
             try:
                 asyncio.run_coroutine_threadsafe(
                     self.handle.create_market_order(
-                        "XBTUSD",
+                        self.marketmaker.pair_name,
                         "Sell" if position.volume > 0 else "Buy",
                         abs(position.volume),
                     ),
@@ -252,4 +349,3 @@ class MainWindow(QtWidgets.QMainWindow):
     def closeEvent(self, event):
         self.current_settings.check_bot_finish_actions()
         return super().closeEvent(event)
-
@@ -1,6 +1,32 @@
-from .current_settings import CurrentSettingsModule
-from .base_qdockwidget_module import BaseUIModule
-from .current_orders import CurrentOrdersModule
-from .setting_templates import SettingTemplatesModule
-from .chart_module import Chart
-from .data_module import DataModule
+import importlib
+import typing
+
+# The modules are imported on the first access, so the heavy ones (the chart imports
+# pyqtgraph and pandas) do not slow down the start of the window.
+_MODULES = {
+    "CurrentSettingsModule": "current_settings",
+    "BaseUIModule": "base_qdockwidget_module",
+    "CurrentOrdersModule": "current_orders",
+    "SettingTemplatesModule": "setting_templates",
+    "Chart": "chart_module",
+    "DataModule": "data_module",
+}
+
+__all__ = list(_MODULES.keys())
+
+if typing.TYPE_CHECKING:
+    from .current_settings import CurrentSettingsModule
+    from .base_qdockwidget_module import BaseUIModule
+    from .current_orders import CurrentOrdersModule
+    from .setting_templates import SettingTemplatesModule
+    from .chart_module import Chart
+    from .data_module import DataModule
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name not in _MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{_MODULES[name]}", __name__), name)
+    globals()[name] = value
+    return value
@@ -1,58 +1,143 @@
 from PyQt5 import QtCore, QtGui, QtWidgets
 import pyqtgraph
 import pandas as pd
+import collections
+import math
 import typing
 
+from sourse.candles import CandlePyramid, CandleStore
+
 
 class CandlestickItem(pyqtgraph.GraphicsObject):
-    def __init__(self, data: typing.Mapping[str, float], candle_width: float = 0.333):
+    """All the candles of a CandleStore in one graphics item.
+
+    The candles are drawn in chunks of CHUNK consecutive ids: a chunk is recorded
+    into a QPicture once, with one drawLines() and one drawRects() call for each color,
+    and replayed on each paint. Only the chunks in the view are painted,
+    and a changed candle invalidates only its own chunk.
+
+    Candles of a coarser level of detail (with factor > 1) are drawn in the place
+    of the factor base candles they are made of.
+    """
+
+    CHUNK = 256
+    # Pictures of the chunks kept, the least recently painted ones are dropped
+    MAX_PICTURES = 64
+
+    def __init__(
+        self, candles: CandleStore, candle_width: float = 0.333, factor: int = 1
+    ):
         pyqtgraph.GraphicsObject.__init__(self)
-        self.data = data
-        self.candle_width = candle_width
-
-        self.generatePicture()
-
-    def generatePicture(self):
-        ## pre-computing a QPicture object allows paint() to run much more quickly,
-        ## rather than re-drawing the shapes every time.
-        self.picture = QtGui.QPicture()
-        p = QtGui.QPainter(self.picture)
-
-        t = self.data["id"]
-        open = self.data["Open"]
-        high = self.data["High"]
-        low = self.data["Low"]
-        close = self.data["Close"]
-        # p.setPen(pyqtgraph.mkPen("#ffffff00"))
-
-        if open > close:
-            p.setBrush(pyqtgraph.mkBrush("#EF5350"))
-            p.setPen(pyqtgraph.mkPen("#EF5350"))
-        else:
-            p.setBrush(pyqtgraph.mkBrush("#26A69A"))
-            p.setPen(pyqtgraph.mkPen("#26A69A"))
-        p.drawLine(QtCore.QPointF(t, low), QtCore.QPointF(t, high))
-        p.drawRect(
-            QtCore.QRectF(
-                t - self.candle_width, open, self.candle_width * 2, close - open
-            )
-        )
+        self.candles = candles
+        self.factor = factor
+        self.candle_width = candle_width * factor
 
+        self._colors = [
+            (pyqtgraph.mkPen(color), pyqtgraph.mkBrush(color))
+            for color in ("#26A69A", "#EF5350")
+        ]
+        self._pictures: typing.OrderedDict[int, QtGui.QPicture] = (
+            collections.OrderedDict()
+        )
+        self._first_id = candles.first_id if len(candles) > 0 else 0
+        self._low, self._high = candles.price_range(
+            self._first_id, self._first_id + len(candles)
+        ) or (0, 0)
+
+    def _chunk_picture(self, chunk: int) -> QtGui.QPicture:
+        picture = self._pictures.get(chunk)
+        if picture is not None:
+            self._pictures.move_to_end(chunk)
+            return picture
+
+        left, right = chunk * self.CHUNK, (chunk + 1) * self.CHUNK - 1
+        ids = self.candles.ids(left, right)
+        open = self.candles.column("Open", left, right)
+        high = self.candles.column("High", left, right)
+        low = self.candles.column("Low", left, right)
+        close = self.candles.column("Close", left, right)
+        falling = open > close
+
+        picture = QtGui.QPicture()
+        p = QtGui.QPainter(picture)
+        for (pen, brush), mask in zip(self._colors, (~falling, falling)):
+            if not mask.any():
+                continue
+
+            t = (ids[mask] * self.factor + (self.factor - 1) / 2).tolist()
+            p.setPen(pen)
+            p.setBrush(brush)
+            p.drawLines(
+                [
+                    QtCore.QLineF(x, y1, x, y2)
+                    for x, y1, y2 in zip(t, low[mask].tolist(), high[mask].tolist())
+                ]
+            )
+            p.drawRects(
+                [
+                    QtCore.QRectF(
+                        x - self.candle_width, y1, self.candle_width * 2, y2 - y1
+                    )
+                    for x, y1, y2 in zip(t, open[mask].tolist(), close[mask].tolist())
+                ]
+            )
         p.end()
 
+        self._pictures[chunk] = picture
+        if len(self._pictures) > self.MAX_PICTURES:
+            self._pictures.popitem(last=False)
+        return picture
+
+    def update_candle(self, candle_id: int) -> None:
+        """update_candle Redraw the chunk of an added or changed candle."""
+        first_id = self.candles.first_id
+        if first_id != self._first_id:
+            # The dropped candles disappear from the chunk of the first one
+            for chunk in list(self._pictures.keys()):
+                if chunk <= first_id // self.CHUNK:
+                    del self._pictures[chunk]
+            self._first_id = first_id
+
+        self._pictures.pop(candle_id // self.CHUNK, None)
+
+        candle = self.candles.candle(candle_id)
+        self.prepareGeometryChange()
+        self._low = min(self._low, candle["Low"])
+        self._high = max(self._high, candle["High"])
+        self.update()
+
     def paint(self, p, *args):
-        p.drawPicture(0, 0, self.picture)
+        if len(self.candles) == 0:
+            return
+
+        rect = self.viewRect() or self.boundingRect()
+        left = max(self.candles.first_id, math.floor(rect.left() / self.factor))
+        right = min(self.candles.last_id, math.ceil(rect.right() / self.factor))
+
+        for chunk in range(left // self.CHUNK, right // self.CHUNK + 1):
+            p.drawPicture(0, 0, self._chunk_picture(chunk))
 
     def boundingRect(self):
         ## boundingRect _must_ indicate the entire area that will be drawn on
         ## or else we will get artifacts and possibly crashing.
-        ## (in this case, QPicture does all the work of computing the bouning rect for us)
-        return QtCore.QRectF(self.picture.boundingRect())
+        if len(self.candles) == 0:
+            return QtCore.QRectF()
+
+        offset = (self.factor - 1) / 2
+        left = self.candles.first_id * self.factor + offset - self.candle_width
+        right = self.candles.last_id * self.factor + offset + self.candle_width
+        return QtCore.QRectF(left, self._low, right - left, self._high - self._low)
 
 
 class Chart(QtCore.QObject):
-    def __init__(self, parent: QtWidgets.QMainWindow):
+    # Candles kept in memory, the older ones are spilled to the disk
+    MAX_CANDLES = 100000
+    # Minimal width of a drawn candle, wider views switch to a coarser level of detail
+    PIXELS_PER_CANDLE = 3
+
+    def __init__(self, parent: QtWidgets.QMainWindow, max_candles: int = MAX_CANDLES):
         super().__init__(parent)
+        self.max_candles = max_candles
 
         self.graphWidget = pyqtgraph.PlotWidget()
         self.graphWidget.setBackground("#19232d")  # 25 35 45
@@ -60,12 +145,13 @@ class Chart(QtCore.QObject):
 
         self.graphWidget.showGrid(True, True)
 
-        self._hist: pd.DataFrame = None
-        self._drawn_candles: typing.Dict[int, CandlestickItem] = {}
-        self._left_candle = 0
-        self._right_candle = 0
-
-        self.__prev_rect: QtCore.QRectF = None
+        self._candles: CandleStore = None
+        self._pyramid: typing.Optional[CandlePyramid] = None
+        # Time of the last candle, if it is still forming
+        self._forming_time: typing.Any = None
+        # An item for each level of detail, only one of them is visible
+        self._candles_items: typing.List[CandlestickItem] = []
+        self._level = 0
         self._grid_lines: typing.List[pyqtgraph.GraphicsObject] = []
         self.graphWidget.sigRangeChanged.connect(self._on_range_changed)
 
@@ -76,27 +162,17 @@ class Chart(QtCore.QObject):
         # )
 
     def draw_historical_data(self, hist_data: pd.DataFrame):
-        self._hist = hist_data
-        self._hist["id"] = list(range(-len(self._hist) + 1, 1))
+        self._candles = CandleStore.from_frame(hist_data, max_size=self.max_candles)
+        self._pyramid = CandlePyramid(self._candles)
 
-        curr_price = self._hist.iloc[-1]["Close"]
-        curr_id = self._hist.iloc[-1]["id"]
+        curr_id = self._candles.last_id
+        curr_price = self._candles.candle(curr_id)["Close"]
 
         width = 100
 
-        prices = [
-            (min(row), max(row))
-            for i, row in (
-                self._hist[["Open", "High", "Low", "Close"]]
-                .iloc[curr_id - width - 1 : -1]
-                .iterrows()
-            )
-        ]
-
-        min_price, max_price = (
-            min(prices, key=lambda x: x[0])[0],
-            max(prices, key=lambda x: x[1])[1],
-        )
+        min_price, max_price = self._candles.price_range(
+            curr_id - width - 1, curr_id - 1
+        ) or (curr_price, curr_price)
 
         height = 2 * max(abs(min_price - curr_price), abs(max_price - curr_price))
 
@@ -108,75 +184,43 @@ class Chart(QtCore.QObject):
         self.graphWidget.setRange(rect)
         # self.graphWidget.sigRangeChanged.connect(self._on_range_changed)
 
-    def _draw_candle(self, num: int) -> typing.Optional[CandlestickItem]:
-        if num in self._drawn_candles:
-            self.graphWidget.removeItem(self._drawn_candles[num])
+        # Added after the range is set, so the view is not auto-ranged to the whole history
+        for item in self._candles_items:
+            self.graphWidget.removeItem(item)
+        self._candles_items = [
+            CandlestickItem(level, factor=factor)
+            for factor, level in zip(self._pyramid.factors, self._pyramid.levels)
+        ]
+        for item in self._candles_items:
+            item.setVisible(False)
+            self.graphWidget.addItem(item)
 
-        try:
-            if num in self._drawn_candles:
-                self._undraw_candle(num)
-            self._drawn_candles[num] = item = CandlestickItem(
-                self._hist.loc[self._hist["id"] == num].iloc[-1]
-            )
-        except IndexError:
-            return None
+        self._level = -1
+        self._set_level(self._pyramid.level_for(rect.width(), self._candle_budget()))
 
-        self.graphWidget.addItem(item)
-        return item
+    def _candle_budget(self) -> int:
+        return max(1, int(self.graphWidget.width() / self.PIXELS_PER_CANDLE))
 
-    def _undraw_candle(self, num: int) -> None:
-        if num not in self._drawn_candles:
+    def _set_level(self, level: int) -> None:
+        if level == self._level:
             return
 
-        item = self._drawn_candles[num]
-        self.graphWidget.removeItem(item)
-        self._drawn_candles.pop(num, 0)
-
-    def _id_is_viewed(self, time: float) -> bool:
-        return time >= self._left_candle and time <= self._right_candle
+        if self._level >= 0:
+            self._candles_items[self._level].setVisible(False)
+        self._candles_items[level].setVisible(True)
+        self._level = level
 
     @QtCore.pyqtSlot(object)
     def _on_range_changed(self, pos):
         rect: QtCore.QRectF = pos.viewRect()
-        rect.adjust(-5, 0, 10, 0)
-
-        if self._hist is None:
-            return
 
-        if rect.width() > 1500:
-            if self.__prev_rect.width() > 1500:
-                self.__prev_rect.setWidth(1500)
-            self.graphWidget.sigRangeChanged.disconnect(self._on_range_changed)
-            self.graphWidget.setRange(self.__prev_rect)
-            self.graphWidget.sigRangeChanged.connect(self._on_range_changed)
+        if len(self._candles_items) == 0:
             return
 
-        x = int(rect.x())
-
-        if x < self._left_candle:
-            for i in range(x - 2, self._left_candle + 1):
-                self._draw_candle(i)
-                self._left_candle = min(self._left_candle, i)
-        elif x > self._left_candle:
-            for i in range(self._left_candle, x - 1):
-                self._undraw_candle(i)
-                self._left_candle = max(self._left_candle, i)
-
-        x = int(rect.x() + rect.width())
-
-        if x > self._right_candle:
-            for i in range(self._right_candle, x + 1):
-                self._draw_candle(i)
-                self._right_candle = max(self._right_candle, i)
-        elif x < self._right_candle:
-            for i in range(x, self._right_candle + 1):
-                self._undraw_candle(i)
-                self._right_candle = min(self._right_candle, i)
-
-        self.__prev_rect = rect
+        self._set_level(self._pyramid.level_for(rect.width(), self._candle_budget()))
 
     def get_current_candle_id(self) -> int:
-        return self._hist["id"].iloc[-1]
+        return self._candles.last_id
 
     def add_grid(self, buy_grid: typing.List[float], sell_grid: typing.List[float]):
         for buy_order in buy_grid:
@@ -195,20 +239,23 @@ class Chart(QtCore.QObject):
                 pen=pyqtgraph.mkPen("#FF4500"),  # "#26A69A"),
             )
 
-    def add_candle(self, candle_data: typing.Mapping[str, float]) -> None:
-        new_id = self._hist["id"].iloc[-1] + 1
-        data = pd.DataFrame(
-            {
-                "id": new_id,
-                "Open": candle_data["Open"],
-                "High": candle_data["High"],
-                "Low": candle_data["Low"],
-                "Close": candle_data["Close"],
-                "Volume": candle_data["Volume"],
-            },
-            index=[0],
-        )
-        self._hist = self._hist.append(data)
+    def add_candle(self, candle_data: typing.Mapping[str, typing.Any]) -> None:
+        """add_candle Add a new candle, or update the forming one in place.
+
+        Args:
+            candle_data (typing.Mapping[str, typing.Any]): Open, High, Low, Close, Volume
+                and optionally time and final (False, if the candle is still forming
+                and will be sent again with the same time)
+        """
+        candle_time = candle_data.get("time")
+
+        if self._forming_time is not None and candle_time == self._forming_time:
+            candle_id = self._candles.last_id
+            self._candles.update(candle_id, candle_data)
+        else:
+            candle_id = self._candles.append(candle_data)
+
+        self._forming_time = None if candle_data.get("final", True) else candle_time
 
-        if self._id_is_viewed(new_id):
-            self._draw_candle(new_id)
+        for item, level_id in zip(self._candles_items, self._pyramid.update(candle_id)):
+            item.update_candle(level_id)
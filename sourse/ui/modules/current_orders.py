@@ -162,11 +162,14 @@ class CurrentOrdersModule(BaseUIModule):
     def add_order(
         self, order: AbstractExchangeHandler.OrderUpdate, historical_table: bool = False
     ) -> str:
-        order_id = order.client_orderID if order.client_orderID != "" else order.orderID
-
-        if order.status in ["FILLED", "CANCELED", "FAILED", "EXPIRED"]:
-            self._orders_to_delete[order_id] = datetime.now()
+        return self.add_orders([order], historical_table)[0]
 
+    def add_orders(
+        self,
+        orders: typing.List[AbstractExchangeHandler.OrderUpdate],
+        historical_table: bool = False,
+    ) -> typing.List[str]:
+        """add_orders Add or edit a batch of orders, the tables are re-sorted once for all of them."""
         current_sorted_index = self.table.horizontalHeader().sortIndicatorSection()
         current_sorted_type = self.table.horizontalHeader().sortIndicatorOrder()
         self.table.sortItems(
@@ -183,11 +186,30 @@ class CurrentOrdersModule(BaseUIModule):
         self.table_historical.sortItems(10, QtCore.Qt.AscendingOrder)
         self.table_historical.setSortingEnabled(False)
 
+        res = [self._add_order(order, historical_table) for order in orders]
+
+        self.table.setSortingEnabled(True)
+        self.table.sortItems(current_sorted_index, current_sorted_type)
+        self.table_historical.setSortingEnabled(True)
+        self.table_historical.sortItems(
+            current_sorted_historical_index, current_sorted_historical_type
+        )
+
+        return res
+
+    def _add_order(
+        self, order: AbstractExchangeHandler.OrderUpdate, historical_table: bool = False
+    ) -> str:
+        order_id = order.client_orderID if order.client_orderID != "" else order.orderID
+
+        if order.status in ["FILLED", "CANCELED", "FAILED", "EXPIRED"]:
+            self._orders_to_delete[order_id] = datetime.now()
+
         if not historical_table:
             if order_id in self._order_dict.keys():
                 res = self._edit_order(order)
             elif order_id in self._historical_order_dict.keys():
-                res = self.add_order(order, True)
+                res = self._add_order(order, True)
             else:
                 self._order_dict[order_id] = (len(self._order_dict), order)
 
@@ -235,13 +257,6 @@ class CurrentOrdersModule(BaseUIModule):
                 self.historical_counter += 1
                 res = order_id
 
-        self.table.setSortingEnabled(True)
-        self.table.sortItems(current_sorted_index, current_sorted_type)
-        self.table_historical.setSortingEnabled(True)
-        self.table_historical.sortItems(
-            current_sorted_historical_index, current_sorted_historical_type
-        )
-
         return res
 
     def _edit_order(
@@ -2,9 +2,10 @@ from __future__ import annotations
 
 from sourse.ui.modules.base_qdockwidget_module import BaseUIModule
 from PyQt5 import QtWidgets, QtCore, QtGui
+from sourse.config import get_config
 from sourse.marketmaker import MarketMaker
+from sourse.store import get_store
 import typing
-import json
 
 
 class InputFormat:
@@ -22,7 +23,6 @@ class InputFormat:
 
 
 class CurrentSettingsModule(BaseUIModule):
-    templates_updated = QtCore.pyqtSignal()
     settings_changed = QtCore.pyqtSignal()
     start_button_pressed = QtCore.pyqtSignal()
     stop_button_pressed = QtCore.pyqtSignal()
@@ -41,7 +41,10 @@ class CurrentSettingsModule(BaseUIModule):
             "public": None,
         }
         self._marketmaker_finished_predicate = marketmaker_finished_predicate
+        # The loaded template, until the settings are changed by hand
+        self._template_name: typing.Optional[str] = None
         super().__init__(parent)
+        self.settings_changed.connect(self._forget_template)
         self.base_widget.installEventFilter(self)
 
     def eventFilter(self, sourse, event):
@@ -64,7 +67,7 @@ class CurrentSettingsModule(BaseUIModule):
     def _get_settings_description() -> typing.Dict[str, InputFormat]:
         d: typing.Dict[str, InputFormat] = {}
 
-        settings_data = json.load(open("settings.json", "r"))["settings_description"]
+        settings_data = get_config().settings_description
         for i in MarketMaker.Settings.__dataclass_fields__.keys():
             data = settings_data[i]
             name = data["name"]
@@ -197,17 +200,18 @@ class CurrentSettingsModule(BaseUIModule):
         group_box = QtWidgets.QGroupBox("Keys")
         layout = QtWidgets.QFormLayout(group_box)
 
-        settings_data = json.load(open("settings.json", "r"))["bitmex_client"]
+        client = get_config().client
+        self._pair_name: str = client.pair
 
         label = QtWidgets.QLabel("Public key:")
         widget = QtWidgets.QLineEdit()
-        widget.setText(settings_data["public_key"])
+        widget.setText(client.public_key)
         layout.addRow(label, widget)
         self._keys_widgets["public"] = widget
 
         label = QtWidgets.QLabel("Private key:")
         widget = QtWidgets.QLineEdit()
-        widget.setText(settings_data["private_key"])
+        widget.setText(client.private_key)
         layout.addRow(label, widget)
         self._keys_widgets["private"] = widget
 
@@ -289,9 +293,9 @@ class CurrentSettingsModule(BaseUIModule):
             name = name_input.text()
             desc = desc_input.text()
 
-            settings = json.load(open("./settings.json", "r"))
+            store = get_store()
 
-            if name in settings["templates"]:
+            if name in store:
                 msg = QtWidgets.QMessageBox()
                 msg.setIcon(QtWidgets.QMessageBox.Question)
                 # msg.setIconPixmap(pixmap)  # Своя картинка
@@ -309,9 +313,11 @@ class CurrentSettingsModule(BaseUIModule):
                 if msg.clickedButton() != okButton:
                     return
 
-            settings["templates"][name] = dict(
-                desc=desc,
-                **{
+            # The templates panel is updated by the store's notification
+            store.save_template(
+                name,
+                desc,
+                {
                     name: (
                         widget.value()
                         if widget.__class__ is not QtWidgets.QCheckBox
@@ -321,15 +327,14 @@ class CurrentSettingsModule(BaseUIModule):
                 },
             )
 
-            with open("./settings.json", "w") as f:
-                json.dump(settings, f)
-
-            self.templates_updated.emit()
-
         save_button.pressed.connect(save_template)
 
         return group_box
 
+    @QtCore.pyqtSlot()
+    def _forget_template(self):
+        self._template_name = None
+
     @QtCore.pyqtSlot()
     def on_template_loaded(self, name: str, template: MarketMaker.Settings):
         for setting_name in self._setting_widgets:
@@ -344,6 +349,9 @@ class CurrentSettingsModule(BaseUIModule):
                     template.__getattribute__(setting_name)
                 )
 
+        # Set after the widgets, since their changes forget the template
+        self._template_name = name
+
     def get_current_settings(self) -> MarketMaker.Settings:
         return MarketMaker.Settings(
             **{
@@ -356,6 +364,13 @@ class CurrentSettingsModule(BaseUIModule):
             }
         )
 
+    def get_current_template(self) -> typing.Optional[str]:
+        """get_current_template Name of the template, the current settings are loaded from."""
+        return self._template_name
+
+    def get_current_pair(self) -> str:
+        return self._pair_name
+
     def get_current_keys(self) -> typing.Tuple[str, str]:
         if (
             self._keys_widgets["public"] is not None
@@ -48,7 +48,7 @@ class DataModule(BaseUIModule):
 
         bigger_text_size = 14
 
-        label = QtWidgets.QLabel("Your position: XBTUSD")
+        label = self._position_label = QtWidgets.QLabel("Your position: XBTUSD")
         set_label_font_size(label, bigger_text_size)
         label.setMargin(10)
         self.layout.addWidget(label)
@@ -103,6 +103,9 @@ class DataModule(BaseUIModule):
         self._current_server_position_data: MarketMaker.Position = None
         self._current_client_position_data: MarketMaker.Position = None
 
+    def set_pair_name(self, pair_name: str) -> None:
+        self._position_label.setText(f"Your position: {pair_name}")
+
     @QtCore.pyqtSlot(object)
     def update_position(self, position: MarketMaker.Position):
         self._current_client_position_data = position
@@ -3,15 +3,19 @@ from __future__ import annotations
 from sourse.ui.modules.base_qdockwidget_module import BaseUIModule
 from PyQt5 import QtWidgets, QtCore, QtGui
 from sourse.marketmaker import MarketMaker
+from sourse.store import TemplateStore, get_store
 import typing
-import json
 
 
 class SettingTemplatesModule(BaseUIModule):
     template_selected = QtCore.pyqtSignal(str, object)
 
     def __init__(self, parent):
-        self._load_buttons = []
+        # Template name -> its settings and the widgets of its row
+        self._load_buttons: typing.Dict[str, QtWidgets.QPushButton] = {}
+        self._templates: typing.Dict[str, MarketMaker.Settings] = {}
+        self._name_labels: typing.Dict[str, QtWidgets.QLabel] = {}
+        self._desc_labels: typing.Dict[str, QtWidgets.QLabel] = {}
         super().__init__(parent)
 
     def _create_widgets(self):
@@ -24,11 +28,6 @@ class SettingTemplatesModule(BaseUIModule):
         self._w = QtWidgets.QWidget()
         self._w.setLayout(self.layout)
 
-        for i in range(1):
-            button1 = QtWidgets.QPushButton("!{}!".format(i))
-            button2 = QtWidgets.QPushButton("{}".format(i))
-            self.layout.addRow(button1, button2)
-
         self._mw = QtWidgets.QScrollArea()
         self._mw.setWidget(self._w)
 
@@ -54,81 +53,85 @@ class SettingTemplatesModule(BaseUIModule):
                 max(self._mw.size().height(), self.layout.rowCount() * 40),
             )
 
-    def _clear_templates(self):
-        self._load_buttons = []
-        for i in reversed(range(self.layout.count())):
-            item = self.layout.itemAt(i)
-            if isinstance(item, QtWidgets.QWidgetItem):
-                item.widget().deleteLater()
-            elif isinstance(item, QtWidgets.QVBoxLayout):
-                for j in reversed(range(item.count())):
-                    item1 = item.itemAt(j)
-                    if isinstance(item1, QtWidgets.QWidgetItem):
-                        item1.widget().deleteLater()
-                    elif isinstance(item1, QtWidgets.QHBoxLayout):
-                        for k in reversed(range(item1.count())):
-                            item1.itemAt(k).widget().deleteLater()
-
-                item.setParent(None)
-
-    @QtCore.pyqtSlot()
-    def refresh_templates(self):
-        self._clear_templates()
-        for name, desc, settings in SettingTemplatesModule.get_saved_templates():
-            name_label = QtWidgets.QLabel(f"{name} template:")
-            desc_label = QtWidgets.QLabel(f"<i>{desc}</i><br>")
-            desc_label.setWordWrap(True)
-            load_button = QtWidgets.QPushButton("Load")
-            self._load_buttons.append(load_button)
-            load_button.pressed.connect(
-                lambda name=name, template=settings: self.template_selected.emit(
-                    name, template
-                )
-            )
-            load_button.pressed.connect(
-                lambda button=load_button: (
-                    self.reset_load_buttons(),
-                    button.setDisabled(True),
-                )
+    def _add_row(self, template: TemplateStore.Template):
+        name = template.name
+        name_label = QtWidgets.QLabel(f"{name} template:")
+        desc_label = QtWidgets.QLabel(f"<i>{template.desc}</i><br>")
+        desc_label.setWordWrap(True)
+        load_button = QtWidgets.QPushButton("Load")
+        # The settings are looked up on press, so a new version of the template is loaded
+        load_button.pressed.connect(
+            lambda name=name: self.template_selected.emit(name, self._templates[name])
+        )
+        load_button.pressed.connect(
+            lambda button=load_button: (
+                self.reset_load_buttons(),
+                button.setDisabled(True),
             )
-            delete_button = QtWidgets.QPushButton("Delete")
+        )
+        delete_button = QtWidgets.QPushButton("Delete")
 
-            delete_button.pressed.connect(
-                lambda tname=name: self.delete_template(tname)
-            )
+        delete_button.pressed.connect(lambda tname=name: self.delete_template(tname))
+
+        hlayout = QtWidgets.QHBoxLayout()
+        hlayout.addWidget(load_button)
+        hlayout.addWidget(delete_button)
+
+        vlayout = QtWidgets.QVBoxLayout()
+        vlayout.addLayout(hlayout)
+        vlayout.addWidget(desc_label)
+        self.layout.addRow(name_label, vlayout)
+
+        self._load_buttons[name] = load_button
+        self._name_labels[name] = name_label
+        self._desc_labels[name] = desc_label
 
-            hlayout = QtWidgets.QHBoxLayout()
-            hlayout.addWidget(load_button)
-            hlayout.addWidget(delete_button)
+    def _set_template(self, template: TemplateStore.Template):
+        self._templates[template.name] = template.settings
 
-            vlayout = QtWidgets.QVBoxLayout()
-            vlayout.addLayout(hlayout)
-            vlayout.addWidget(desc_label)
-            self.layout.addRow(name_label, vlayout)
+        if template.name in self._desc_labels:
+            self._desc_labels[template.name].setText(f"<i>{template.desc}</i><br>")
+        else:
+            self._add_row(template)
+
+    @QtCore.pyqtSlot(object)
+    def on_template_saved(self, template: TemplateStore.Template):
+        """on_template_saved Add the row of a new template or update the row of a changed one."""
+        self._set_template(template)
+        self.__update_size()
+
+    @QtCore.pyqtSlot(str)
+    def on_template_deleted(self, name: str):
+        self._templates.pop(name, None)
+        self._load_buttons.pop(name, None)
+        self._desc_labels.pop(name, None)
+        name_label = self._name_labels.pop(name, None)
+        if name_label is None:
+            return
+
+        # The row's widgets are deleted with it
+        self.layout.removeRow(name_label)
+        self.__update_size()
+
+    @QtCore.pyqtSlot()
+    def refresh_templates(self):
+        """refresh_templates Bring the rows in line with the store, touching only the changed ones."""
+        templates = get_store().templates()
+        names = {template.name for template in templates}
+
+        for name in list(self._name_labels):
+            if name not in names:
+                self.on_template_deleted(name)
+        for template in templates:
+            self._set_template(template)
 
         self.__update_size()
 
     def delete_template(self, name):
-        settings = json.load(open("./settings.json", "r"))
-        del settings["templates"][name]
-        with open("./settings.json", "w") as f:
-            json.dump(settings, f)
-        self.refresh_templates()
+        # The row is removed by the store's notification
+        get_store().delete_template(name)
 
     @QtCore.pyqtSlot()
     def reset_load_buttons(self):
-        for button in self._load_buttons:
+        for button in self._load_buttons.values():
             button.setEnabled(True)
-
-    @staticmethod
-    def get_saved_templates(
-        file: str = "./settings.json",
-    ) -> typing.Iterator[typing.Tuple[str, str, MarketMaker.Settings]]:
-        with open(file, mode="r") as settings_file:
-            settings = json.load(settings_file)
-            for name, template in settings["templates"].items():
-                desc = template["desc"]
-                del template["desc"]
-
-                setting = MarketMaker.Settings(**template)
-                yield (name, desc, setting)
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import time
+import typing
+
+
+class StartupTimer:
+    """Durations of the startup phases, measured from the creation of the timer."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: typing.List[typing.Tuple[str, float]] = []
+        self._last = self.started
+
+    def mark(self, phase: str) -> None:
+        """mark Finish the phase, that has been running since the previous mark."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        width = max([len(phase) for phase, _ in self.phases] + [5])
+        lines = ["Startup:"]
+        lines += [
+            f"  {phase:<{width}} {duration * 1000:8.1f} ms"
+            for phase, duration in self.phases
+        ]
+        lines.append(
+            f"  {'total':<{width}} {(self._last - self.started) * 1000:8.1f} ms"
+        )
+        return "\n".join(lines)
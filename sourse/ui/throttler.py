@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import threading
+import typing
+
+from PyQt5 import QtCore
+
+from sourse.events import BoundSignal
+
+Key = typing.Callable[[typing.Any], typing.Hashable]
+
+
+class UpdateThrottler(QtCore.QObject):
+    """This class delivers plain signals to the Qt thread at a fixed frame rate.
+
+    Signals are collected in any thread and flushed by a timer of the Qt thread,
+    the throttler lives in, so the cost of the UI does not grow with the rate of the feed:
+    a "latest" channel calls its slot once per frame with the last emitted value,
+    a "batch" channel calls its slot once per frame with all the values since the last frame
+    (or with the last value for each key, if a key is given).
+    """
+
+    class _Channel:
+        __slots__ = ("slot", "key", "pending")
+
+        def __init__(
+            self, slot: typing.Callable[..., typing.Any], key: typing.Optional[Key]
+        ):
+            self.slot = slot
+            self.key = key
+            self.pending: typing.Any = None
+
+    def __init__(self, fps: float = 20, parent: typing.Optional[QtCore.QObject] = None):
+        """__init__ Create a new throttler and start its timer.
+
+        Args:
+            fps (float, optional): Flushes per second. Defaults to 20.
+            parent (typing.Optional[QtCore.QObject], optional): Parent object. Defaults to None.
+        """
+        super().__init__(parent)
+
+        self._lock = threading.Lock()
+        self._latest: typing.List[UpdateThrottler._Channel] = []
+        self._batches: typing.List[UpdateThrottler._Channel] = []
+        self.flushes = 0
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self.set_fps(fps)
+        self._timer.start()
+
+    @property
+    def fps(self) -> float:
+        return 1000 / self._timer.interval()
+
+    def set_fps(self, fps: float) -> None:
+        self._timer.setInterval(max(1, round(1000 / fps)))
+
+    def connect_latest(
+        self, signal: BoundSignal, slot: typing.Callable[..., typing.Any]
+    ) -> None:
+        """connect_latest Call the slot once per frame with the arguments of the last emission."""
+        channel = UpdateThrottler._Channel(slot, None)
+        self._latest.append(channel)
+
+        def collect(*args: typing.Any) -> None:
+            with self._lock:
+                channel.pending = args
+
+        signal.connect(collect)
+
+    def connect_batch(
+        self,
+        signal: BoundSignal,
+        slot: typing.Callable[[typing.List[typing.Any]], typing.Any],
+        key: typing.Optional[Key] = None,
+    ) -> None:
+        """connect_batch Call the slot once per frame with the list of the emitted values.
+
+        Args:
+            signal (BoundSignal): Signal with one argument
+            slot (typing.Callable[[typing.List[typing.Any]], typing.Any]): Gets the values in the order
+                they were emitted
+            key (typing.Optional[Key], optional): If given, only the last value for each key is kept,
+                at the place of the first one. Defaults to None.
+        """
+        channel = UpdateThrottler._Channel(slot, key)
+        self._batches.append(channel)
+
+        def collect(value: typing.Any) -> None:
+            with self._lock:
+                if channel.key is None:
+                    if channel.pending is None:
+                        channel.pending = []
+                    channel.pending.append(value)
+                else:
+                    if channel.pending is None:
+                        channel.pending = {}
+                    channel.pending[channel.key(value)] = value
+
+        signal.connect(collect)
+
+    @QtCore.pyqtSlot()
+    def flush(self) -> None:
+        """flush Deliver the collected updates. Called by the timer in the Qt thread."""
+        with self._lock:
+            latest = []
+            for channel in self._latest:
+                if channel.pending is not None:
+                    latest.append((channel.slot, channel.pending))
+                    channel.pending = None
+
+            batches = []
+            for channel in self._batches:
+                if channel.pending is not None:
+                    values = channel.pending
+                    if isinstance(values, dict):
+                        values = list(values.values())
+                    batches.append((channel.slot, values))
+                    channel.pending = None
+
+        if len(latest) == 0 and len(batches) == 0:
+            return
+
+        self.flushes += 1
+        for slot, values in batches:
+            slot(values)
+        for slot, args in latest:
+            slot(*args)
+
+    def stop(self) -> None:
+        self._timer.stop()
@@ -0,0 +1,11 @@
+"""Tests of the bot, run with python -m pytest tests or python -m unittest.
+
+crypto_futures_py requests the Binance exchange information, when it is imported.
+The request is answered with an empty one here, so the tests run without the network.
+"""
+
+from unittest import mock
+
+with mock.patch("requests.get") as get:
+    get.return_value.json.return_value = {"symbols": []}
+    import crypto_futures_py  # noqa: F401
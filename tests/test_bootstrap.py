@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import typing
+import unittest
+
+from crypto_futures_py import AbstractExchangeHandler, BitmexExchangeHandler
+from sourse.bootstrap import BitmexStateSource, start_user_update_socket
+
+
+class _Request:
+    def __init__(self, result: typing.Any):
+        self._result = result
+
+    def result(self) -> typing.Tuple[typing.Any, None]:
+        if isinstance(self._result, Exception):
+            raise self._result
+        return self._result, None
+
+
+class _Client:
+    """Just the REST calls, the state source and the handler's cancel_orders make."""
+
+    def __init__(self, orders: typing.List[typing.Dict[str, typing.Any]]):
+        self.orders = orders
+        self.canceled: typing.List[str] = []
+        self.Order = self
+        self.Position = self
+        self.User = self
+        self.Instrument = self
+
+    def Order_getOrders(self, symbol: str, filter: str, count: int, start: int):
+        return _Request(self.orders[start : start + count])
+
+    def Order_cancel(self, orderID: str):
+        self.canceled.append(orderID)
+        return _Request([])
+
+    def Position_get(self, filter: str):
+        return _Request([])
+
+    def User_getMargin(self):
+        return _Request({"marginBalance": 10**8})
+
+    def Instrument_get(self, symbol: str):
+        return _Request([{"lastPriceProtected": 10000.0}])
+
+
+def _order(i: int) -> typing.Dict[str, typing.Any]:
+    return {
+        "orderID": f"order-{i}",
+        "clOrdID": f"CLIENT{i}",
+        "symbol": "XBTUSD",
+        "side": "Buy",
+        "ordStatus": "New",
+        "price": 10000 - i,
+        "avgPx": None,
+        "cumQty": 0,
+        "orderQty": 25,
+        "timestamp": "2021-01-01T00:00:00.000Z",
+    }
+
+
+def _handler(client: _Client) -> BitmexExchangeHandler:
+    # Without the constructor, which connects to the exchange
+    handler = BitmexExchangeHandler.__new__(BitmexExchangeHandler)
+    AbstractExchangeHandler.__init__(handler, "", "")
+    handler._client = client
+    return handler
+
+
+class BitmexStateSourceTest(unittest.TestCase):
+    def test_leftover_order_can_be_canceled(self):
+        client = _Client([_order(1)])
+        handler = _handler(client)
+        updates: typing.List[AbstractExchangeHandler.OrderUpdate] = []
+        handler._user_update_callbacks.append(updates.append)
+
+        snapshot = asyncio.run(BitmexStateSource(handler).fetch("XBTUSD"))
+        self.assertEqual([order.orderID for order in snapshot.orders], ["order-1"])
+
+        # The order was only loaded by REST, never seen by the socket
+        asyncio.run(handler.cancel_orders(["order-1"]))
+
+        self.assertEqual(client.canceled, ['["order-1"]'])
+        self.assertEqual(updates[-1].status, "PENDING_CANCEL")
+        self.assertEqual(updates[-1].client_orderID, "CLIENT1")
+
+    def test_open_orders_are_paginated(self):
+        amount = 2 * BitmexStateSource.PAGE + 1
+        handler = _handler(_Client([_order(i) for i in range(amount)]))
+
+        orders = asyncio.run(BitmexStateSource(handler).get_open_orders("XBTUSD"))
+
+        self.assertEqual(len(orders), amount)
+        self.assertEqual(len({order.orderID for order in orders}), amount)
+
+
+class _ReconnectingHandler(AbstractExchangeHandler):
+    """Drops the connection once and reconnects the way the real handlers do."""
+
+    def __init__(self):
+        super().__init__("", "")
+        self.connects = 0
+        self.done = threading.Event()
+
+    def start_user_update_socket(self, on_update):
+        super().start_user_update_socket(on_update)
+        self.connects += 1
+        if self.connects == 1:
+            self.start_user_update_socket(on_update)
+        else:
+            self.done.set()
+
+
+_ReconnectingHandler.__abstractmethods__ = frozenset()
+
+
+class StartUserUpdateSocketTest(unittest.TestCase):
+    def test_reconnect_is_reported(self):
+        handler = _ReconnectingHandler()
+        reconnects: typing.List[int] = []
+
+        start_user_update_socket(
+            handler, lambda update: None, lambda: reconnects.append(handler.connects)
+        )
+
+        self.assertTrue(handler.done.wait(5))
+        self.assertEqual(reconnects, [1])
+        self.assertEqual(len(handler._user_update_callbacks), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
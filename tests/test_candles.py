@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import typing
+import unittest
+
+import numpy as np
+
+from sourse.candles import CandlePyramid, CandleStore
+
+
+def _candle(i: int) -> typing.Dict[str, float]:
+    return {
+        "Open": 100 + i,
+        "High": 110 + i,
+        "Low": 90 + i,
+        "Close": 105 + i,
+        "Volume": 1 + i % 7,
+    }
+
+
+def _store(amount: int, **kwargs: typing.Any) -> CandleStore:
+    store = CandleStore(**kwargs)
+    for i in range(amount):
+        store.append(_candle(i))
+    return store
+
+
+class CandleStoreTest(unittest.TestCase):
+    def test_candles_are_found_by_id(self):
+        store = _store(3000, capacity=4)
+
+        self.assertEqual((store.first_id, store.last_id), (0, 2999))
+        self.assertEqual(store.candle(1234), {"id": 1234, **_candle(1234)})
+        self.assertEqual(store.ids(10, 12).tolist(), [10, 11, 12])
+        self.assertEqual(store.column("Open", 2998, 5000).tolist(), [3098, 3099])
+        self.assertEqual(store.price_range(0, 9), (90, 119))
+        self.assertIsNone(store.price_range(4000, 5000))
+
+    def test_forming_candle_is_updated(self):
+        store = _store(10)
+
+        store.update(9, {"High": 500, "Close": 400})
+
+        self.assertEqual(store.candle(9)["High"], 500)
+        self.assertEqual(store.candle(9)["Close"], 400)
+        self.assertEqual(store.candle(9)["Open"], _candle(9)["Open"])
+        with self.assertRaises(KeyError):
+            store.update(10, {"High": 500})
+
+    def test_old_candles_are_spilled(self):
+        store = _store(1000, max_size=100)
+        self.addCleanup(store.close)
+
+        self.assertEqual(len(store), 100)
+        self.assertEqual((store.first_id, store.last_id), (900, 999))
+        self.assertNotIn(899, store)
+
+        spilled = store.spilled(0, 2000)
+        self.assertEqual(spilled["id"].tolist(), list(range(900)))
+        self.assertEqual(spilled["Close"][450], _candle(450)["Close"])
+        self.assertEqual(store.spilled(10, 12)["id"].tolist(), [10, 11, 12])
+
+    def test_store_is_made_of_columns(self):
+        columns = {
+            column: np.array([_candle(i)[column] for i in range(50)], np.float64)
+            for column in CandleStore.COLUMNS
+        }
+
+        store = CandleStore.from_columns(columns, first_id=10, max_size=20)
+        self.addCleanup(store.close)
+
+        self.assertEqual((store.first_id, store.last_id), (40, 59))
+        self.assertEqual(store.candle(59)["Open"], _candle(49)["Open"])
+        self.assertEqual(store.spilled(10, 39)["id"].tolist(), list(range(10, 40)))
+
+
+class CandlePyramidTest(unittest.TestCase):
+    FACTORS = (5, 15, 60)
+
+    def assertLevelsEqual(self, pyramid: CandlePyramid, rebuilt: CandlePyramid):
+        for level, expected in zip(pyramid.levels[1:], rebuilt.levels[1:]):
+            self.assertEqual(
+                (level.first_id, level.last_id), (expected.first_id, expected.last_id)
+            )
+            np.testing.assert_array_equal(
+                level.values(level.first_id, level.last_id),
+                expected.values(expected.first_id, expected.last_id),
+            )
+
+    def test_levels_aggregate_the_base(self):
+        pyramid = CandlePyramid(_store(125), self.FACTORS)
+
+        self.assertEqual([len(level) for level in pyramid.levels], [125, 25, 9, 3])
+        self.assertEqual(
+            pyramid.levels[2].candle(1),
+            {
+                "id": 1,
+                "Open": 115,
+                "High": 139,
+                "Low": 105,
+                "Close": 134,
+                "Volume": sum(_candle(i)["Volume"] for i in range(15, 30)),
+            },
+        )
+        # The last candle of a level is made of the candles, that are there so far
+        self.assertEqual(pyramid.levels[3].candle(2)["Close"], _candle(124)["Close"])
+
+    def test_updates_match_a_rebuild(self):
+        store = _store(100)
+        pyramid = CandlePyramid(store, self.FACTORS)
+
+        for i in range(100, 250):
+            self.assertEqual(
+                pyramid.update(store.append(_candle(i))), [i, i // 5, i // 15, i // 60]
+            )
+        store.update(249, {"High": 1000, "Low": 1, "Close": 500})
+        pyramid.update(249)
+
+        self.assertEqual(pyramid.levels[3].candle(4)["High"], 1000)
+        self.assertLevelsEqual(pyramid, CandlePyramid(store, self.FACTORS))
+
+    def test_level_fits_the_budget(self):
+        pyramid = CandlePyramid(_store(10), self.FACTORS)
+
+        self.assertEqual(pyramid.level_for(500, 1000), 0)
+        self.assertEqual(pyramid.level_for(5000, 1000), 1)
+        self.assertEqual(pyramid.level_for(10**6, 1000), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import typing
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from crypto_futures_py import AbstractExchangeHandler
+from sourse.grid import GRID_DTYPE, reconcile_grid
+from sourse.order_store import OrderStore
+
+
+def _grid(*levels: typing.Tuple[int, float, int]) -> np.ndarray:
+    return np.array(list(levels), dtype=GRID_DTYPE)
+
+
+def _update(
+    client_orderID: str,
+    price: float,
+    volume: float,
+    status: str = "NEW",
+    orderID: typing.Optional[str] = None,
+) -> AbstractExchangeHandler.OrderUpdate:
+    if orderID is None:
+        orderID = "" if status == "PENDING" else f"order-{client_orderID}"
+
+    return AbstractExchangeHandler.OrderUpdate(
+        orderID=orderID,
+        client_orderID=client_orderID,
+        status=status,
+        symbol="XBTUSD",
+        price=price,
+        average_price=float("nan"),
+        fee=0,
+        fee_asset="XBT",
+        volume=volume,
+        volume_realized=0,
+        time=datetime.now(),
+        message={},
+    )
+
+
+def _store(*updates: AbstractExchangeHandler.OrderUpdate) -> OrderStore:
+    store = OrderStore()
+    for update in updates:
+        store.apply(update)
+    return store
+
+
+class ReconcileGridTest(unittest.TestCase):
+    def test_same_orders_are_kept(self):
+        store = _store(_update("A", 101, -10), _update("B", 99, 10))
+
+        diff = reconcile_grid(_grid((-1, 101, 10), (1, 99, 10)), store)
+
+        self.assertEqual(diff.to_cancel, [])
+        self.assertEqual(len(diff.to_create), 0)
+        self.assertEqual(sorted(order[3] for order in diff.kept), ["A", "B"])
+
+    def test_moved_levels_are_replaced(self):
+        store = _store(_update("A", 101, -10), _update("B", 99, 10))
+
+        diff = reconcile_grid(_grid((-1, 102, 10), (1, 99, 10)), store)
+
+        self.assertEqual(diff.to_cancel, ["order-A"])
+        self.assertEqual(diff.to_create["price"].tolist(), [102])
+        self.assertEqual([order[3] for order in diff.kept], ["B"])
+
+    def test_changed_volume_is_replaced(self):
+        store = _store(_update("A", 99, 10))
+
+        diff = reconcile_grid(_grid((1, 99, 20)), store)
+
+        self.assertEqual(diff.to_cancel, ["order-A"])
+        self.assertEqual(diff.to_create["volume"].tolist(), [20])
+
+    def test_duplicates_on_a_level_are_canceled(self):
+        store = _store(_update("A", 99, 10), _update("B", 99, 10))
+
+        diff = reconcile_grid(_grid((1, 99, 10)), store)
+
+        self.assertEqual(len(diff.kept), 1)
+        self.assertEqual(len(diff.to_cancel), 1)
+        self.assertEqual(len(diff.to_create), 0)
+
+    def test_pending_order_with_the_same_volume_is_kept(self):
+        store = _store(_update("A", 99, 10, "PENDING"))
+
+        diff = reconcile_grid(_grid((1, 99, 10)), store)
+
+        self.assertEqual([order[3] for order in diff.kept], ["A"])
+        self.assertEqual(len(diff.to_create), 0)
+
+    def test_pending_order_with_another_volume_is_not_matched(self):
+        store = _store(_update("A", 99, 10, "PENDING"))
+
+        diff = reconcile_grid(_grid((1, 99, 20)), store)
+
+        # It could not be canceled without a server id, the level is created anew
+        self.assertEqual(diff.kept, [])
+        self.assertEqual(diff.to_cancel, [])
+        self.assertEqual(diff.to_create["volume"].tolist(), [20])
+
+    def test_pending_order_on_a_gone_level_is_left(self):
+        store = _store(_update("A", 98, 10, "PENDING"))
+
+        diff = reconcile_grid(_grid((1, 99, 10)), store)
+
+        self.assertEqual(diff.to_cancel, [])
+        self.assertEqual(len(diff.to_create), 1)
+
+    def test_requests_are_counted_in_batches(self):
+        store = _store(*(_update(str(i), 100 - i, 10) for i in range(150)))
+        target = _grid(*((1, 100 - i, 10) for i in range(1, 151)))
+
+        diff = reconcile_grid(target, store, batch_size=100)
+
+        self.assertEqual(len(diff.to_cancel), 1)
+        self.assertEqual(len(diff.to_create), 1)
+        self.assertEqual(diff.naive_requests, 4)
+        self.assertEqual(diff.requests, 2)
+        self.assertEqual(diff.saved_requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
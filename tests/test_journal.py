@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+
+from sourse.journal import Journal
+from sourse.order_store import OrderStore
+from tests.test_grid import _update
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "bot.journal")
+
+    def _write(self, snapshot_interval: int = 10000) -> Journal:
+        journal = Journal(self.path, snapshot_interval)
+        journal.open()
+        journal.append_order(_update("A", 99, 10))
+        journal.append_order(_update("B", 101, -10))
+        journal.append_position(25, 100.5)
+        journal.append_balance(1.5)
+        journal.append_order(_update("A", 99, 10, "FILLED"))
+        return journal
+
+    def test_state_is_recovered(self):
+        self._write().close()
+
+        state = Journal(self.path).recover()
+
+        self.assertEqual([order.client_orderID for order in state.orders], ["B"])
+        self.assertEqual(state.position, (25, 100.5))
+        self.assertEqual(state.balance, 1.5)
+        self.assertEqual(state.replayed, 5)
+
+    def test_recovery_starts_from_the_last_snapshot(self):
+        journal = self._write()
+        orders = OrderStore()
+        orders.apply(_update("C", 98, 10))
+        journal.append_snapshot("XBTUSD", orders, -5, 102, 2.5)
+        journal.append_order(_update("D", 97, 10))
+        journal.close()
+
+        state = Journal(self.path).recover()
+
+        self.assertEqual(
+            sorted(order.client_orderID for order in state.orders), ["C", "D"]
+        )
+        self.assertEqual(state.orders.get("C").orderID, "order-C")
+        self.assertEqual(state.position, (-5, 102))
+        self.assertEqual(state.balance, 2.5)
+        self.assertEqual(state.replayed, 2)
+
+    def test_torn_tail_is_ignored_and_cut_off(self):
+        self._write().close()
+        size = os.path.getsize(self.path)
+
+        # A crash in the middle of the last write
+        journal = Journal(self.path)
+        journal.open()
+        journal.append_order(_update("C", 98, 10))
+        journal.close()
+        with open(self.path, "r+b") as file:
+            file.truncate(os.path.getsize(self.path) - 3)
+
+        state = Journal(self.path).recover()
+        self.assertEqual([order.client_orderID for order in state.orders], ["B"])
+
+        journal = Journal(self.path)
+        journal.open()
+        self.assertEqual(os.path.getsize(self.path), size)
+        journal.append_order(_update("D", 97, 10))
+        journal.close()
+
+        state = Journal(self.path).recover()
+        self.assertEqual(
+            sorted(order.client_orderID for order in state.orders), ["B", "D"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+import unittest
+
+from sourse.order_gateway import CreateOrdersError, OrderGateway, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_waiters_are_served_by_priority_then_in_order(self):
+        served: typing.List[str] = []
+
+        async def take(bucket: TokenBucket, name: str, priority: int):
+            await bucket.acquire(priority=priority)
+            served.append(name)
+
+        async def run():
+            bucket = TokenBucket(rate=200, capacity=1)
+            # Spend the burst, so everybody has to wait
+            await bucket.acquire()
+            await asyncio.gather(
+                take(bucket, "create 1", OrderGateway.CREATE_PRIORITY),
+                take(bucket, "cancel 1", OrderGateway.CANCEL_PRIORITY),
+                take(bucket, "create 2", OrderGateway.CREATE_PRIORITY),
+                take(bucket, "cancel 2", OrderGateway.CANCEL_PRIORITY),
+            )
+
+        asyncio.run(run())
+
+        self.assertEqual(served, ["cancel 1", "cancel 2", "create 1", "create 2"])
+
+    def test_burst_is_not_waited_for(self):
+        async def run() -> typing.List[float]:
+            bucket = TokenBucket(rate=1, capacity=3)
+            return [await bucket.acquire() for _ in range(3)]
+
+        self.assertEqual(asyncio.run(run()), [0, 0, 0])
+
+
+class _Handler:
+    def __init__(self):
+        self.batches: typing.List[typing.List[str]] = []
+
+    async def create_orders(self, symbol, data):
+        self.batches.append([order[3] for order in data])
+        if data[0][3] == "C":
+            raise RuntimeError("Rejected")
+        return []
+
+
+class OrderGatewayTest(unittest.TestCase):
+    def test_failed_batch_does_not_stop_the_others(self):
+        handler = _Handler()
+        gateway = OrderGateway(
+            typing.cast(typing.Any, handler), batch_size=2, blocking_handler=False
+        )
+        orders = [("Buy", 100 - i, 10, name) for i, name in enumerate("ABCDE")]
+
+        with self.assertRaises(CreateOrdersError) as raised:
+            asyncio.run(gateway.create_orders("XBTUSD", orders))
+
+        self.assertEqual(handler.batches, [["A", "B"], ["C", "D"], ["E"]])
+        self.assertEqual([order[3] for order in raised.exception.failed], ["C", "D"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+from sourse.order_store import OrderStore
+from tests.test_grid import _update
+
+
+class OrderStoreTest(unittest.TestCase):
+    def test_orders_are_indexed(self):
+        store = OrderStore()
+        store.apply(_update("A", 99, 10))
+        store.apply(_update("B", 101, -20))
+
+        self.assertEqual(len(store), 2)
+        self.assertIn("A", store)
+        self.assertEqual(store.get_by_id("order-B").client_orderID, "B")
+        self.assertEqual(
+            [order.client_orderID for order in store.at_level("Buy", 99)], ["A"]
+        )
+        self.assertEqual(set(store.levels()), {("Buy", 99), ("Sell", 101)})
+        self.assertEqual(sorted(store.order_ids()), ["order-A", "order-B"])
+        self.assertEqual(store.count("Sell"), 1)
+        self.assertEqual(store.resting_volume("Sell"), 20)
+
+    def test_partial_fill_reduces_the_resting_volume(self):
+        store = OrderStore()
+        store.apply(_update("A", 99, 10))
+
+        update = _update("A", 99, 10, "PARTIALLY_FILLED")
+        update.volume_realized = 4
+        record = store.apply(update)
+
+        self.assertEqual(record.status, "PARTIALLY_FILLED")
+        self.assertEqual(store.resting_volume("Buy"), 6)
+
+    def test_finished_orders_are_removed(self):
+        store = OrderStore()
+        store.apply(_update("A", 99, 10))
+        store.apply(_update("B", 98, 10))
+
+        self.assertIsNone(store.apply(_update("A", 99, 10, "FILLED")))
+        store.discard("B")
+
+        self.assertEqual(len(store), 0)
+        self.assertEqual(list(store.levels()), [])
+        self.assertEqual(store.order_ids(), [])
+        self.assertEqual(store.count("Buy"), 0)
+        self.assertEqual(store.resting_volume("Buy"), 0)
+
+    def test_amended_order_moves_to_its_new_level(self):
+        store = OrderStore()
+        store.apply(_update("A", 99, 10))
+        store.apply(_update("A", 98, 15))
+
+        self.assertEqual(store.at_level("Buy", 99), [])
+        self.assertEqual(store.at_level("Buy", 98)[0].volume, 15)
+        self.assertEqual(store.resting_volume("Buy"), 15)
+
+    def test_pending_order_gets_its_server_id(self):
+        store = OrderStore()
+        store.apply(_update("A", 99, 10, "PENDING"))
+        self.assertEqual(store.order_ids(), [])
+
+        store.apply(_update("A", 99, 10))
+
+        self.assertEqual(store.order_ids(), ["order-A"])
+        self.assertEqual(store.get("A").status, "NEW")
+
+    def test_lost_pending_orders_expire(self):
+        store = OrderStore()
+        with mock.patch("time.monotonic", return_value=100.0):
+            store.apply(_update("A", 99, 10, "PENDING"))
+            store.apply(_update("B", 98, 10, "PENDING"))
+            store.apply(_update("C", 97, 10))
+
+        with mock.patch("time.monotonic", return_value=200.0):
+            expired = store.expire_pending(60, keep={"B"})
+
+        self.assertEqual([record.client_orderID for record in expired], ["A"])
+        self.assertEqual(sorted(record.client_orderID for record in store), ["B", "C"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,19 @@
 import asyncio
 import threading
 
-import qdarkstyle
-from sourse.ui.mainwindow import MainWindow
+from sourse.ui.startup import StartupTimer
 from PyQt5 import QtWidgets
 
 
 def main():
+    startup = StartupTimer()
+
+    # Imported here, so the startup report covers the import time
+    import qdarkstyle
+    from sourse.ui.mainwindow import MainWindow
+
+    startup.mark("imports")
+
     loop = asyncio.new_event_loop()
 
     def spin_loop():
@@ -18,11 +25,12 @@ def main():
 
     QtWidgets.QApplication.setStyle('Fusion')
     app = QtWidgets.QApplication([])
-    window = MainWindow(loop)
     app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
+    startup.mark("application")
+
+    window = MainWindow(loop, startup)
     app.exec_()
 
 
 if __name__ == "__main__":
     main()
-